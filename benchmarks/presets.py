@@ -0,0 +1,188 @@
+"""Benchmark generating every Parametric preset and L-System over a fixed set of seeds.
+
+Each tree is generated in a fresh process so peak RSS is measured per tree. Wall time of each phase,
+stems, leaves and symbols per second and peak RSS are written to a JSON results file and compared
+with a stored baseline, any time or memory more than the threshold above its baseline is reported as
+a regression. Outside Blender the bundled bpy and mathutils stand-ins in ch_trees.standin are used.
+
+Run from the repository root, e.g.
+    python -m benchmarks.presets --presets palm acer --seeds 1 2 3
+    python -m benchmarks.presets --save-baseline"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+from contextlib import redirect_stdout
+from statistics import median
+from time import time
+
+from ch_trees.standin import fallback
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PARAMETRIC_DIR = os.path.join(ROOT, 'ch_trees', 'parametric', 'tree_params')
+LSYSTEM_DIR = os.path.join(ROOT, 'ch_trees', 'lsystems', 'sys_defs')
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+
+SEEDS = [1, 2, 3]
+# phases quicker than this are too noisy to compare against the baseline
+MIN_COMPARE_SECONDS = 0.05
+
+
+def find_presets():
+    """Names of benchmark cases, as kind/name, for every preset"""
+    cases = []
+    for file_name in sorted(os.listdir(PARAMETRIC_DIR)):
+        if not file_name.endswith('.py'):
+            continue
+        # tree_param.py and commented out examples have no params
+        with open(os.path.join(PARAMETRIC_DIR, file_name)) as preset_file:
+            if '\nparams = ' in preset_file.read():
+                cases.append('parametric/' + file_name[:-3])
+    for file_name in sorted(os.listdir(LSYSTEM_DIR)):
+        if file_name.endswith('.py'):
+            cases.append('lsystem/' + file_name[:-3])
+    return cases
+
+
+def run_case(case, seed):
+    """Generate tree for case with seed in this process, returning its measurements"""
+    kind, name = case.split('/')
+    fallback.install_fallback()
+    # import before timing starts, generation output is not needed
+    from ch_trees.parametric import gen
+    from ch_trees.lsystems import treegen
+    gen.__logging__ = False
+    with redirect_stdout(io.StringIO()):
+        start_time = time()
+        if kind == 'parametric':
+            mod = __import__('ch_trees.parametric.tree_params.' + name, fromlist=[''])
+            tree = gen.construct(mod.params, seed)
+            stems, leaves, symbols = tree.stem_count, len(tree.leaves_array), 0
+        else:
+            random.seed(seed)
+            tree = treegen.construct('ch_trees.lsystems.sys_defs.' + name)
+            stems, leaves, symbols = tree.stem_count, tree.leaf_count, len(tree.data)
+    return {'seconds': time() - start_time, 'phases': tree.phase_times, 'stems': stems, 'leaves': leaves,
+            'symbols': symbols, 'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+
+def summarise(runs):
+    """Combine measurements of runs of one case over all seeds, taking medians of times"""
+    seconds = sum(run['seconds'] for run in runs)
+    phases = {}
+    for phase in runs[0]['phases']:
+        phases[phase] = median(run['phases'].get(phase, 0) for run in runs)
+    return {'seconds': median(run['seconds'] for run in runs), 'phases': phases,
+            'stems_per_s': sum(run['stems'] for run in runs) / seconds,
+            'leaves_per_s': sum(run['leaves'] for run in runs) / seconds,
+            'symbols_per_s': sum(run['symbols'] for run in runs) / seconds,
+            'peak_rss_mb': max(run['peak_rss_mb'] for run in runs),
+            'runs': runs}
+
+
+def run_benchmarks(cases, seeds):
+    """Run each case with each seed in a new process, returning summaries keyed by case"""
+    results = {}
+    pool = multiprocessing.get_context('spawn').Pool(1, maxtasksperchild=1)
+    for case in cases:
+        sys.stdout.write('%-32s' % case)
+        sys.stdout.flush()
+        try:
+            runs = [pool.apply(run_case, (case, seed)) for seed in seeds]
+        except Exception as err:
+            # a broken preset shouldn't stop the others being measured
+            results[case] = {'error': '%s: %s' % (type(err).__name__, err)}
+            print('failed: %s' % results[case]['error'])
+            continue
+        results[case] = summarise(runs)
+        print('%8.2fs %10.0f stems/s %10.0f leaves/s %8.0f MB' % (
+            results[case]['seconds'], results[case]['stems_per_s'], results[case]['leaves_per_s'],
+            results[case]['peak_rss_mb']))
+    pool.close()
+    return results
+
+
+def compare(results, baseline, threshold):
+    """List of descriptions of times and memory in results more than threshold (fraction) above
+    baseline"""
+    regressions = []
+    for case, result in sorted(results.items()):
+        base = baseline.get(case)
+        if base is None or 'error' in base or 'error' in result:
+            continue
+        pairs = [('seconds', result['seconds'], base['seconds']),
+                 ('peak_rss_mb', result['peak_rss_mb'], base['peak_rss_mb'])]
+        pairs.extend(('phase ' + phase, result['phases'].get(phase, 0), seconds)
+                     for phase, seconds in base['phases'].items() if seconds >= MIN_COMPARE_SECONDS)
+        for what, value, base_value in pairs:
+            if value > base_value * (1 + threshold):
+                regressions.append('%s %s: %.3f -> %.3f (+%.0f%%)' % (case, what, base_value, value,
+                                                                     100 * (value / base_value - 1)))
+    return regressions
+
+
+def environment(seeds):
+    """Description of where the benchmark was run, so results can be reproduced"""
+    fallback.install_fallback()
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT,
+                                         stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit, 'python': platform.python_version(), 'platform': platform.platform(),
+            'processor': platform.processor(), 'seeds': seeds, 'standin': fallback.active, 'time': time()}
+
+
+def main(argv):
+    """Run benchmarks from command line arguments argv, returning exit status"""
+    parser = argparse.ArgumentParser(description='Benchmark tree presets')
+    parser.add_argument('--presets', nargs='+', default=None,
+                        help='names of presets to run, as name or kind/name, default all')
+    parser.add_argument('--seeds', nargs='+', type=int, default=SEEDS)
+    parser.add_argument('--out', default='benchmark_results.json', help='path to write results to')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='path of baseline results')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='fraction above baseline counted as a regression')
+    parser.add_argument('--save-baseline', action='store_true', help='store results as the new baseline')
+    args = parser.parse_args(argv)
+
+    cases = find_presets()
+    if args.presets is not None:
+        cases = [case for case in cases if case in args.presets or case.split('/')[1] in args.presets]
+    results = run_benchmarks(cases, args.seeds)
+    output = {'environment': environment(args.seeds), 'results': results}
+    with open(args.out, 'w') as out_file:
+        json.dump(output, out_file, indent=2, sort_keys=True)
+    if args.save_baseline:
+        baseline = {'results': {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as baseline_file:
+                baseline = json.load(baseline_file)
+        # keep baselines of cases not run this time
+        baseline['environment'] = output['environment']
+        baseline['results'].update(results)
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+        print('Baseline saved to %s' % args.baseline)
+        return 0
+    if not os.path.exists(args.baseline):
+        print('No baseline at %s to compare with' % args.baseline)
+        return 0
+    with open(args.baseline) as baseline_file:
+        regressions = compare(results, json.load(baseline_file)['results'], args.threshold)
+    if len(regressions) > 0:
+        print('Regressions over %.0f%%:\n  %s' % (100 * args.threshold, '\n  '.join(regressions)))
+        return 1
+    print('No regressions over %.0f%%' % (100 * args.threshold))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
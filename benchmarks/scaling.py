@@ -0,0 +1,173 @@
+"""Measure how generation time and memory scale with single parameters.
+
+Each sweep starts from a preset and changes one knob at a time, a Parametric parameter (an element of
+a per level list is given as e.g. branches[1]) or the number of L-System iterations. Every tree is
+generated in a fresh process and the wall time of each phase and peak RSS above that after imports
+are recorded. Growth exponents are fitted as the slope of log measurement against log size, size
+being the knob value or, where the knob changes the amount of the tree made in other ways, the number
+of trunks, stems, points or symbols made. A stage whose exponent is more than the tolerance above the
+expected exponent of its sweep is flagged, showing which parameter ranges are unsafe to use.
+
+Run from the repository root, e.g.
+    python -m benchmarks.scaling
+    python -m benchmarks.scaling --sweeps floor_splits iterations --repeats 3"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import random
+import resource
+import sys
+from collections import namedtuple
+from contextlib import redirect_stdout
+from statistics import median
+from time import time
+
+import numpy as np
+
+from benchmarks.presets import environment
+from ch_trees.standin.fallback import install_fallback
+
+# knob is the parameter changed, size the measurement exponents are fitted against and expected the
+# exponent every stage should stay within
+Sweep = namedtuple('Sweep', ['name', 'kind', 'preset', 'knob', 'values', 'size', 'expected'])
+
+SWEEPS = [
+    Sweep('floor_splits', 'parametric', 'palm', 'floor_splits', [0, 1, 3, 7, 15], 'trunks', 1),
+    Sweep('branches', 'parametric', 'acer', 'branches[1]', [3, 6, 12, 24, 48], 'stems', 1),
+    Sweep('leaf_blos_num', 'parametric', 'palm', 'leaf_blos_num', [25, 50, 100, 200, 400], 'value', 1),
+    Sweep('levels', 'parametric', 'acer', 'levels', [1, 2, 3], 'stems', 1),
+    Sweep('curve_res', 'parametric', 'acer', 'curve_res[1]', [2, 4, 8, 16, 32], 'points', 1),
+    Sweep('iterations', 'lsystem', 'acer', 'iterations', [5, 6, 7, 8, 9], 'symbols', 1),
+]
+
+# measurements smaller than these are too noisy to fit
+MIN_FIT_SECONDS = 0.01
+MIN_FIT_MB = 1
+
+
+def set_knob(params, knob, value):
+    """Copy of params with knob, a name optionally followed by [index], set to value"""
+    params = dict(params)
+    if '[' in knob:
+        name, index = knob[:-1].split('[')
+        params[name] = list(params[name])
+        params[name][int(index)] = value
+    else:
+        params[knob] = value
+    return params
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_point(sweep, value, seed):
+    """Generate tree for sweep with its knob at value in this process, returning its measurements"""
+    install_fallback()
+    from ch_trees.parametric import gen
+    from ch_trees.parametric.tree_params.tree_param import TreeParam
+    gen.__logging__ = False
+    random.seed(seed)
+    with redirect_stdout(io.StringIO()):
+        if sweep.kind == 'parametric':
+            mod = __import__('ch_trees.parametric.tree_params.' + sweep.preset, fromlist=[''])
+            tree = gen.Tree(TreeParam(set_knob(mod.params, sweep.knob, value)))
+            start_rss = peak_rss_mb()
+            start_time = time()
+            tree.make()
+            sizes = {'stems': tree.stem_count, 'leaves': len(tree.leaves_array),
+                     'points': sum(len(spline.bezier_points) for spline in tree.branches_curve.splines),
+                     'trunks': tree.param.floor_splits + 1}
+        else:
+            mod = __import__('ch_trees.lsystems.sys_defs.' + sweep.preset, fromlist=[''])
+            start_rss = peak_rss_mb()
+            start_time = time()
+            tree = mod.system(0)
+            tree.iterate_n(value)
+            tree.parse()
+            sizes = {'stems': tree.stem_count, 'leaves': tree.leaf_count, 'points': tree.point_count,
+                     'symbols': len(tree.data)}
+    sizes['value'] = value
+    stages = dict(tree.phase_times)
+    stages['total'] = time() - start_time
+    return {'sizes': sizes, 'seconds': stages, 'memory_mb': peak_rss_mb() - start_rss}
+
+
+def run_sweep(pool, sweep, seed, repeats):
+    """Measure each value of sweep, taking the median time of repeats runs"""
+    points = []
+    for value in sweep.values:
+        runs = [pool.apply(run_point, (sweep, value, seed)) for _ in range(repeats)]
+        seconds = {stage: median(run['seconds'].get(stage, 0) for run in runs) for stage in runs[0]['seconds']}
+        points.append({'sizes': runs[0]['sizes'], 'seconds': seconds,
+                       'memory_mb': max(run['memory_mb'] for run in runs)})
+        sys.stdout.write('.')
+        sys.stdout.flush()
+    return points
+
+
+def fit_exponent(sizes, values, minimum):
+    """Slope of log values against log sizes over values of at least minimum, or None if fewer than
+    three are left or the sizes don't vary"""
+    pairs = [(size, value) for size, value in zip(sizes, values) if value >= minimum and size > 0]
+    if len(pairs) < 3 or len(set(size for size, _ in pairs)) < 2:
+        return None
+    log_sizes, log_values = np.log(np.array(pairs, dtype=float)).T
+    return float(np.polyfit(log_sizes, log_values, 1)[0])
+
+
+def fit_sweep(sweep, points, tolerance):
+    """Exponents of each stage and of memory for points measured in sweep, with stages over the
+    expected exponent flagged"""
+    sizes = [point['sizes'][sweep.size] for point in points]
+    exponents = {}
+    for stage in points[0]['seconds']:
+        exponents[stage] = fit_exponent(sizes, [point['seconds'].get(stage, 0) for point in points],
+                                        MIN_FIT_SECONDS)
+    exponents['memory'] = fit_exponent(sizes, [point['memory_mb'] for point in points], MIN_FIT_MB)
+    flagged = sorted(stage for stage, exponent in exponents.items()
+                     if exponent is not None and exponent > sweep.expected + tolerance)
+    return {'knob': sweep.knob, 'preset': sweep.kind + '/' + sweep.preset, 'size': sweep.size,
+            'expected': sweep.expected, 'exponents': exponents, 'flagged': flagged, 'points': points}
+
+
+def main(argv):
+    """Run scaling sweeps from command line arguments argv, returning exit status"""
+    parser = argparse.ArgumentParser(description='Fit growth exponents of generation stages')
+    parser.add_argument('--sweeps', nargs='+', default=None, help='names of sweeps to run, default all')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeats', type=int, default=1, help='runs of each point, the median time is used')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='amount an exponent may exceed its expected value before being flagged')
+    parser.add_argument('--out', default='scaling_results.json', help='path to write results to')
+    args = parser.parse_args(argv)
+
+    sweeps = [sweep for sweep in SWEEPS if args.sweeps is None or sweep.name in args.sweeps]
+    results = {}
+    pool = multiprocessing.get_context('spawn').Pool(1, maxtasksperchild=1)
+    for sweep in sweeps:
+        sys.stdout.write('%-16s' % sweep.name)
+        sys.stdout.flush()
+        results[sweep.name] = fit_sweep(sweep, run_sweep(pool, sweep, args.seed, args.repeats), args.tolerance)
+        exponents = results[sweep.name]['exponents']
+        print(' ' + ', '.join('%s %s' % (stage, '-' if exponent is None else '%.2f' % exponent)
+                              for stage, exponent in sorted(exponents.items())))
+    pool.close()
+
+    with open(args.out, 'w') as out_file:
+        json.dump({'environment': environment([args.seed]), 'results': results}, out_file, indent=2,
+                  sort_keys=True)
+    flagged = ['%s: %s %.2f (expected %g)' % (name, stage, result['exponents'][stage], result['expected'])
+               for name, result in sorted(results.items()) for stage in result['flagged']]
+    if len(flagged) > 0:
+        print('Stages scaling worse than expected:\n  %s' % '\n  '.join(flagged))
+        return 1
+    print('All stages within %g of their expected exponents' % args.tolerance)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,185 @@
+"""Blender add-on generating trees in a background process so the interface stays responsive.
+
+The operator starts ch_trees.background under Blender's Python, which makes the tree without
+Blender and streams its branch splines and leaf chunks back as they are finished. A modal timer
+adds each to the scene as it arrives, spending at most COMMIT_SECONDS per tick so the viewport keeps
+redrawing, and shows progress in the header of the 3D view and the window manager progress bar. Esc
+cancels, stopping the process and removing what was added so far.
+
+With ch_trees in the addons folder, install this file as an add-on, or open it in the text editor
+and run it, then use Add > Mesh > Tree (Background)."""
+
+import json
+import os
+import queue
+import subprocess
+import threading
+from time import time
+
+import bpy
+from bpy.props import EnumProperty, IntProperty, StringProperty
+
+from ch_trees import background
+from ch_trees.datablocks import remove_objects
+
+bl_info = {
+    'name': 'Tree (Background)',
+    'category': 'Add Mesh',
+    'blender': (2, 78, 0),
+    'location': 'View3D > Add > Mesh > Tree (Background)',
+    'description': 'Generate Parametric or L-System trees without freezing Blender',
+}
+
+# directory holding ch_trees, for the background process to import it from
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(background.__file__)))
+
+# seconds of each timer tick spent adding frames to the scene
+COMMIT_SECONDS = 0.05
+
+# seconds between timer ticks
+TICK_SECONDS = 0.1
+
+OBJECT_NAMES = {'leaves': 'Leaves', 'blossom': 'Blossom'}
+
+
+def read_frames(stream, frames):
+    """Put frames read from stream on queue frames, then None once it ends"""
+    while True:
+        frame = background.read_frame(stream)
+        frames.put(frame)
+        if frame is None:
+            return
+
+
+def add_splines(curve, splines):
+    """Add bezier splines, given as (co, handle_left, handle_right, radius, resolution_u), to curve"""
+    for co, handle_left, handle_right, radius, resolution in splines:
+        spline = curve.splines.new('BEZIER')
+        spline.resolution_u = resolution
+        spline.bezier_points.add(len(co) - 1)
+        spline.bezier_points.foreach_set('co', co.ravel())
+        spline.bezier_points.foreach_set('handle_left', handle_left.ravel())
+        spline.bezier_points.foreach_set('handle_right', handle_right.ravel())
+        spline.bezier_points.foreach_set('radius', radius)
+
+
+class GenerateTreeBackground(bpy.types.Operator):
+    """Generate a tree in a background process, adding it to the scene as it is made"""
+    bl_idname = 'object.ch_trees_generate_background'
+    bl_label = 'Tree (Background)'
+    bl_options = {'REGISTER'}
+
+    kind = EnumProperty(name='Kind', items=[('parametric', 'Parametric', 'Parametric tree'),
+                                            ('lsystem', 'L-System', 'L-System tree')])
+    preset = StringProperty(name='Preset', default='quaking_aspen')
+    seed = IntProperty(name='Seed', default=0, min=0, description='Random seed, 0 for a random one')
+
+    process = None
+    timer = None
+
+    def invoke(self, context, event):
+        return self.execute(context)
+
+    def execute(self, context):
+        job = {'kind': self.kind, 'preset': self.preset, 'seed': self.seed}
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join([ROOT] + [path for path in [env.get('PYTHONPATH')] if path])
+        self.process = subprocess.Popen([bpy.app.binary_path_python, '-m', 'ch_trees.background', json.dumps(job)],
+                                        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, cwd=ROOT, env=env)
+        self.frames = queue.Queue()
+        threading.Thread(target=read_frames, args=(self.process.stdout, self.frames), daemon=True).start()
+
+        self.tree_obj = bpy.data.objects.new('Tree', None)
+        context.scene.objects.link(self.tree_obj)
+        context.scene.objects.active = self.tree_obj
+        self.curve = None
+
+        wm = context.window_manager
+        wm.progress_begin(0, 100)
+        self.timer = wm.event_timer_add(TICK_SECONDS, context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            self.process.kill()
+            self.finish(context)
+            remove_objects([self.tree_obj])
+            self.report({'INFO'}, 'Tree generation cancelled')
+            return {'CANCELLED'}
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+
+        start_time = time()
+        while time() - start_time < COMMIT_SECONDS:
+            try:
+                frame = self.frames.get_nowait()
+            except queue.Empty:
+                break
+            if frame is None or frame['type'] == 'error':
+                self.finish(context)
+                remove_objects([self.tree_obj])
+                self.report({'ERROR'}, frame['error'] if frame is not None else 'Tree generation process exited')
+                return {'CANCELLED'}
+            if frame['type'] == 'done':
+                self.finish(context)
+                self.report({'INFO'}, 'Tree generated: seed %i, %i stems, %i leaves' % (
+                    frame['seed'], frame['stems'], frame['leaves']))
+                return {'FINISHED'}
+            self.commit(context, frame)
+        return {'PASS_THROUGH'}
+
+    def commit(self, context, frame):
+        """Add what frame holds to the scene"""
+        if frame['type'] == 'curve':
+            self.curve = bpy.data.curves.new(frame['name'], type='CURVE')
+            self.curve.dimensions = '3D'
+            self.curve.resolution_u = frame['resolution_u']
+            self.curve.fill_mode = 'FULL'
+            self.curve.bevel_depth = frame['bevel_depth']
+            self.curve.bevel_resolution = frame['bevel_resolution']
+            self.curve.use_uv_as_generated = True
+            self.add_object(context, bpy.data.objects.new('Branches', self.curve))
+        elif frame['type'] == 'splines':
+            add_splines(self.curve, frame['splines'])
+        elif frame['type'] == 'leaves':
+            mesh = bpy.data.meshes.new(frame['name'])
+            mesh.from_pydata(frame['verts'].tolist(), (), frame['faces'])
+            self.add_object(context, bpy.data.objects.new(OBJECT_NAMES.get(frame['name'], frame['name']), mesh))
+        elif frame['type'] == 'progress':
+            context.window_manager.progress_update(int(100 * frame['fraction']))
+            if context.area is not None:
+                context.area.header_text_set('Generating tree: %s %i%% (Esc to cancel)' % (
+                    frame['phase'], 100 * frame['fraction']))
+
+    def add_object(self, context, obj):
+        """Link obj to the scene, parented to the tree"""
+        context.scene.objects.link(obj)
+        obj.parent = self.tree_obj
+
+    def finish(self, context):
+        """Stop the timer and progress display, waiting for the process to exit"""
+        wm = context.window_manager
+        wm.event_timer_remove(self.timer)
+        wm.progress_end()
+        if context.area is not None:
+            context.area.header_text_set()
+        self.process.wait()
+
+
+def menu_func(self, context):
+    self.layout.operator(GenerateTreeBackground.bl_idname, icon='OUTLINER_OB_EMPTY')
+
+
+def register():
+    bpy.utils.register_class(GenerateTreeBackground)
+    bpy.types.INFO_MT_mesh_add.append(menu_func)
+
+
+def unregister():
+    bpy.types.INFO_MT_mesh_add.remove(menu_func)
+    bpy.utils.unregister_class(GenerateTreeBackground)
+
+
+if __name__ == '__main__':
+    register()
@@ -0,0 +1,230 @@
+"""Headless generation of one tree, streaming it chunk by chunk to the process that started it.
+
+Run as a separate process so Blender stays responsive while the tree is made, see
+ch_trees.addon. The job is given as JSON in the arguments, a dict with
+    kind     'parametric' (default) or 'lsystem'
+    preset   name of the preset in tree_params or sys_defs
+    params   Parametric parameters overriding those of the preset
+    seed     random seed, 0 for a random one
+Frames are written to the original stdout as pickled dicts, each prefixed by its length, so
+arrays are passed without converting them to text. Their type is one of
+    curve     settings of the branch curve, sent before its splines
+    splines   list of (co, handle_left, handle_right, radius, resolution_u) arrays per spline
+    leaves    verts and faces of a chunk of mesh name, faces indexing this chunk only
+    progress  fraction of the tree made so far and the name of the phase
+    done      stem and leaf counts and phase timings
+    error     traceback of the exception that stopped generation
+Everything printed while generating goes to stderr.
+
+Run from the repository root, e.g.
+    python -m ch_trees.background '{"preset": "palm", "seed": 3}' > palm.frames"""
+
+import os
+import pickle
+import random
+import struct
+import sys
+import threading
+import traceback
+
+import numpy as np
+
+from ch_trees.export import TreeExporter, spline_arrays
+from ch_trees.standin.fallback import install_fallback
+
+# splines sent in each splines frame
+SPLINE_BATCH = 200
+
+# seconds between progress frames
+PROGRESS_INTERVAL = 0.2
+
+# share of progress given to each phase, leaves taking the rest
+PHASE_SHARES = {'parametric': {'branches': 0.6}, 'lsystem': {'iterate': 0.1, 'parse': 0.5}}
+
+
+def write_frame(stream, frame):
+    """Write frame to binary stream"""
+    data = pickle.dumps(frame, pickle.HIGHEST_PROTOCOL)
+    stream.write(struct.pack('<I', len(data)) + data)
+    stream.flush()
+
+
+def read_frame(stream):
+    """Next frame from binary stream, or None if it has ended"""
+    header = stream.read(4)
+    if len(header) < 4:
+        return None
+    length = struct.unpack('<I', header)[0]
+    data = stream.read(length)
+    if len(data) < length:
+        return None
+    return pickle.loads(data)
+
+
+class StreamExporter(TreeExporter):
+    """Exporter sending branch splines and leaf chunks as frames rather than writing a file"""
+
+    def __init__(self, stream, lock):
+        """Set up exporter writing frames to stream, holding lock while writing"""
+        super().__init__(None)
+        self.stream = stream
+        self.lock = lock
+        self.branches_sent = False
+
+    def send(self, frame):
+        """Write frame to the stream"""
+        with self.lock:
+            write_frame(self.stream, frame)
+
+    def add_branches(self, curve, name='branches'):
+        """Send settings of branch curve then its splines in batches"""
+        self.send({'type': 'curve', 'name': name, 'bevel_depth': curve.bevel_depth,
+                   'bevel_resolution': curve.bevel_resolution, 'resolution_u': curve.resolution_u})
+        batch = []
+        for spline in curve.splines:
+            batch.append(tuple(spline_arrays(spline)) + (spline.resolution_u,))
+            if len(batch) == SPLINE_BATCH:
+                self.send({'type': 'splines', 'name': name, 'splines': batch})
+                batch = []
+        if batch:
+            self.send({'type': 'splines', 'name': name, 'splines': batch})
+        self.branches_sent = True
+
+    def add_leaves(self, name, verts, faces):
+        """Send chunk of leaf verts and faces of mesh name, making faces index the chunk"""
+        if len(verts) == 0:
+            return
+        start = self.counts.get(name, 0)
+        faces = [tuple(ind - start for ind in face) for face in faces]
+        self.send({'type': 'leaves', 'name': name, 'verts': np.array(verts, dtype=np.float32).reshape(-1, 3),
+                   'faces': faces})
+        self.counts[name] = start + len(verts)
+
+    def close(self):
+        """Nothing to finish, frames are sent as they are made"""
+
+
+class Progress(object):
+    """Thread sending progress frames while a tree is made"""
+
+    def __init__(self, exporter, kind, expected_stems, leaf_verts):
+        """Set up progress of a tree of kind expected to have expected_stems stems. leaf_verts is the
+        average number of vertices per leaf"""
+        self.exporter = exporter
+        self.shares = PHASE_SHARES[kind]
+        self.expected_stems = max(1, expected_stems)
+        self.leaf_verts = leaf_verts
+        self.tree = None
+        self.iterations = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def fraction(self):
+        """Phase and fraction of the tree made so far"""
+        tree = self.tree
+        done = 0
+        if 'iterate' in self.shares:
+            if tree.iterations < self.iterations:
+                return 'iterate', self.shares['iterate'] * tree.iterations / self.iterations
+            done = self.shares['iterate']
+        branches = 'parse' if 'parse' in self.shares else 'branches'
+        if not self.exporter.branches_sent:
+            return branches, done + self.shares[branches] * min(1, tree.stem_count / self.expected_stems)
+        done += self.shares[branches]
+        leaves = len(tree.leaves_array or [])
+        if leaves == 0:
+            return 'leaves', done
+        verts = sum(self.exporter.counts.values())
+        return 'leaves', done + (1 - done) * min(1, verts / (leaves * self.leaf_verts))
+
+    def run(self):
+        """Send progress until stopped"""
+        while not self.stopped.wait(PROGRESS_INTERVAL):
+            phase, fraction = self.fraction()
+            self.exporter.send({'type': 'progress', 'phase': phase, 'fraction': fraction})
+
+    def stop(self):
+        """Stop sending progress"""
+        self.stopped.set()
+        self.thread.join()
+
+
+def leaf_verts_per_leaf(leaf_shape, blossom_shape, blossom_rate):
+    """Average number of vertices per leaf of leaf_shape and blossom_shape"""
+    return (1 - blossom_rate) * len(leaf_shape[0]) + blossom_rate * len(blossom_shape[0])
+
+
+def generate(job, exporter):
+    """Make the tree for job, sending it to exporter. Returns the done frame"""
+    from ch_trees import complexity
+    from ch_trees.leaf import Leaf
+    from ch_trees.parametric import gen
+    from ch_trees.parametric.tree_params.tree_param import TreeParam
+
+    kind = job.get('kind', 'parametric')
+    seed = job.get('seed', 0)
+    if seed == 0:
+        seed = int(random.random() * 9999999)
+    random.seed(seed)
+    if kind == 'parametric':
+        mod = __import__('ch_trees.parametric.tree_params.' + job['preset'], fromlist=[''])
+        params = dict(mod.params)
+        params.update(job.get('params', {}))
+        param = TreeParam(params)
+        estimate = complexity.estimate_parametric(param)
+        progress = Progress(exporter, kind, sum(estimate.stems), leaf_verts_per_leaf(
+            Leaf.get_shape(param.leaf_shape, 1, 1, 1), Leaf.get_shape(-param.blossom_shape, 1, 1, 1),
+            param.blossom_rate))
+        tree = gen.Tree(param, exporter=exporter)
+        progress.tree = tree
+        progress.thread.start()
+        try:
+            tree.make()
+        finally:
+            progress.stop()
+        leaves = len(tree.leaves_array)
+    elif kind == 'lsystem':
+        modname = 'ch_trees.lsystems.sys_defs.' + job['preset']
+        mod = __import__(modname, fromlist=[''])
+        iterations = mod.default_iterations
+        estimate = complexity.estimate_lsystem(modname, iterations)
+        tree = mod.system(0)
+        progress = Progress(exporter, kind, sum(estimate.stems), leaf_verts_per_leaf(
+            Leaf.get_shape(tree.leaf_shape, 1, 1, 1), Leaf.get_shape(tree.blossom_shape, 1, 1, 1),
+            tree.blossom_rate))
+        progress.tree = tree
+        progress.iterations = iterations
+        tree.exporter = exporter
+        progress.thread.start()
+        try:
+            tree.iterate_n(iterations)
+            tree.parse()
+        finally:
+            progress.stop()
+        leaves = tree.leaf_count
+    else:
+        raise Exception('Unknown kind of tree %s' % kind)
+    tree.remove()
+    return {'type': 'done', 'seed': seed, 'stems': tree.stem_count, 'leaves': leaves,
+            'timings': dict(tree.phase_times)}
+
+
+def main(argv):
+    """Generate the tree for the JSON job in argv, writing frames to stdout"""
+    import json
+    frames = os.fdopen(os.dup(1), 'wb')
+    # send everything else printed, including by Blender itself, to stderr
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+    install_fallback()
+    exporter = StreamExporter(frames, threading.Lock())
+    try:
+        exporter.send(generate(json.loads(argv[0]), exporter))
+    except Exception:
+        exporter.send({'type': 'error', 'error': traceback.format_exc()})
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
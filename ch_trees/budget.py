@@ -0,0 +1,111 @@
+"""Limits on the size of a generated tree, shared by L-System and Parametric tree generators.
+
+When a tree is expected to exceed a limit the generators thin it in advance, removing a fraction of
+the branches at each level, deepest first but never all of a level, and separately a fraction of the
+leaves. Hard limits and the deadline are also checked as stems and leaves are made, so estimates
+that fall short only stop growth late rather than letting the tree exceed the budget. Everything cut
+is recorded for the report."""
+
+from time import time
+
+# fraction of a level of branches kept before the levels above it are thinned too
+MIN_LEVEL_KEEP = 0.25
+
+
+class Budget(object):
+    """Limits for one tree, and record of what was cut to stay within them"""
+    max_stems = None
+    max_points = None
+    max_leaves = None
+    max_symbols = None
+    deadline = None
+    end_time = None
+
+    def __init__(self, max_stems=None, max_points=None, max_leaves=None, max_symbols=None, deadline=None):
+        """Set up budget, any limit left as None is not applied. The deadline is in seconds from now"""
+        self.max_stems = max_stems
+        self.max_points = max_points
+        self.max_leaves = max_leaves
+        self.max_symbols = max_symbols
+        self.deadline = deadline
+        if deadline is not None:
+            self.end_time = time() + deadline
+        self.notes = []
+        self.cuts = {}
+        self.errors = {}
+
+    def expired(self):
+        """Whether the deadline has passed"""
+        return self.end_time is not None and time() > self.end_time
+
+    def note(self, text):
+        """Record a change made to the whole tree to keep within budget"""
+        self.notes.append(text)
+
+    def cut(self, what, count=1):
+        """Record count elements of kind what being left out"""
+        self.cuts[what] = self.cuts.get(what, 0) + count
+
+    def keep(self, key, factor):
+        """Whether to keep the next of a stream of elements identified by key which is thinned to
+        factor, using Floyd-Steinberg error so the kept elements are spread evenly"""
+        if factor >= 1:
+            return True
+        error = self.errors.get(key, 0) + factor
+        if error >= 1:
+            self.errors[key] = error - 1
+            return True
+        self.errors[key] = error
+        return False
+
+    def report(self):
+        """Return text describing what was cut"""
+        lines = list(self.notes)
+        for what in sorted(self.cuts):
+            lines.append('%s: %i' % (what, self.cuts[what]))
+        if len(lines) == 0:
+            return 'Within budget'
+        return 'Budget cuts:\n  ' + '\n  '.join(lines)
+
+
+def kept_cost(costs, factors):
+    """Total of costs, given per level of nesting, once each level is thinned to its factor. Cutting a
+    branch also removes everything nested in it, so each level keeps the product of the factors down to
+    it"""
+    total = 0
+    kept = 1
+    for cost, factor in zip(costs, factors):
+        kept *= factor
+        total += cost * kept
+    return total
+
+
+def level_factors(costs, limit):
+    """Fraction of each level to keep so the total of costs, given per level of nesting, is within
+    limit. Levels are thinned from the deepest up, each to no less than MIN_LEVEL_KEEP before the level
+    above is thinned. If that is not enough every level below the top is thinned further by a common
+    fraction. The top level is never cut and no other level is cut entirely"""
+    factors = [1] * len(costs)
+    if limit is None or kept_cost(costs, factors) <= limit:
+        return factors
+    for level in range(len(costs) - 1, 0, -1):
+        # kept cost is linear in the factor of one level
+        factors[level] = 0
+        above = kept_cost(costs, factors)
+        factors[level] = 1
+        below = kept_cost(costs, factors) - above
+        if below > 0:
+            factors[level] = min(1, max(MIN_LEVEL_KEEP, (limit - above) / below))
+        if kept_cost(costs, factors) <= limit:
+            return factors
+    if len(costs) > 1 and costs[0] < limit:
+        # bisect for the common fraction, kept cost only grows with it
+        low, high = 0, 1
+        for _ in range(30):
+            mid = (low + high) / 2
+            if kept_cost(costs, [1] + [factor * mid for factor in factors[1:]]) <= limit:
+                low = mid
+            else:
+                high = mid
+        factors = [1] + [factor * low for factor in factors[1:]]
+    return factors
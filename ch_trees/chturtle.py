@@ -5,7 +5,7 @@ import math
 import random
 
 import mathutils
-from mathutils import Quaternion
+from mathutils import Matrix, Quaternion
 
 
 class Vector(mathutils.Vector):
@@ -87,3 +87,24 @@ class CHTurtle(object):
     def set_width(self, width):
         """Set the width stored by the turtle"""
         self.width = width
+
+    def axes(self):
+        """Orthonormal x, y and z axes of the turtle's local frame, in which it faces along z with
+        right along x"""
+        z_axis = self.dir.normalized()
+        x_axis = self.right - z_axis * self.right.dot(z_axis)
+        x_axis.normalize()
+        return x_axis, z_axis.cross(x_axis), z_axis
+
+    def matrix(self):
+        """4x4 matrix transforming the turtle's local frame to world space"""
+        x_axis, y_axis, z_axis = self.axes()
+        return Matrix(((x_axis.x, y_axis.x, z_axis.x, self.pos.x),
+                       (x_axis.y, y_axis.y, z_axis.y, self.pos.y),
+                       (x_axis.z, y_axis.z, z_axis.z, self.pos.z),
+                       (0, 0, 0, 1)))
+
+    def to_local(self, vec):
+        """Express world space direction vec in the turtle's local frame"""
+        x_axis, y_axis, z_axis = self.axes()
+        return Vector([x_axis.dot(vec), y_axis.dot(vec), z_axis.dot(vec)])
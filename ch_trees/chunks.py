@@ -0,0 +1,189 @@
+"""Splitting of a finished tree into chunks, objects each holding the branches and leaves of one
+region of the tree.
+
+Blender evaluates the bevel of a curve object and the modifiers of a mesh object on one thread, so a
+big tree made of one branch curve and one leaf mesh is slow to evaluate again however many cores
+there are. Split into K objects under the Tree empty, the chunks are evaluated in parallel by the
+dependency graph and can be culled and hidden separately. Regions are the cells of a k-d tree built
+over the centres of the branch splines and the positions of the leaves, splitting the longest side
+of each cell where the geometry divides in the ratio of the chunks on either side, so every chunk
+holds about the same amount of it. A leaf is kept whole, going to the cell its first vertex is in.
+Instanced leaves and other objects with children are left as they are."""
+
+import numpy as np
+
+import bpy
+
+from ch_trees.datablocks import base_name, remove_objects
+from ch_trees.export import spline_arrays
+from ch_trees.pipeline import fill_mesh
+
+# settings copied from a curve to its chunks
+CURVE_SETTINGS = ('dimensions', 'resolution_u', 'fill_mode', 'bevel_depth', 'bevel_resolution',
+                  'use_uv_as_generated')
+
+
+def kd_cells(points, count, first=0):
+    """k-d tree dividing points into count cells numbered from first, as nested (axis, value, low,
+    high) tuples with the cell number at the leaves. Points at most value along axis are in low"""
+    if count <= 1 or len(points) < 2:
+        return first
+    axis = int(np.argmax(points.max(axis=0) - points.min(axis=0)))
+    low_count = count // 2
+    value = float(np.percentile(points[:, axis], 100.0 * low_count / count))
+    low = points[:, axis] <= value
+    return (axis, value, kd_cells(points[low], low_count, first),
+            kd_cells(points[~low], count - low_count, first + low_count))
+
+
+def cell_labels(cells, points):
+    """Number of the cell of k-d tree cells each of points is in"""
+    labels = np.zeros(len(points), dtype=int)
+    stack = [(cells, np.arange(len(points)))]
+    while stack:
+        node, inds = stack.pop()
+        if not isinstance(node, tuple):
+            labels[inds] = node
+            continue
+        axis, value, low, high = node
+        is_low = points[inds, axis] <= value
+        stack.append((low, inds[is_low]))
+        stack.append((high, inds[~is_low]))
+    return labels
+
+
+def mesh_islands(loops, totals, n_verts):
+    """Lowest index of the vertices connected to each vertex by polygons given by the vertex index of
+    each loop and the number of loops of each polygon"""
+    lowest = np.arange(n_verts)
+    if len(totals) == 0:
+        return lowest
+    starts = np.cumsum(totals) - totals
+    loop_polys = np.repeat(np.arange(len(totals)), totals)
+    while True:
+        # spread the lowest index of each polygon to its vertices, then follow each index to its own
+        poly_lowest = np.minimum.reduceat(lowest[loops], starts)
+        new_lowest = lowest.copy()
+        np.minimum.at(new_lowest, loops, poly_lowest[loop_polys])
+        new_lowest = new_lowest[new_lowest]
+        if np.array_equal(new_lowest, lowest):
+            return lowest
+        lowest = new_lowest
+
+
+class MeshArrays(object):
+    """Vertices, polygons and uvs of a mesh as NumPy arrays, loops in the order of their polygons"""
+
+    def __init__(self, mesh):
+        """Read arrays of mesh datablock"""
+        self.verts = np.zeros(len(mesh.vertices) * 3, dtype=np.float32)
+        mesh.vertices.foreach_get('co', self.verts)
+        self.verts = self.verts.reshape(-1, 3)
+        loops = np.zeros(len(mesh.loops), dtype=np.int32)
+        mesh.loops.foreach_get('vertex_index', loops)
+        starts = np.zeros(len(mesh.polygons), dtype=np.int32)
+        mesh.polygons.foreach_get('loop_start', starts)
+        self.totals = np.zeros(len(mesh.polygons), dtype=np.int32)
+        mesh.polygons.foreach_get('loop_total', self.totals)
+        self.loop_order = np.repeat(starts, self.totals) + \
+            np.arange(len(loops)) - np.repeat(np.cumsum(self.totals) - self.totals, self.totals)
+        self.loops = loops[self.loop_order]
+        self.uv_name = self.uvs = None
+        if mesh.uv_layers.active is not None:
+            self.uv_name = mesh.uv_layers.active.name
+            uvs = np.zeros(len(mesh.loops) * 2, dtype=np.float32)
+            mesh.uv_layers.active.data.foreach_get('uv', uvs)
+            self.uvs = uvs.reshape(-1, 2)[self.loop_order]
+
+    def anchors(self):
+        """Position of the lowest vertex of the leaf, or other connected part, each polygon is in"""
+        lowest = mesh_islands(self.loops, self.totals, len(self.verts))
+        return self.verts[lowest[self.loops[np.cumsum(self.totals) - self.totals]]]
+
+
+def add_object(like, data):
+    """New object named like the object like holding data, linked to the scene with like's parent"""
+    obj = bpy.data.objects.new(base_name(like.name), data)
+    bpy.context.scene.objects.link(obj)
+    obj.parent = like.parent
+    return obj
+
+
+def copy_spline(spline, curve, max_resolution=None):
+    """Add a copy of bezier spline to curve, with resolution_u at most max_resolution if given"""
+    co, handle_left, handle_right, radius = spline_arrays(spline)
+    new_spline = curve.splines.new('BEZIER')
+    new_spline.resolution_u = spline.resolution_u if max_resolution is None else \
+        min(spline.resolution_u, max_resolution)
+    new_spline.radius_interpolation = spline.radius_interpolation
+    new_spline.bezier_points.add(len(co) - 1)
+    new_spline.bezier_points.foreach_set('co', co.ravel())
+    new_spline.bezier_points.foreach_set('handle_left', handle_left.ravel())
+    new_spline.bezier_points.foreach_set('handle_right', handle_right.ravel())
+    new_spline.bezier_points.foreach_set('radius', radius)
+
+
+def split_curve(obj, labels, settings=None, max_resolution=None):
+    """Replace curve object obj by an object for each label in labels, which has one per spline,
+    holding the splines with that label. settings maps labels to dicts of curve settings to change
+    for their object and max_resolution to the highest resolution_u of their splines. Returns the new
+    objects in order of label"""
+    if len(labels) == 0:
+        return [obj]
+    splines = list(obj.data.splines)
+    objs = []
+    for label in np.unique(labels):
+        curve = bpy.data.curves.new(base_name(obj.data.name), type='CURVE')
+        for attr in CURVE_SETTINGS:
+            setattr(curve, attr, getattr(obj.data, attr))
+        for attr, value in (settings or {}).get(label, {}).items():
+            setattr(curve, attr, value)
+        for ind in np.flatnonzero(labels == label):
+            copy_spline(splines[ind], curve, (max_resolution or {}).get(label))
+        objs.append(add_object(obj, curve))
+    remove_objects([obj])
+    return objs
+
+
+def split_mesh(obj, arrays, labels):
+    """Replace mesh object obj, read into MeshArrays arrays, by an object for each label in labels,
+    which has one per polygon, holding the polygons with that label. Returns the new objects"""
+    if len(labels) == 0:
+        return [obj]
+    objs = []
+    for label in np.unique(labels):
+        is_labelled = labels == label
+        loop_inds = np.flatnonzero(np.repeat(is_labelled, arrays.totals))
+        used, loops = np.unique(arrays.loops[loop_inds], return_inverse=True)
+        mesh = bpy.data.meshes.new(base_name(obj.data.name))
+        fill_mesh(mesh, arrays.verts[used], loops, arrays.totals[is_labelled])
+        if arrays.uvs is not None:
+            mesh.uv_textures.new(arrays.uv_name)
+            mesh.uv_layers.active.data.foreach_set('uv', arrays.uvs[loop_inds].ravel())
+        objs.append(add_object(obj, mesh))
+    remove_objects([obj])
+    return objs
+
+
+def split_tree(tree_obj, count):
+    """Split the branch curves and leaf meshes parented to Tree empty tree_obj into count chunks
+    each, or fewer if there is too little geometry. Returns lists of the new curve and mesh objects"""
+    children = [obj for obj in bpy.data.objects if obj.parent == tree_obj]
+    parents = set(obj.parent.name for obj in bpy.data.objects if obj.parent is not None)
+    children = [obj for obj in children if obj.type in ('CURVE', 'MESH') and obj.dupli_type == 'NONE' and
+                obj.name not in parents]
+    curves = [obj for obj in children if obj.type == 'CURVE']
+    meshes = [(obj, MeshArrays(obj.data)) for obj in children if obj.type == 'MESH']
+
+    centres = [np.array([spline_arrays(spline)[0].mean(axis=0) for spline in obj.data.splines]).reshape(-1, 3)
+               for obj in curves]
+    anchors = [arrays.anchors() for _, arrays in meshes]
+    cells = kd_cells(np.concatenate(centres + anchors + [np.zeros((0, 3))]), count)
+
+    curve_objs = []
+    for obj, points in zip(curves, centres):
+        curve_objs.extend(split_curve(obj, cell_labels(cells, points)))
+    mesh_objs = []
+    for (obj, arrays), points in zip(meshes, anchors):
+        mesh_objs.extend(split_mesh(obj, arrays, cell_labels(cells, points)))
+    return curve_objs, mesh_objs
@@ -0,0 +1,214 @@
+"""Compact binary format for caching generated trees and passing them between processes.
+
+A file holds the branch skeleton, leaf transforms and optionally meshes in sections, each a flat
+array aligned to SECTION_ALIGN bytes, described by a JSON table at the start of the file. Positions
+are quantized to 16 bits across the bounding box of the tree, and spline points are stored as
+differences from the previous point of their spline, which compresses well when transferred. Handles
+are stored as 16 bit offsets from their point, radii as float16 and directions as octahedral
+encoded pairs of 16 bit values. Loading maps the file into memory and makes each section a NumPy view
+of it without copying or parsing, decoding to floats only happens when a property is read."""
+
+import json
+import struct
+
+import bpy
+import numpy as np
+
+from ch_trees.export import spline_arrays
+
+MAGIC = b'CHTREE01'
+SECTION_ALIGN = 64
+QUANT_MAX = 65535
+SNORM_MAX = 32767
+
+
+def quantize(values, low, high):
+    """Quantize values to uint16 steps between low and high"""
+    scale = np.where(high > low, high - low, 1)
+    return np.round((values - low) / scale * QUANT_MAX).astype('<u2')
+
+
+def dequantize(values, low, high):
+    """Inverse of quantize"""
+    return low + values.astype(float) / QUANT_MAX * (high - low)
+
+
+def oct_encode(vectors):
+    """Encode directions as two snorm16 values each by projecting onto an octahedron"""
+    vectors = np.asarray(vectors, dtype=float).reshape(-1, 3)
+    proj = vectors[:, :2] / np.maximum(np.abs(vectors).sum(axis=1), 1e-12)[:, None]
+    lower = vectors[:, 2] < 0
+    # fold the lower half of the octahedron over the upper
+    proj[lower] = (1 - np.abs(proj[lower][:, ::-1])) * np.where(proj[lower] >= 0, 1, -1)
+    return np.round(np.clip(proj, -1, 1) * SNORM_MAX).astype('<i2')
+
+
+def oct_decode(encoded):
+    """Inverse of oct_encode, returning unit vectors"""
+    proj = encoded.astype(float) / SNORM_MAX
+    z = 1 - np.abs(proj).sum(axis=1)
+    lower = z < 0
+    proj[lower] = (1 - np.abs(proj[lower][:, ::-1])) * np.where(proj[lower] >= 0, 1, -1)
+    vectors = np.column_stack((proj, z))
+    return vectors / np.linalg.norm(vectors, axis=1)[:, None]
+
+
+def write_compact(path, splines, leaves=None, meshes=None, meta=None):
+    """Write tree to path. splines is a list of (co, handle_left, handle_right, radius, resolution_u)
+    arrays per spline, leaves a tuple of (positions, directions, rights) arrays and meshes a dict of
+    name to (verts, triangles). meta is stored in the header as is"""
+    co = np.concatenate([spline[0] for spline in splines]) if splines else np.zeros((0, 3))
+    leaf_pos = np.zeros((0, 3)) if leaves is None else np.asarray(leaves[0], dtype=float).reshape(-1, 3)
+    everything = np.concatenate([co, leaf_pos] + [np.asarray(mesh[0]).reshape(-1, 3)
+                                                  for mesh in (meshes or {}).values()])
+    low = everything.min(axis=0) if len(everything) > 0 else np.zeros(3)
+    high = everything.max(axis=0) if len(everything) > 0 else np.zeros(3)
+
+    sections = {}
+    if splines:
+        lengths = np.array([len(spline[0]) for spline in splines])
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        points = quantize(co, low, high)
+        # differences wrap around in uint16 so decoding by cumulative sum is exact
+        deltas = points.copy()
+        deltas[1:] -= points[:-1]
+        deltas[starts] = points[starts]
+        handles = np.concatenate([np.concatenate((spline[1] - spline[0], spline[2] - spline[0]), axis=1)
+                                  for spline in splines])
+        handle_scale = max(float(np.abs(handles).max()), 1e-12)
+        sections['spline_lengths'] = lengths.astype('<u4')
+        sections['spline_resolution'] = np.array([spline[4] for spline in splines], dtype='u1')
+        sections['point_deltas'] = deltas
+        sections['handles'] = np.round(handles / handle_scale * SNORM_MAX).astype('<i2')
+        sections['radius'] = np.concatenate([spline[3] for spline in splines]).astype('<f2')
+    else:
+        handle_scale = 1
+    if leaves is not None and len(leaf_pos) > 0:
+        sections['leaf_positions'] = quantize(leaf_pos, low, high)
+        sections['leaf_directions'] = oct_encode(leaves[1])
+        sections['leaf_rights'] = oct_encode(leaves[2])
+    for name, (verts, tris) in (meshes or {}).items():
+        sections['mesh_%s_verts' % name] = quantize(np.asarray(verts, dtype=float).reshape(-1, 3), low, high)
+        sections['mesh_%s_tris' % name] = np.asarray(tris).astype('<u4').reshape(-1, 3)
+
+    header = {'low': low.tolist(), 'high': high.tolist(), 'handle_scale': handle_scale, 'meta': meta or {},
+              'sections': {}}
+    # the header holds the offsets so grow the space left for it until it fits
+    table = b''
+    first = 0
+    while len(MAGIC) + 4 + len(table) > first:
+        first = align(len(MAGIC) + 4 + len(table))
+        offset = first
+        for name, arr in sections.items():
+            header['sections'][name] = {'dtype': arr.dtype.str, 'shape': arr.shape, 'offset': offset}
+            offset = align(offset + arr.nbytes)
+        table = json.dumps(header).encode()
+    with open(path, 'wb') as out_file:
+        out_file.write(MAGIC + struct.pack('<I', len(table)) + table)
+        for name, arr in sections.items():
+            out_file.seek(header['sections'][name]['offset'])
+            out_file.write(np.ascontiguousarray(arr).tobytes())
+        out_file.truncate(offset)
+
+
+def align(offset):
+    """Round offset up to the next section boundary"""
+    return offset + (-offset % SECTION_ALIGN)
+
+
+def save_tree(path, tree, meta=None):
+    """Write branches and leaves of tree made by either generator to path"""
+    if tree.branches_curve is None:
+        raise Exception('Trees with branches split into several objects can\'t be saved')
+    splines = []
+    for spline in tree.branches_curve.splines:
+        splines.append(tuple(spline_arrays(spline)) + (spline.resolution_u,))
+    leaves = None
+    if tree.leaves_array:
+        leaves = tuple(np.array([tuple(getattr(leaf, attr)) for leaf in tree.leaves_array], dtype=float)
+                       for attr in ['position', 'direction', 'right'])
+    write_compact(path, splines, leaves, meta=meta)
+
+
+class CompactTree(object):
+    """Tree read from a compact file, sections being views of the mapped file"""
+
+    def __init__(self, path):
+        """Map file at path and make views of its sections"""
+        self.buffer = np.memmap(path, dtype='u1', mode='r')
+        if bytes(self.buffer[:len(MAGIC)]) != MAGIC:
+            raise Exception('%s is not a compact tree file' % path)
+        table_len = struct.unpack('<I', bytes(self.buffer[len(MAGIC):len(MAGIC) + 4]))[0]
+        header = json.loads(bytes(self.buffer[len(MAGIC) + 4:len(MAGIC) + 4 + table_len]).decode())
+        self.low = np.array(header['low'])
+        self.high = np.array(header['high'])
+        self.handle_scale = header['handle_scale']
+        self.meta = header['meta']
+        self.sections = {}
+        for name, section in header['sections'].items():
+            dtype = np.dtype(section['dtype'])
+            count = int(np.prod(section['shape']))
+            self.sections[name] = np.frombuffer(self.buffer, dtype, count, section['offset']).reshape(
+                section['shape'])
+
+    def spline_starts(self):
+        """Index of the first point of each spline"""
+        lengths = self.sections.get('spline_lengths', np.zeros(0, dtype='<u4'))
+        return np.concatenate(([0], np.cumsum(lengths, dtype=np.int64)[:-1])).astype(np.int64)
+
+    def points(self):
+        """Positions of all spline points"""
+        if 'point_deltas' not in self.sections:
+            return np.zeros((0, 3))
+        deltas = self.sections['point_deltas']
+        # cumulative sum wrapping in uint16, restarted at the first point of each spline
+        totals = np.cumsum(deltas, axis=0, dtype=np.uint16)
+        starts = self.spline_starts()
+        before = np.zeros((len(starts), 3), dtype=np.uint16)
+        before[1:] = totals[starts[1:] - 1]
+        return dequantize(totals - np.repeat(before, self.sections['spline_lengths'], axis=0), self.low, self.high)
+
+    def handles(self):
+        """Left and right handles of all spline points"""
+        points = self.points()
+        offsets = self.sections['handles'].astype(float) / SNORM_MAX * self.handle_scale
+        return points + offsets[:, :3], points + offsets[:, 3:]
+
+    def leaves(self):
+        """Positions, directions and right vectors of leaves"""
+        if 'leaf_positions' not in self.sections:
+            return np.zeros((0, 3)), np.zeros((0, 3)), np.zeros((0, 3))
+        return (dequantize(self.sections['leaf_positions'], self.low, self.high),
+                oct_decode(self.sections['leaf_directions']), oct_decode(self.sections['leaf_rights']))
+
+    def mesh(self, name):
+        """Vertices and triangles of mesh name"""
+        return (dequantize(self.sections['mesh_%s_verts' % name], self.low, self.high),
+                self.sections['mesh_%s_tris' % name])
+
+    def create_curve(self, name='branches', bevel_depth=1):
+        """Create Blender branch curve from the skeleton"""
+        curve = bpy.data.curves.new(name, type='CURVE')
+        curve.dimensions = '3D'
+        curve.resolution_u = 4
+        curve.fill_mode = 'FULL'
+        curve.bevel_depth = bevel_depth
+        curve.bevel_resolution = 10
+        curve.use_uv_as_generated = True
+        if 'spline_lengths' not in self.sections:
+            return curve
+        co = self.points().astype(np.float32)
+        handle_left, handle_right = (handle.astype(np.float32) for handle in self.handles())
+        radius = self.sections['radius'].astype(np.float32)
+        starts = self.spline_starts()
+        for start, length, resolution in zip(starts, self.sections['spline_lengths'],
+                                             self.sections['spline_resolution']):
+            spline = curve.splines.new('BEZIER')
+            spline.resolution_u = int(resolution)
+            spline.bezier_points.add(int(length) - 1)
+            end = start + length
+            spline.bezier_points.foreach_set('co', co[start:end].ravel())
+            spline.bezier_points.foreach_set('handle_left', handle_left[start:end].ravel())
+            spline.bezier_points.foreach_set('handle_right', handle_right[start:end].ravel())
+            spline.bezier_points.foreach_set('radius', radius[start:end])
+        return curve
@@ -0,0 +1,269 @@
+"""Fast estimates of the size of a tree, made without generating it.
+
+Both estimators sample the structure of the tree rather than building it. The Parametric estimator
+follows the stem length, split, branch and leaf count formulas of the generator down a random subset
+of the children of each stem. The L-System estimator rewrites a bounded random sample of the
+symbols at each iteration. Each sampled element stands in for all those it was chosen from, so the
+counts are unbiased estimates and the run time doesn't depend on the size of the tree. Pruning is
+ignored, so estimates for pruned Parametric trees are upper bounds."""
+
+import random
+from collections import namedtuple
+from math import ceil
+
+from ch_trees.leaf import Leaf
+from ch_trees.parametric.gen import Stem, Tree, rand_for_param_var
+
+Complexity = namedtuple('Complexity', ['symbols', 'stems', 'points', 'leaves', 'blossom', 'verts', 'faces',
+                                       'memory'])
+
+# branch curves are converted with a ring of 4 + 2 * bevel_resolution vertices per evaluated point
+RING_VERTS = 4 + 2 * 10
+
+# approximate bytes held per element, used for peak memory
+BEZIER_POINT_BYTES = 72  # Blender BezTriple
+CURVE_VERT_BYTES = 24  # evaluated position and normal of converted branch curves
+MESH_VERT_BYTES = 44  # MVert with its share of edges and normals
+MESH_FACE_BYTES = 44  # MPoly and its loops
+LEAF_BYTES = 600  # Leaf object and its three Vectors held until the mesh is made
+LEAF_BUILD_BYTES = 150  # Python side vertex or face of the leaf mesh before it is passed to Blender
+
+
+def estimate_parametric(param, samples=6):
+    """Estimate size of Parametric tree with TreeParam param, following at most samples children of
+    each stem. Random state is left as it was"""
+    r_state = random.getstate()
+    tree = Tree(param)
+    tree.split_num_error = [0, 0, 0, 0, 0, 0, 0]
+    tally = {'stems': [0] * max(1, param.levels), 'points': 0, 'segments': 0, 'leaves': 0}
+    for _ in range(param.floor_splits + 1):
+        tree.tree_scale = param.g_scale + rand_for_param_var() * param.g_scale_v
+        sample_stem(tree, Stem(0, None), 1, tally, samples, resolution=2)
+    random.setstate(r_state)
+
+    leaves = tally['leaves']
+    blossom = 0
+    if param.blossom_rate > 0:
+        blossom = leaves * param.blossom_rate
+        leaves -= blossom
+    return make_complexity(None, tally['stems'], tally['points'], tally['segments'], leaves, blossom,
+                           Leaf.get_shape(param.leaf_shape, 1, param.leaf_scale, param.leaf_scale_x),
+                           Leaf.get_shape(-param.blossom_shape, 1, param.blossom_scale, 1))
+
+
+def sample_stem(tree, stem, weight, tally, samples, start=0, num_branches_factor=1, clone_prob=1, resolution=6):
+    """Add weight times the size of stem and its children to tally, following make_stem without
+    making any geometry"""
+    param = tree.param
+    depth = stem.depth
+    d_plus_1 = min(3, depth + 1)
+    if 0 <= stem.radius_limit < 0.0001:
+        return
+    if start == 0:
+        stem.length_child_max = param.length[d_plus_1] + rand_for_param_var() * param.length_v[d_plus_1]
+        stem.length = tree.calc_stem_length(stem)
+        stem.radius = tree.calc_stem_radius(stem)
+        if depth == 0:
+            tree.base_length = stem.length * param.base_size[0]
+    if stem.length <= 0:
+        return
+
+    curve_res = int(param.curve_res[depth])
+    n_points = stem_points(param, depth, start)
+    if depth < len(tally['stems']):
+        tally['stems'][depth] += weight
+    tally['points'] += weight * n_points
+    tally['segments'] += weight * (n_points - 1) * resolution
+
+    is_leaves = depth == param.levels - 1 and depth > 0 and param.leaf_blos_num != 0
+    if is_leaves:
+        count = tree.calc_leaf_count(stem) * (1 - start / curve_res)
+    elif depth < param.levels - 1:
+        count = tree.calc_branch_count(stem) * (1 - start / curve_res) * num_branches_factor
+    else:
+        count = 0
+    base_seg_ind = ceil(param.base_size[0] * int(param.curve_res[0]))
+    seg_splits = param.seg_splits[depth]
+    num_error = 0
+    offsets = []
+    for seg_ind in range(start + 1, curve_res + 1):
+        # splits as decided by StemWalk, clones are followed in full
+        num_of_splits = 0
+        if param.curve_v[depth] >= 0:
+            if param.base_splits > 0 and depth == 0 and seg_ind == base_seg_ind:
+                num_of_splits = int(param.base_splits)
+            elif seg_splits > 0 and seg_ind < curve_res and (depth > 0 or seg_ind > base_seg_ind):
+                if random.random() <= clone_prob:
+                    num_of_splits = int(seg_splits + tree.split_num_error[depth])
+                    tree.split_num_error[depth] -= num_of_splits - seg_splits
+                    clone_prob /= num_of_splits + 1
+                    num_branches_factor = max(0.8, num_branches_factor / (num_of_splits + 1))
+                    if not is_leaves:
+                        count *= num_branches_factor
+
+        # positions of branches or leaves on this segment
+        if count < 0:
+            if seg_ind == curve_res:
+                offsets.extend([1] * abs(int(count)))
+        elif count > 0:
+            on_seg = int(count / curve_res + num_error)
+            num_error -= on_seg - count / curve_res
+            offsets.extend(seg_offsets(tree, stem, seg_ind, on_seg))
+
+        for _ in range(num_of_splits):
+            sample_stem(tree, stem.copy(), weight, tally, samples, seg_ind, num_branches_factor, clone_prob,
+                        resolution)
+
+    if is_leaves:
+        tally['leaves'] += weight * len(offsets)
+    elif len(offsets) > 0:
+        chosen = random.sample(offsets, min(samples, len(offsets)))
+        for stem_offset in chosen:
+            if count < 0:
+                radius_limit = 0
+            else:
+                radius_limit = tree.radius_at_offset(stem, stem_offset / stem.length)
+            sample_stem(tree, Stem(depth + 1, None, stem, stem_offset, radius_limit),
+                        weight * len(offsets) / len(chosen), tally, samples)
+
+
+def stem_points(param, depth, start=0):
+    """Number of bezier points on spline for stem at depth starting at segment start, with extra
+    points per segment at a flared base"""
+    curve_res = int(param.curve_res[depth])
+    if depth == 0 or param.taper[depth] > 1:
+        points_per_seg = ceil(max(1, 100 / curve_res))
+    else:
+        points_per_seg = 2
+    return 1 + (curve_res - start) * (points_per_seg - 1)
+
+
+def seg_offsets(tree, stem, seg_ind, on_seg):
+    """Offsets along stem of on_seg branches or leaves on segment seg_ind, as placed by make_branches"""
+    param = tree.param
+    d_plus_1 = min(3, stem.depth + 1)
+    base_length = stem.length * param.base_size[stem.depth]
+    branch_dist = param.branch_dist[d_plus_1]
+    curve_res = int(param.curve_res[stem.depth])
+    offsets = []
+    if branch_dist > 1:
+        # whorled, rounded to a whole number of whorls
+        num_of_whorls = int(on_seg / (branch_dist + 1))
+        for whorl_num in range(num_of_whorls):
+            stem_offset = (((seg_ind - 1) + whorl_num / num_of_whorls) / curve_res) * stem.length
+            if stem_offset > base_length:
+                offsets.extend([stem_offset] * int(branch_dist + 1))
+    else:
+        for branch_ind in range(on_seg):
+            if branch_ind % 2 == 0:
+                offset = min(max(0, branch_ind / on_seg), 1)
+            else:
+                offset = min(max(0, (branch_ind - branch_dist) / on_seg), 1)
+            stem_offset = (((seg_ind - 1) + offset) / curve_res) * stem.length
+            if stem_offset > base_length:
+                offsets.append(stem_offset)
+    return offsets
+
+
+def estimate_lsystem(modname, iterations, samples=2000):
+    """Estimate size of L-System tree defined in module modname after iterations iterations, keeping
+    at most samples symbols that still have rules to apply at each iteration. Random state is left as
+    it was"""
+    r_state = random.getstate()
+    mod = __import__(modname, fromlist=[''])
+    l_sys = mod.system(0)
+    rules = l_sys.rules
+    counts = {}
+
+    def tally(dat, weight):
+        """count symbol which will appear in the final system"""
+        counts[dat.letter] = counts.get(dat.letter, 0) + weight
+        if dat.letter == "F" and dat.parameters and "leaves" in dat.parameters and \
+                abs(dat.parameters["leaves"]) > 1:
+            counts["leaves"] = counts.get("leaves", 0) + weight * abs(dat.parameters["leaves"])
+
+    def expand(symbols, weight, owed, output):
+        """tally symbols made from a symbol of weight, adding those with rules to apply to output. The
+        branch they start in owes a spline to the fraction owed of its branch. As in index_branches a
+        branch gets a spline if it has an F directly within it, until then its symbols with rules to
+        apply share what it owes"""
+        # owed fraction, whether an F has been seen and symbols with rules of each open branch
+        stack = [[owed, False, []]]
+
+        def settle():
+            """close innermost open branch"""
+            branch_owed, has_f, pending = stack.pop()
+            if has_f:
+                counts["splines"] = counts.get("splines", 0) + weight * branch_owed
+                branch_owed = 0
+            for dat in pending:
+                output.append((dat, weight, branch_owed / len(pending)))
+
+        for dat in symbols:
+            if dat.letter in rules:
+                if dat.letter == "F":
+                    # rewritten but still an F, so the branch needs its spline now
+                    stack[-1][1] = True
+                stack[-1][2].append(dat)
+                continue
+            tally(dat, weight)
+            if dat.letter == "[":
+                stack.append([1, False, []])
+            elif dat.letter == "]":
+                settle()
+                if len(stack) == 0:
+                    # closes a branch opened before these symbols, what follows is in a branch that
+                    # isn't tracked
+                    stack.append([0, False, []])
+            elif dat.letter == "F":
+                stack[-1][1] = True
+        while len(stack) > 0:
+            settle()
+
+    # the trunk is always made so owes nothing
+    population = []
+    expand(l_sys.data, 1, 0, population)
+    for _ in range(iterations):
+        output = []
+        for dat, weight, owed in population:
+            expand(rules[dat.letter](dat), weight, owed, output)
+        if len(output) > samples:
+            # resample to keep work bounded, chosen symbols stand in for the total weight
+            total = sum(weight for _, weight, _ in output)
+            chosen = random.choices([(dat, owed) for dat, _, owed in output], [weight for _, weight, _ in output],
+                                    k=samples)
+            output = [(dat, total / samples, owed) for dat, owed in chosen]
+        population = output
+    for dat, weight, _ in population:
+        # branches still waiting on these symbols never get an F so have no spline
+        tally(dat, weight)
+    random.setstate(r_state)
+
+    # the trunk and every branch with an F get a spline with a point for its start and one per F
+    splines = 1 + counts.get("splines", 0)
+    n_f = counts.get("F", 0)
+    leaves = counts.get("L", 0) + counts.get("leaves", 0)
+    blossom = leaves * l_sys.blossom_rate
+    return make_complexity(sum(count for letter, count in counts.items() if letter not in ("leaves", "splines")),
+                           (splines,),
+                           n_f + splines, n_f * 4, leaves - blossom, blossom,
+                           Leaf.get_shape(l_sys.leaf_shape, 1, l_sys.leaf_scale, l_sys.leaf_scale_x),
+                           Leaf.get_shape(l_sys.blossom_shape, 1, l_sys.blossom_scale, 1))
+
+
+def make_complexity(symbols, stems, points, segments, leaves, blossom, leaf_shape, blossom_shape):
+    """Work out vertex, face and memory estimates from counts, segments being the number of evaluated
+    curve segments over all splines"""
+    splines = sum(stems)
+    curve_verts = (segments + splines) * RING_VERTS
+    curve_faces = segments * RING_VERTS
+    leaf_verts = leaves * len(leaf_shape[0]) + blossom * len(blossom_shape[0])
+    leaf_faces = leaves * len(leaf_shape[1]) + blossom * len(blossom_shape[1])
+    memory = (points * BEZIER_POINT_BYTES + curve_verts * CURVE_VERT_BYTES +
+              (leaves + blossom) * LEAF_BYTES + (leaf_verts + leaf_faces) * LEAF_BUILD_BYTES +
+              (curve_verts + leaf_verts) * MESH_VERT_BYTES + (curve_faces + leaf_faces) * MESH_FACE_BYTES)
+    if symbols is not None:
+        symbols = int(round(symbols))
+    return Complexity(symbols, tuple(int(round(count)) for count in stems), int(round(points)),
+                      int(round(leaves)), int(round(blossom)), int(round(curve_verts + leaf_verts)),
+                      int(round(curve_faces + leaf_faces)), int(round(memory)))
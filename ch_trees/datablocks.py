@@ -0,0 +1,146 @@
+"""Reuse and removal of the Blender objects and datablocks made for trees.
+
+Generating a tree again, for example while searching seeds or tuning parameters, would otherwise
+leave the objects, curves and meshes of every earlier tree in the file. A DatablockReuse hands the
+objects of the tree being replaced to the tree replacing it: the Tree empty is kept and each branch
+curve or leaf mesh object is taken over by the new object of the same name, its data cleared and
+filled again rather than a new datablock being made. Objects the new tree doesn't make are removed
+when it is finished, so the file holds one copy of the tree however often it is regenerated.
+purge_orphans removes what earlier trees left behind without any object using it."""
+
+import re
+
+import bpy
+
+# types of object whose data can be cleared and filled again
+REUSABLE_TYPES = ('CURVE', 'MESH')
+
+
+def remove_objects(objs):
+    """Unlink and remove objects along with their data and any objects parented to them"""
+    for obj in objs:
+        # compare rather than test identity as Blender may wrap the same object in different Python objects
+        remove_objects([child for child in bpy.data.objects if child.parent == obj])
+        if obj.name in bpy.context.scene.objects:
+            bpy.context.scene.objects.unlink(obj)
+        obj_type, data = obj.type, obj.data
+        bpy.data.objects.remove(obj)
+        if obj_type == 'CURVE':
+            bpy.data.curves.remove(data)
+        elif obj_type == 'MESH':
+            bpy.data.meshes.remove(data)
+
+
+def remove_groups(groups):
+    """Remove those of groups no object instances any more, along with the objects in them"""
+    for group in groups:
+        if group.name not in bpy.data.groups or \
+                any(obj.dupli_group == group for obj in bpy.data.objects if obj.dupli_group is not None):
+            continue
+        remove_objects(list(group.objects))
+        bpy.data.groups.remove(group)
+
+
+def base_name(name):
+    """Name without the numeric suffix Blender adds to make it unique"""
+    return re.sub(r'\.\d{3}$', '', name)
+
+
+def new_data(name, data_type):
+    """New empty curve or mesh datablock called name"""
+    if data_type == 'CURVE':
+        return bpy.data.curves.new(name, type='CURVE')
+    return bpy.data.meshes.new(name)
+
+
+def clear_data(obj):
+    """Remove all geometry from the curve or mesh of obj, keeping its settings and materials"""
+    if obj.type == 'CURVE':
+        obj.data.splines.clear()
+    elif hasattr(obj.data, 'clear_geometry'):
+        obj.data.clear_geometry()
+    else:
+        # meshes can't be emptied through the API before Blender 2.81, so write an empty bmesh to it
+        import bmesh
+        empty = bmesh.new()
+        empty.to_mesh(obj.data)
+        empty.free()
+
+
+class DatablockReuse(object):
+    """Objects of a tree being replaced, for the tree replacing it to take over"""
+
+    def __init__(self, tree_obj, objects=None):
+        """Offer the Tree empty tree_obj and objects, by default all children of tree_obj. Children
+        that can't be reused, such as instancing carriers, are removed straight away"""
+        if objects is None:
+            objects = [obj for obj in bpy.data.objects if obj.parent == tree_obj]
+        self.tree_obj = tree_obj
+        self.spare = {}
+        unusable = []
+        for obj in objects:
+            has_children = any(child.parent == obj for child in bpy.data.objects)
+            if obj.type in REUSABLE_TYPES and obj.dupli_type == 'NONE' and not has_children:
+                self.spare.setdefault((obj.type, base_name(obj.name)), []).append(obj)
+            else:
+                unusable.append(obj)
+        groups = [obj.dupli_group for obj in unusable if obj.dupli_group is not None]
+        remove_objects(unusable)
+        remove_groups(groups)
+
+    @classmethod
+    def from_tree(cls, tree):
+        """Reuse of the objects of tree, made by either generator, which no longer refers to them"""
+        reuse = cls(tree.tree_obj)
+        tree.tree_obj = None
+        return reuse
+
+    def take_tree(self):
+        """The Tree empty, made active"""
+        bpy.context.scene.objects.active = self.tree_obj
+        return self.tree_obj
+
+    def take(self, name, data_type):
+        """Object called name with data of data_type, 'CURVE' or 'MESH', emptied of geometry. None if
+        there isn't one"""
+        spare = self.spare.get((data_type, name))
+        if not spare:
+            return None
+        obj = spare.pop(0)
+        clear_data(obj)
+        return obj
+
+    def finish(self):
+        """Remove the objects that weren't taken"""
+        for spare in self.spare.values():
+            remove_objects(spare)
+        self.spare = {}
+
+
+def purge_orphans():
+    """Remove objects in no scene or group, groups no object instances, and curves and meshes no object
+    uses, as left by trees removed without their data. Datablocks with a fake user are kept. Returns
+    the number of each kind removed"""
+    removed = {'objects': 0, 'groups': 0, 'curves': 0, 'meshes': 0}
+    while True:
+        linked = set(obj.name for scene in bpy.data.scenes for obj in scene.objects)
+        linked.update(obj.name for group in bpy.data.groups for obj in group.objects)
+        objects = [obj for obj in bpy.data.objects if obj.name not in linked and not obj.use_fake_user]
+        for obj in objects:
+            bpy.data.objects.remove(obj)
+        instanced = set(obj.dupli_group.name for obj in bpy.data.objects if obj.dupli_group is not None)
+        groups = [group for group in bpy.data.groups if group.name not in instanced and not group.use_fake_user]
+        for group in groups:
+            bpy.data.groups.remove(group)
+        removed['objects'] += len(objects)
+        removed['groups'] += len(groups)
+        # removing a group may leave its objects unlinked
+        if not groups:
+            break
+    used = set((obj.type, obj.data.name) for obj in bpy.data.objects if obj.data is not None)
+    for kind, data_type in [('curves', 'CURVE'), ('meshes', 'MESH')]:
+        collection = getattr(bpy.data, kind)
+        for data in [data for data in collection if (data_type, data.name) not in used and not data.use_fake_user]:
+            collection.remove(data)
+            removed[kind] += 1
+    return removed
@@ -0,0 +1,310 @@
+"""Exporters writing tree geometry straight to binary glTF (.glb) or Wavefront OBJ files.
+
+Exporters are given the geometry piece by piece as the tree is generated rather than reading back
+Blender meshes. Branch curves are tessellated into tubes one spline at a time, as Blender would with
+a full bevel, and leaves are passed on in chunks of at most CHUNK_VERTS vertices as they are made, so
+neither the evaluated branch mesh nor the full leaf vertex and face lists are held in memory. OBJ
+lines are written as each chunk arrives. GLB needs the size of its binary chunk up front, so each
+attribute is streamed to its own temporary file next to the output and these are copied into place
+when the exporter is closed. Both outputs are converted from Blender's Z up to Y up."""
+
+import json
+import os
+import shutil
+import struct
+import tempfile
+
+import numpy as np
+
+# leaves are passed to the exporter whenever this many vertices have been made
+CHUNK_VERTS = 65536
+
+# glTF constants
+FLOAT = 5126
+UNSIGNED_INT = 5125
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+TRIANGLES = 4
+
+# materials of each mesh, leaves are seen from both sides
+MATERIALS = {'branches': ('Bark', False), 'leaves': ('Leaves', True), 'blossom': ('Blossom', True)}
+
+
+def make_exporter(path):
+    """Exporter for path, chosen by its extension"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.glb':
+        return GLBExporter(path)
+    if ext == '.obj':
+        return OBJExporter(path)
+    raise Exception('Unknown export format %s, use .glb or .obj' % ext)
+
+
+def check_export_options(instancing, chunks, bevel_tolerance):
+    """Raise if a tree being exported is also asked to be instanced or split into several objects,
+    neither of which the flat meshes written as the tree is made can hold"""
+    if instancing:
+        raise Exception('Exported trees can\'t be instanced')
+    if chunks > 1 or bevel_tolerance is not None:
+        raise Exception('Exported trees can\'t be split into several objects')
+
+
+def to_y_up(coords):
+    """Convert Blender Z up coordinates to Y up"""
+    return np.column_stack((coords[:, 0], coords[:, 2], -coords[:, 1]))
+
+
+def spline_arrays(spline):
+    """Control points, handles and radii of bezier spline as NumPy arrays"""
+    n_points = len(spline.bezier_points)
+    arrays = []
+    for attr in ['co', 'handle_left', 'handle_right']:
+        arr = np.zeros(n_points * 3)
+        spline.bezier_points.foreach_get(attr, arr)
+        arrays.append(arr.reshape(-1, 3))
+    radius = np.zeros(n_points)
+    spline.bezier_points.foreach_get('radius', radius)
+    arrays.append(radius)
+    return arrays
+
+
+def tessellate_spline(spline, bevel_depth, sides):
+    """Vertices, normals and triangles of tube with sides sides around bezier spline, evaluated at
+    resolution_u points per segment with radius scaled by bevel_depth. Ends are left open as Blender
+    does without fill caps. Returns None for splines with no segments"""
+    co, handle_left, handle_right, radius = spline_arrays(spline)
+    if len(co) < 2:
+        return None
+    res = max(1, spline.resolution_u)
+    # evaluate each segment at res points, plus the end of the last segment
+    t = np.arange(res) / res
+    p0, p1, p2, p3 = co[:-1, None], handle_right[:-1, None], handle_left[1:, None], co[1:, None]
+    s = 1 - t[None, :, None]
+    u = t[None, :, None]
+    centres = s ** 3 * p0 + 3 * s ** 2 * u * p1 + 3 * s * u ** 2 * p2 + u ** 3 * p3
+    tangents = 3 * s ** 2 * (p1 - p0) + 6 * s * u * (p2 - p1) + 3 * u ** 2 * (p3 - p2)
+    centres = np.concatenate((centres.reshape(-1, 3), co[-1:]))
+    tangents = np.concatenate((tangents.reshape(-1, 3), (co[-1] - handle_left[-1])[None]))
+    radii = np.concatenate(((radius[:-1, None] * (1 - t) + radius[1:, None] * t).ravel(), radius[-1:]))
+
+    # carry a frame along the spline by projecting the previous normal, keeping the tube untwisted
+    lengths = np.linalg.norm(tangents, axis=1)
+    normals = np.zeros_like(tangents)
+    normal = None
+    tangent = np.array([0., 0., 1.])
+    for ind in range(len(tangents)):
+        if lengths[ind] > 1e-12:
+            tangent = tangents[ind] / lengths[ind]
+        if normal is None:
+            normal = np.cross(tangent, [1., 0., 0.] if abs(tangent[0]) < 0.9 else [0., 1., 0.])
+        normal = normal - normal.dot(tangent) * tangent
+        normal /= np.linalg.norm(normal)
+        normals[ind] = normal
+        tangents[ind] = tangent
+    binormals = np.cross(tangents, normals)
+
+    angles = 2 * np.pi * np.arange(sides) / sides
+    ring = (np.cos(angles)[None, :, None] * normals[:, None] +
+            np.sin(angles)[None, :, None] * binormals[:, None])
+    verts = centres[:, None] + ring * (radii * bevel_depth)[:, None, None]
+
+    # two triangles per quad between consecutive rings
+    rings = len(centres)
+    ring_start = np.arange(rings - 1)[:, None] * sides
+    side = np.arange(sides)[None, :]
+    a = ring_start + side
+    b = ring_start + (side + 1) % sides
+    c = b + sides
+    d = a + sides
+    tris = np.stack((a, b, c, a, c, d), axis=-1).reshape(-1, 3)
+    return verts.reshape(-1, 3), ring.reshape(-1, 3), tris
+
+
+def triangulate(faces):
+    """Array of triangles fanning out over each polygon in faces"""
+    tris = []
+    for face in faces:
+        for ind in range(1, len(face) - 1):
+            tris.append((face[0], face[ind], face[ind + 1]))
+    return np.array(tris, dtype=np.int64).reshape(-1, 3)
+
+
+def vertex_normals(verts, tris):
+    """Normals of verts averaged from the area weighted normals of triangles tris using them"""
+    face_normals = np.cross(verts[tris[:, 1]] - verts[tris[:, 0]], verts[tris[:, 2]] - verts[tris[:, 0]])
+    normals = np.zeros_like(verts)
+    for corner in range(3):
+        np.add.at(normals, tris[:, corner], face_normals)
+    lengths = np.linalg.norm(normals, axis=1)
+    normals[lengths == 0] = (0, 0, 1)
+    lengths[lengths == 0] = 1
+    return normals / lengths[:, None]
+
+
+class TreeExporter(object):
+    """Base of exporters given the meshes of a tree chunk by chunk. Subclasses implement write_chunk
+    and close"""
+    path = None
+
+    def __init__(self, path):
+        """Set up exporter writing to path"""
+        self.path = path
+        # vertices written so far to each mesh
+        self.counts = {}
+
+    def add_branches(self, curve, name='branches'):
+        """Tessellate each spline of branch curve into a tube and add it to mesh name"""
+        sides = 4 + 2 * curve.bevel_resolution
+        for spline in curve.splines:
+            tube = tessellate_spline(spline, curve.bevel_depth, sides)
+            if tube is not None:
+                self.add_chunk(name, *tube)
+
+    def add_leaves(self, name, verts, faces):
+        """Add chunk of leaf verts and faces to mesh name. Faces index the whole mesh, as made by
+        Leaf.get_mesh, rather than just this chunk"""
+        if len(verts) == 0:
+            return
+        verts = np.array(verts, dtype=float).reshape(-1, 3)
+        tris = triangulate(faces) - self.counts.get(name, 0)
+        self.add_chunk(name, verts, vertex_normals(verts, tris), tris)
+
+    def add_chunk(self, name, verts, normals, tris):
+        """Add verts, normals and tris, indexing verts, to mesh name"""
+        self.write_chunk(name, to_y_up(verts), to_y_up(normals), tris)
+        self.counts[name] = self.counts.get(name, 0) + len(verts)
+
+    def write_chunk(self, name, verts, normals, tris):
+        """Write chunk of mesh name, converted to Y up"""
+        raise NotImplementedError
+
+    def close(self):
+        """Finish writing the file"""
+        raise NotImplementedError
+
+
+class OBJExporter(TreeExporter):
+    """Exporter writing Wavefront OBJ, each mesh being a group"""
+
+    def __init__(self, path):
+        """Open path for writing"""
+        super().__init__(path)
+        self.file = open(path, 'w')
+        self.file.write('# tree exported by ch_trees\n')
+        self.written = 0
+        self.group = None
+
+    def write_chunk(self, name, verts, normals, tris):
+        """Write vertices, normals and faces of chunk, starting a group if the mesh has changed"""
+        if name != self.group:
+            self.file.write('g %s\n' % name)
+            self.group = name
+        np.savetxt(self.file, verts, fmt='v %.6f %.6f %.6f')
+        np.savetxt(self.file, normals, fmt='vn %.4f %.4f %.4f')
+        # obj indices count from 1 over the whole file, each vertex has its own normal
+        tris = np.repeat(tris + self.written + 1, 2, axis=1)
+        np.savetxt(self.file, tris, fmt='f %i//%i %i//%i %i//%i')
+        self.written += len(verts)
+
+    def close(self):
+        """Close the file"""
+        self.file.close()
+
+
+class GLBStream(object):
+    """Attribute of one mesh streamed to a temporary file until the GLB is assembled"""
+
+    def __init__(self, directory, dtype, target):
+        """Set up empty stream of values of dtype for bufferView target"""
+        self.file = tempfile.TemporaryFile(dir=directory)
+        self.dtype = dtype
+        self.target = target
+        self.count = 0
+        self.min = None
+        self.max = None
+
+    def write(self, arr, bounds=False):
+        """Append rows of arr, keeping their bounds if needed"""
+        arr = np.ascontiguousarray(arr, dtype=self.dtype)
+        self.file.write(arr.tobytes())
+        self.count += len(arr)
+        if bounds:
+            low, high = arr.min(axis=0), arr.max(axis=0)
+            self.min = low if self.min is None else np.minimum(self.min, low)
+            self.max = high if self.max is None else np.maximum(self.max, high)
+
+    def byte_length(self):
+        """Number of bytes written"""
+        return self.file.tell()
+
+
+class GLBExporter(TreeExporter):
+    """Exporter writing binary glTF 2.0, each mesh being a node under a root Tree node"""
+
+    def __init__(self, path):
+        """Set up streams in the directory of path"""
+        super().__init__(path)
+        self.directory = os.path.dirname(os.path.abspath(path))
+        self.meshes = {}
+        self.order = []
+
+    def write_chunk(self, name, verts, normals, tris):
+        """Append chunk to the streams of mesh name"""
+        if name not in self.meshes:
+            self.meshes[name] = (GLBStream(self.directory, '<f4', ARRAY_BUFFER),
+                                 GLBStream(self.directory, '<f4', ARRAY_BUFFER),
+                                 GLBStream(self.directory, '<u4', ELEMENT_ARRAY_BUFFER))
+            self.order.append(name)
+        positions, vert_normals, indices = self.meshes[name]
+        # indices cover the whole mesh
+        indices.write((tris + positions.count).reshape(-1))
+        positions.write(verts, True)
+        vert_normals.write(normals)
+
+    def close(self):
+        """Write header, JSON and binary chunks, copying the binary data from the streams"""
+        gltf = {'asset': {'version': '2.0', 'generator': 'ch_trees'}, 'scene': 0,
+                'scenes': [{'nodes': [0]}], 'nodes': [{'name': 'Tree', 'children': []}],
+                'meshes': [], 'materials': [], 'accessors': [], 'bufferViews': [], 'buffers': []}
+        streams = []
+        offset = 0
+        for name in self.order:
+            attributes = []
+            for stream, components in zip(self.meshes[name], ['VEC3', 'VEC3', 'SCALAR']):
+                accessor = {'bufferView': len(streams), 'componentType': FLOAT, 'count': stream.count,
+                            'type': components}
+                if stream.target == ELEMENT_ARRAY_BUFFER:
+                    accessor['componentType'] = UNSIGNED_INT
+                if stream.min is not None:
+                    accessor['min'] = [float(val) for val in stream.min]
+                    accessor['max'] = [float(val) for val in stream.max]
+                gltf['bufferViews'].append({'buffer': 0, 'byteOffset': offset,
+                                            'byteLength': stream.byte_length(), 'target': stream.target})
+                attributes.append(len(gltf['accessors']))
+                gltf['accessors'].append(accessor)
+                # every value is 4 bytes so views stay aligned
+                offset += stream.byte_length()
+                streams.append(stream)
+            material_name, double_sided = MATERIALS.get(name, (name, False))
+            gltf['materials'].append({'name': material_name, 'doubleSided': double_sided,
+                                      'pbrMetallicRoughness': {'metallicFactor': 0}})
+            gltf['meshes'].append({'name': name, 'primitives': [{
+                'attributes': {'POSITION': attributes[0], 'NORMAL': attributes[1]}, 'indices': attributes[2],
+                'material': len(gltf['materials']) - 1, 'mode': TRIANGLES}]})
+            gltf['nodes'][0]['children'].append(len(gltf['nodes']))
+            gltf['nodes'].append({'name': name, 'mesh': len(gltf['meshes']) - 1})
+        if offset > 0:
+            gltf['buffers'].append({'byteLength': offset})
+
+        json_chunk = json.dumps(gltf, separators=(',', ':')).encode()
+        json_chunk += b' ' * (-len(json_chunk) % 4)
+        with open(self.path, 'wb') as out_file:
+            out_file.write(struct.pack('<III', 0x46546C67, 2, 12 + 8 + len(json_chunk) + 8 + offset))
+            out_file.write(struct.pack('<II', len(json_chunk), 0x4E4F534A))
+            out_file.write(json_chunk)
+            out_file.write(struct.pack('<II', offset, 0x004E4942))
+            for stream in streams:
+                stream.file.seek(0)
+                shutil.copyfileobj(stream.file, out_file, 1 << 20)
+                stream.file.close()
+        self.meshes = {}
@@ -0,0 +1,402 @@
+"""Pool of persistent headless Blender workers generating trees for jobs sent over a local socket.
+
+Starting Blender can take longer than generating a small tree, so the daemon keeps workers running
+with ch_trees already imported. Clients connect to a Unix socket (an address containing '/') or a
+TCP host:port and send one JSON job per line, getting one JSON result per line back. A job is a
+dict with
+    kind     'parametric' (default) or 'lsystem'
+    preset   name of the preset in tree_params or sys_defs
+    params   Parametric parameters overriding those of the preset
+    seed     random seed, 0 for a random one
+    output   path to write to, .glb or .obj to export, .cht for a compact tree or .blend
+    render   path to render an image of the tree to
+    budget   limits of a Budget to keep the tree within
+and the result has ok, error (if not ok), stems, leaves, output, the worker pid and timings of the
+job in the queue, in the worker and of each generation phase. {"status": true} returns queue and
+worker counts instead. Workers are restarted after max_jobs jobs to limit memory growth, or if
+they die. A worker that can't be restarted after RESTART_DELAYS attempts fails the job it was
+running and leaves the pool, and once none are left queued jobs fail and the daemon stops.
+
+Workers talk to the daemon over their stdin and a copy of their original stdout, everything printed
+while generating goes to stderr so can't get mixed up with results.
+
+Run from the repository root, e.g.
+    python -m ch_trees.farm serve /tmp/ch_trees.sock --workers 4 --max-jobs 50
+    python -m ch_trees.farm submit /tmp/ch_trees.sock palm --seed 3 --output palm.glb
+    python -m ch_trees.farm serve 127.0.0.1:8765 --python   (workers under plain Python, no Blender)"""
+
+import argparse
+import json
+import os
+import queue
+import random
+import signal
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import traceback
+from time import sleep, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# every line of the worker protocol starts with this, anything else Blender prints is skipped
+PREFIX = 'CHFARM '
+
+# seconds waited before each further attempt to start a worker again after the first fails
+RESTART_DELAYS = [1, 2, 4, 8]
+
+
+def parse_address(address):
+    """Socket family and address for address, a Unix socket path or host:port"""
+    if '/' in address or ':' not in address:
+        return socket.AF_UNIX, address
+    host, port = address.rsplit(':', 1)
+    return socket.AF_INET, (host, int(port))
+
+
+def submit(address, job):
+    """Send job to the farm at address and wait for its result"""
+    family, addr = parse_address(address)
+    with socket.socket(family, socket.SOCK_STREAM) as sock:
+        sock.connect(addr)
+        stream = sock.makefile('rw')
+        stream.write(json.dumps(job) + '\n')
+        stream.flush()
+        return json.loads(stream.readline())
+
+
+# worker side
+
+
+def run_job(job):
+    """Generate the tree for job in this process, returning its result"""
+    from ch_trees.standin.fallback import install_fallback
+    install_fallback()
+    from ch_trees.parametric import gen
+    from ch_trees.lsystems import treegen
+    from ch_trees import compact
+    from ch_trees.budget import Budget
+    import bpy
+
+    start_time = time()
+    kind = job.get('kind', 'parametric')
+    output = job.get('output')
+    export_path = output if output is not None and os.path.splitext(output)[1] in ('.glb', '.obj') else None
+    render = job.get('render')
+    seed = job.get('seed', 0)
+    budget = Budget(**job['budget']) if job.get('budget') else None
+    if kind == 'parametric':
+        mod = __import__('ch_trees.parametric.tree_params.' + job['preset'], fromlist=[''])
+        params = dict(mod.params)
+        params.update(job.get('params', {}))
+        tree = gen.construct(params, seed, render is not None, render, budget=budget, export_path=export_path)
+        stems, leaves = tree.stem_count, len(tree.leaves_array)
+    elif kind == 'lsystem':
+        if seed != 0:
+            random.seed(seed)
+        tree = treegen.construct('ch_trees.lsystems.sys_defs.' + job['preset'], budget=budget,
+                                 export_path=export_path)
+        stems, leaves = tree.stem_count, tree.leaf_count
+        if render is not None:
+            bpy.data.scenes['Scene'].render.filepath = render
+            bpy.ops.render.render(write_still=True)
+    else:
+        raise Exception('Unknown kind of tree %s' % kind)
+    if output is not None and output.endswith('.cht'):
+        compact.save_tree(output, tree, {'preset': job['preset'], 'seed': seed})
+    elif output is not None and output.endswith('.blend'):
+        bpy.ops.wm.save_as_mainfile(filepath=output, copy=True)
+    timings = dict(tree.phase_times)
+    # clear the scene for the next job
+    tree.remove()
+    timings['generate'] = time() - start_time
+    return {'ok': True, 'stems': stems, 'leaves': leaves, 'output': output, 'timings': timings}
+
+
+def worker_main():
+    """Serve jobs read from stdin until told to quit, writing results to the original stdout"""
+    sys.path.insert(0, ROOT)
+    # the daemon stops its workers, so don't let an interrupt meant for it stop them mid job
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    results = os.fdopen(os.dup(1), 'w')
+    # send everything else printed, including by Blender itself, to stderr
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+    # import the generators before saying we're ready so jobs don't wait for them
+    from ch_trees.standin.fallback import install_fallback
+    install_fallback()
+    from ch_trees.parametric import gen  # noqa: F401
+    from ch_trees.lsystems import treegen  # noqa: F401
+    results.write(PREFIX + json.dumps({'ready': os.getpid()}) + '\n')
+    results.flush()
+    for line in sys.stdin:
+        job = json.loads(line)
+        if job.get('quit'):
+            break
+        try:
+            result = run_job(job)
+        except Exception:
+            result = {'ok': False, 'error': traceback.format_exc()}
+        results.write(PREFIX + json.dumps(result) + '\n')
+        results.flush()
+
+
+# daemon side
+
+
+class Worker(object):
+    """Worker process and the thread feeding it jobs from the queue"""
+    process = None
+    jobs_done = 0
+    restarts = 0
+    # why the worker couldn't be restarted, once it has left the pool
+    error = None
+
+    def __init__(self, farm):
+        """Set up worker for farm, starting its process and thread"""
+        self.farm = farm
+        self.start()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def start(self):
+        """Start a new worker process and wait until it's ready"""
+        self.process = subprocess.Popen(self.farm.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=self.farm.log, universal_newlines=True, cwd=ROOT)
+        self.jobs_done = 0
+        if self.read() is None:
+            raise Exception('Worker exited before becoming ready, command: %s' % ' '.join(self.farm.command))
+
+    def stop(self):
+        """Ask the worker process to quit, killing it if it doesn't"""
+        try:
+            self.process.stdin.write(json.dumps({'quit': True}) + '\n')
+            self.process.stdin.close()
+            self.process.wait(10)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+            self.process.wait()
+
+    def restart(self):
+        """Replace the worker process by a new one, retrying with backoff. Returns None once it is
+        ready, or the error of the last attempt if none succeeded"""
+        self.stop()
+        self.restarts += 1
+        for delay in [0] + RESTART_DELAYS:
+            sleep(delay)
+            try:
+                self.start()
+                return None
+            except Exception as err:
+                error = '%s: %s' % (type(err).__name__, err)
+                print('Restarting worker failed: %s' % error, file=sys.stderr)
+        return error
+
+    def read(self):
+        """Next protocol message from the worker, or None if it has exited"""
+        for line in self.process.stdout:
+            if line.startswith(PREFIX):
+                return json.loads(line[len(PREFIX):])
+        return None
+
+    def run(self):
+        """Take jobs from the farm queue until it is closed"""
+        while True:
+            item = self.farm.jobs.get()
+            if item is None:
+                self.stop()
+                return
+            job, queued_time, reply = item
+            start_time = time()
+            try:
+                self.process.stdin.write(json.dumps(job) + '\n')
+                self.process.stdin.flush()
+                result = self.read()
+            except OSError:
+                result = None
+            # the process may not have been reaped yet when its output ends
+            exited = result is None or self.process.poll() is not None
+            if result is None:
+                result = {'ok': False, 'error': 'Worker exited while running job'}
+            self.jobs_done += 1
+            result.setdefault('timings', {})
+            result['timings']['queue'] = start_time - queued_time
+            result['timings']['worker'] = time() - start_time
+            result['worker'] = self.process.pid
+            error = None
+            if exited:
+                # restart before replying so a worker that can't be restarted fails the job it ran
+                error = self.restart()
+                if error is not None:
+                    result['ok'] = False
+                    result['error'] = '%s\nRestarting the worker failed: %s' % (
+                        result.get('error', 'Worker exited after the job'), error)
+            reply.put(result)
+            if error is None and self.jobs_done >= self.farm.max_jobs:
+                # recycle to give back memory held by the old process
+                error = self.restart()
+            if error is not None:
+                self.error = error
+                self.farm.worker_failed(self)
+                return
+
+
+class Farm(object):
+    """Pool of workers sharing a queue of jobs"""
+
+    def __init__(self, workers=2, max_jobs=50, blender='blender', use_python=False, log=None):
+        """Start workers worker processes running under Blender executable blender, or under this
+        Python if use_python, each restarted after max_jobs jobs. Worker output goes to file log"""
+        script = os.path.abspath(__file__)
+        if use_python:
+            self.command = [sys.executable, script, 'worker']
+        else:
+            self.command = [blender, '--background', '--factory-startup', '--python', script, '--', 'worker']
+        self.max_jobs = max_jobs
+        self.log = log if log is not None else subprocess.DEVNULL
+        self.jobs = queue.Queue()
+        # set once every worker has failed, jobs are then turned away with it
+        self.error = None
+        # called once every worker has failed, serve sets it to stop the daemon
+        self.on_failure = None
+        self.lock = threading.Lock()
+        self.workers = [Worker(self) for _ in range(workers)]
+
+    def run(self, job):
+        """Queue job and wait for its result"""
+        reply = queue.Queue(1)
+        with self.lock:
+            if self.error is not None:
+                return {'ok': False, 'error': self.error}
+            self.jobs.put((job, time(), reply))
+        return reply.get()
+
+    def worker_failed(self, worker):
+        """Take worker, which couldn't be restarted, out of the pool. If it was the last, fail the
+        jobs still queued and stop the daemon"""
+        print('Worker %i left the pool as it could not be restarted: %s' % (worker.process.pid, worker.error),
+              file=sys.stderr)
+        with self.lock:
+            if any(other.error is None for other in self.workers):
+                return
+            self.error = 'No workers left, the last could not be restarted: %s' % worker.error
+            print(self.error, file=sys.stderr)
+            while True:
+                try:
+                    item = self.jobs.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None:
+                    item[2].put({'ok': False, 'error': self.error})
+        if self.on_failure is not None:
+            self.on_failure()
+
+    def status(self):
+        """Counts describing the state of the farm"""
+        return {'queued': self.jobs.qsize(), 'error': self.error, 'workers': [
+            {'pid': worker.process.pid, 'jobs': worker.jobs_done, 'restarts': worker.restarts,
+             'error': worker.error} for worker in self.workers]}
+
+    def close(self):
+        """Stop every worker once the jobs already queued are done"""
+        for _ in self.workers:
+            self.jobs.put(None)
+        for worker in self.workers:
+            worker.thread.join()
+
+
+class FarmHandler(socketserver.StreamRequestHandler):
+    """Handle one client connection, answering each job line with a result line"""
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                job = json.loads(line.decode())
+                result = self.server.farm.status() if job.get('status') else self.server.farm.run(job)
+            except ValueError as err:
+                result = {'ok': False, 'error': 'Bad request: %s' % err}
+            self.wfile.write((json.dumps(result) + '\n').encode())
+            self.wfile.flush()
+
+
+class UnixFarmServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class TCPFarmServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def stop_serving(signum, frame):
+    """Signal handler stopping the daemon the same way as an interrupt"""
+    raise KeyboardInterrupt
+
+
+def serve(address, farm):
+    """Accept jobs for farm on address until interrupted"""
+    family, addr = parse_address(address)
+    if family == socket.AF_UNIX:
+        if os.path.exists(addr):
+            os.remove(addr)
+        server = UnixFarmServer(addr, FarmHandler)
+    else:
+        server = TCPFarmServer(addr, FarmHandler)
+    server.farm = farm
+    # called from the thread of the last worker to fail, so serve_forever can be stopped
+    farm.on_failure = server.shutdown
+    signal.signal(signal.SIGTERM, stop_serving)
+    print('Serving %i workers on %s' % (len(farm.workers), address))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        farm.close()
+        if family == socket.AF_UNIX and os.path.exists(addr):
+            os.remove(addr)
+
+
+def main(argv):
+    """Run the daemon, a worker or a client from command line arguments argv"""
+    if argv[:1] == ['worker']:
+        worker_main()
+        return
+    parser = argparse.ArgumentParser(description='Farm of persistent tree generation workers')
+    commands = parser.add_subparsers(dest='command')
+    serve_parser = commands.add_parser('serve', help='run the daemon')
+    serve_parser.add_argument('address', help='Unix socket path or host:port')
+    serve_parser.add_argument('--workers', type=int, default=2)
+    serve_parser.add_argument('--max-jobs', type=int, default=50, help='jobs before a worker is restarted')
+    serve_parser.add_argument('--blender', default='blender', help='Blender executable')
+    serve_parser.add_argument('--python', action='store_true', help='run workers under this Python')
+    serve_parser.add_argument('--log', default=None, help='file to write worker output to')
+    submit_parser = commands.add_parser('submit', help='send a job and print its result')
+    submit_parser.add_argument('address')
+    submit_parser.add_argument('preset')
+    submit_parser.add_argument('--kind', default='parametric', choices=['parametric', 'lsystem'])
+    submit_parser.add_argument('--seed', type=int, default=0)
+    submit_parser.add_argument('--params', default='{}', help='JSON parameters overriding the preset')
+    submit_parser.add_argument('--output', default=None)
+    submit_parser.add_argument('--render', default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        log = open(args.log, 'a') if args.log is not None else None
+        serve(args.address, Farm(args.workers, args.max_jobs, args.blender, args.python, log))
+    elif args.command == 'submit':
+        job = {'kind': args.kind, 'preset': args.preset, 'seed': args.seed, 'params': json.loads(args.params)}
+        for name in ['output', 'render']:
+            if getattr(args, name) is not None:
+                job[name] = os.path.abspath(getattr(args, name))
+        print(json.dumps(submit(args.address, job), indent=2, sort_keys=True))
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    # blender passes script arguments after --
+    main(sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else sys.argv[1:])
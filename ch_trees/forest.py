@@ -0,0 +1,204 @@
+"""Forests of instanced trees, made from a pool of variants of each preset.
+
+Making every tree of a forest with construct is slow and fills the file with a copy of each. Here
+each preset is generated with a few seeds, once, and each variant is moved into a group of its own
+that stays cached for later forests. The forest is then made of empties instancing those groups,
+so its memory grows with the number of variants rather than the number of trees. Trees are placed
+by dart throwing over the ground area with a spatial hash of those already placed, rejecting any
+closer to another than the sum of their crown radii times spacing, so crowns don't overlap however
+the variants differ in size. Crown radii are the horizontal reach of each variant's branches and
+leaves around its trunk. Each tree is turned at random about its trunk and scaled by up to
+scale_jitter either way."""
+
+import random
+from collections import namedtuple
+from math import cos, floor, hypot, pi, sin
+
+import numpy as np
+
+import bpy
+from mathutils import Matrix
+
+from ch_trees.datablocks import remove_groups, remove_objects
+from ch_trees.export import spline_arrays
+
+Variant = namedtuple('Variant', ['group', 'crown_radius'])
+
+# variants made so far, by kind, preset, seed and construct options
+variant_cache = {}
+
+# darts thrown for each tree before giving up on filling the area
+ATTEMPTS = 30
+
+
+def tree_objects(tree_obj):
+    """Tree empty tree_obj and the objects parented to it, directly or not"""
+    objs = [tree_obj]
+    for obj in objs:
+        objs.extend(child for child in bpy.data.objects if child.parent == obj)
+    return objs
+
+
+def crown_radius(objs):
+    """Horizontal distance from the trunk base to the furthest branch surface or leaf vertex of the
+    tree made of objs"""
+    radius = 0.0
+    for obj in objs:
+        if obj.type == 'CURVE':
+            for spline in obj.data.splines:
+                co, _, _, radii = spline_arrays(spline)
+                radius = max(radius, float(np.max(np.hypot(co[:, 0], co[:, 1]) + radii * obj.data.bevel_depth)))
+        elif obj.type == 'MESH' and len(obj.data.vertices) > 0:
+            verts = np.zeros(len(obj.data.vertices) * 3)
+            obj.data.vertices.foreach_get('co', verts)
+            verts = verts.reshape(-1, 3)
+            radius = max(radius, float(np.max(np.hypot(verts[:, 0], verts[:, 1]))))
+    return radius
+
+
+def make_variant(kind, preset, seed, options):
+    """Generate preset of kind with seed, passing options to construct, and move it into a group of
+    its own kept with a fake user. Returns its Variant"""
+    from ch_trees.lsystems import treegen
+    from ch_trees.parametric import gen
+
+    if kind == 'parametric':
+        mod = __import__('ch_trees.parametric.tree_params.' + preset, fromlist=[''])
+        tree = gen.construct(mod.params, seed=seed, **options)
+    elif kind == 'lsystem':
+        random.seed(seed)
+        tree = treegen.construct('ch_trees.lsystems.sys_defs.' + preset, **options)
+    else:
+        raise Exception('Unknown kind of tree %s' % kind)
+    objs = tree_objects(tree.tree_obj)
+    group = bpy.data.groups.new('%s_%i' % (preset, seed))
+    for obj in objs:
+        if obj.name in bpy.context.scene.objects:
+            bpy.context.scene.objects.unlink(obj)
+        group.objects.link(obj)
+    group.use_fake_user = True
+    return Variant(group.name, crown_radius(objs))
+
+
+def get_variants(kind, preset, count, options):
+    """Variants with seeds 1 to count of preset of kind, made if not cached"""
+    variants = []
+    for seed in range(1, count + 1):
+        key = (kind, preset, seed, repr(sorted(options.items())))
+        variant = variant_cache.get(key)
+        if variant is None or variant.group not in bpy.data.groups:
+            variant = variant_cache[key] = make_variant(kind, preset, seed, options)
+        variants.append(variant)
+    return variants
+
+
+class SpatialHash(object):
+    """Circles in a grid of square cells, for finding those that may be near a point"""
+
+    def __init__(self, cell_size):
+        """Set up empty grid of cells cell_size across"""
+        self.cell_size = cell_size
+        self.cells = {}
+
+    def key(self, x, y):
+        """Cell holding point x, y"""
+        return int(floor(x / self.cell_size)), int(floor(y / self.cell_size))
+
+    def add(self, x, y, radius):
+        """Add circle of radius centred on x, y"""
+        self.cells.setdefault(self.key(x, y), []).append((x, y, radius))
+
+    def near(self, x, y):
+        """Circles centred in the cell of x, y or those around it"""
+        cell_x, cell_y = self.key(x, y)
+        for off_x in (-1, 0, 1):
+            for off_y in (-1, 0, 1):
+                yield from self.cells.get((cell_x + off_x, cell_y + off_y), ())
+
+
+def place_trees(crown_radii, count, size, rng, spacing=1.0, scale_jitter=0.2):
+    """(variant, x, y, angle, scale) of up to count trees of variants with crown_radii placed by rng
+    over a size (width, depth) area centred on the origin, each at least spacing times the sum of
+    their scaled crown radii from any other"""
+    max_radius = max(crown_radii) * (1 + scale_jitter)
+    grid = SpatialHash(max(2 * max_radius * spacing, 1e-6))
+    trees = []
+    for _ in range(count * ATTEMPTS):
+        if len(trees) == count:
+            break
+        variant = rng.randrange(len(crown_radii))
+        scale = 1 + rng.uniform(-scale_jitter, scale_jitter)
+        radius = crown_radii[variant] * scale
+        x = (rng.random() - 0.5) * size[0]
+        y = (rng.random() - 0.5) * size[1]
+        if any(hypot(x - other_x, y - other_y) < (radius + other_radius) * spacing
+               for other_x, other_y, other_radius in grid.near(x, y)):
+            continue
+        grid.add(x, y, radius)
+        trees.append((variant, x, y, rng.uniform(0, 2 * pi), scale))
+    return trees
+
+
+class Forest(object):
+    """Instances of tree variants parented to a Forest empty"""
+
+    def __init__(self, forest_obj, instances, variants):
+        """Set up forest of instance objects under forest_obj using variants"""
+        self.forest_obj = forest_obj
+        self.instances = instances
+        self.variants = variants
+
+    def remove(self):
+        """Remove the forest and its instances, keeping the cached variants"""
+        if self.forest_obj is not None:
+            remove_objects([self.forest_obj])
+        self.forest_obj = None
+        self.instances = []
+
+
+def make_forest(presets, count, size, variants=4, kind='parametric', seed=1, spacing=1.0, scale_jitter=0.2,
+                options=None):
+    """Make a Forest of count trees over a size (width, depth) area centred on the origin, instancing
+    variants variants of each of presets, of kind 'parametric' or 'lsystem'. options are passed to
+    construct when making variants. Fewer trees are placed if the area is too small to hold them"""
+    options = options or {}
+    pool = []
+    for preset in presets:
+        pool.extend(get_variants(kind, preset, variants, options))
+    rng = random.Random(seed)
+    trees = place_trees([variant.crown_radius for variant in pool], count, size, rng, spacing, scale_jitter)
+
+    forest_obj = bpy.data.objects.new('Forest', None)
+    bpy.context.scene.objects.link(forest_obj)
+    instances = []
+    for variant_ind, x, y, angle, scale in trees:
+        group = bpy.data.groups[pool[variant_ind].group]
+        instance = bpy.data.objects.new(group.name, None)
+        instance.dupli_type = 'GROUP'
+        instance.dupli_group = group
+        instance.matrix_world = Matrix(((scale * cos(angle), -scale * sin(angle), 0, x),
+                                        (scale * sin(angle), scale * cos(angle), 0, y),
+                                        (0, 0, scale, 0),
+                                        (0, 0, 0, 1)))
+        bpy.context.scene.objects.link(instance)
+        instance.parent = forest_obj
+        instances.append(instance)
+    print('Forest of %i trees placed from %i variants' % (len(instances), len(pool)))
+    if len(instances) < count:
+        print('Only %i of %i trees fit in the area' % (len(instances), count))
+    return Forest(forest_obj, instances, pool)
+
+
+def clear_variants():
+    """Remove cached variants no object instances any more, along with their trees"""
+    for key, variant in list(variant_cache.items()):
+        if variant.group in bpy.data.groups:
+            group = bpy.data.groups[variant.group]
+            if any(obj.dupli_group == group for obj in bpy.data.objects if obj.dupli_group is not None):
+                continue
+            # shared subtrees of L-System trees are groups of their own
+            subtree_groups = [obj.dupli_group for obj in group.objects if obj.dupli_group is not None]
+            remove_objects([obj for obj in group.objects if obj.parent is None])
+            bpy.data.groups.remove(group)
+            remove_groups(subtree_groups)
+        del variant_cache[key]
@@ -0,0 +1,80 @@
+"""Instanced leaf output shared by L-System and Parametric tree generators.
+
+Rather than baking every leaf into one large mesh, a single base mesh is stored for each of leaves and
+blossom along with a transform for every leaf. In Blender these become face duplicated instances: a
+carrier mesh holds one small triangle per leaf whose centre, normal, first edge and area encode the
+position, orientation and scale of that leaf, and the base mesh is parented to the carrier."""
+
+from math import sqrt
+
+import bpy
+import numpy as np
+
+# per leaf transform, rotation stored as quaternion (w, x, y, z)
+INSTANCE_DTYPE = np.dtype([('position', float, 3),
+                           ('rotation', float, 4),
+                           ('scale', float),
+                           ('blossom', bool)])
+
+
+def quats_to_matrices(quats):
+    """Convert (n, 4) array of quaternions to (n, 3, 3) array of rotation matrices"""
+    w, x, y, z = quats[:, 0], quats[:, 1], quats[:, 2], quats[:, 3]
+    mats = np.empty((len(quats), 3, 3))
+    mats[:, 0, 0] = 1 - 2 * (y * y + z * z)
+    mats[:, 0, 1] = 2 * (x * y - w * z)
+    mats[:, 0, 2] = 2 * (x * z + w * y)
+    mats[:, 1, 0] = 2 * (x * y + w * z)
+    mats[:, 1, 1] = 1 - 2 * (x * x + z * z)
+    mats[:, 1, 2] = 2 * (y * z - w * x)
+    mats[:, 2, 0] = 2 * (x * z - w * y)
+    mats[:, 2, 1] = 2 * (y * z + w * x)
+    mats[:, 2, 2] = 1 - 2 * (x * x + y * y)
+    return mats
+
+
+def instance_faces(instances):
+    """Calculate carrier triangles for instances, returning (3n, 3) vertex and (n, 3) face arrays"""
+    mats = quats_to_matrices(instances['rotation'])
+    # face scaling uses the square root of the face area, so scale edges of right angled triangle
+    edge = (instances['scale'] * sqrt(2))[:, np.newaxis]
+    x_axis = mats[:, :, 0] * edge
+    y_axis = mats[:, :, 1] * edge
+    # face normal gives the instance z axis, first edge its x axis and centroid its position
+    first = instances['position'] - (x_axis + y_axis) / 3
+    verts = np.stack((first, first + x_axis, first + y_axis), axis=1).reshape(-1, 3)
+    faces = np.arange(len(verts)).reshape(-1, 3)
+    return verts, faces
+
+
+def create_base_mesh(name, shape):
+    """Create mesh datablock containing a single copy of the base leaf shape"""
+    mesh = bpy.data.meshes.new(name)
+    mesh.from_pydata(shape.verts, (), shape.faces)
+    if shape.uvs is not None:
+        mesh.uv_textures.new(name + "UV")
+        uv_layer = mesh.uv_layers.active.data
+        for vert_ind, vert in enumerate(shape.uvs):
+            uv_layer[vert_ind].uv = vert
+    return mesh
+
+
+def create_instanced_leaves(name, base_shape, instances, parent, group=None):
+    """Create object named name instancing base_shape with each transform in instances, returns
+    carrier object. Objects are linked into group rather than the scene if given"""
+    verts, faces = instance_faces(instances)
+    carrier = bpy.data.meshes.new(name.lower() + '_instances')
+    carrier.from_pydata(verts, (), faces)
+    carrier_obj = bpy.data.objects.new(name, carrier)
+    carrier_obj.dupli_type = 'FACES'
+    carrier_obj.use_dupli_faces_scale = True
+    base_obj = bpy.data.objects.new(name + 'Shape', create_base_mesh(name.lower(), base_shape))
+    base_obj.parent = carrier_obj
+    if group is None:
+        bpy.context.scene.objects.link(carrier_obj)
+        bpy.context.scene.objects.link(base_obj)
+        carrier_obj.parent = parent
+    else:
+        group.objects.link(carrier_obj)
+        group.objects.link(base_obj)
+    return carrier_obj
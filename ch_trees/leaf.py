@@ -1,13 +1,106 @@
 """Leaf module shared by L-System and Parametric tree generators"""
 
-from copy import deepcopy
-from math import atan2, pi
+from math import atan2, pi, sqrt
 
-from ch_trees.chturtle import Vector
+import numpy as np
 from mathutils import Quaternion
 
+from ch_trees.chturtle import Vector
+from ch_trees.instancing import quats_to_matrices
+
 import ch_trees.leaf_shapes as leaf_geom
 
+
+def quat_to_matrix(quat):
+    """Convert rotation quaternion to 3x3 NumPy rotation matrix"""
+    return np.array(quat.to_matrix())
+
+
+def matrix_to_quat(mat):
+    """Convert 3x3 NumPy rotation matrix to quaternion (w, x, y, z)"""
+    trace = mat[0, 0] + mat[1, 1] + mat[2, 2]
+    if trace > 0:
+        s = 0.5 / sqrt(trace + 1)
+        quat = (0.25 / s, (mat[2, 1] - mat[1, 2]) * s, (mat[0, 2] - mat[2, 0]) * s, (mat[1, 0] - mat[0, 1]) * s)
+    elif mat[0, 0] > mat[1, 1] and mat[0, 0] > mat[2, 2]:
+        s = 2 * sqrt(1 + mat[0, 0] - mat[1, 1] - mat[2, 2])
+        quat = ((mat[2, 1] - mat[1, 2]) / s, 0.25 * s, (mat[0, 1] + mat[1, 0]) / s, (mat[0, 2] + mat[2, 0]) / s)
+    elif mat[1, 1] > mat[2, 2]:
+        s = 2 * sqrt(1 + mat[1, 1] - mat[0, 0] - mat[2, 2])
+        quat = ((mat[0, 2] - mat[2, 0]) / s, (mat[0, 1] + mat[1, 0]) / s, 0.25 * s, (mat[1, 2] + mat[2, 1]) / s)
+    else:
+        s = 2 * sqrt(1 + mat[2, 2] - mat[0, 0] - mat[1, 1])
+        quat = ((mat[1, 0] - mat[0, 1]) / s, (mat[0, 2] + mat[2, 0]) / s, (mat[1, 2] + mat[2, 1]) / s, 0.25 * s)
+    return np.array(quat)
+
+
+def axis_angle_quats(axes, angles):
+    """(n, 4) array of quaternions rotating by angles about axes, axes need not be unit length"""
+    lengths = np.linalg.norm(axes, axis=1)
+    lengths[lengths == 0] = 1
+    half = angles / 2
+    return np.column_stack((np.cos(half), axes / lengths[:, None] * np.sin(half)[:, None]))
+
+
+def multiply_quats(quats_1, quats_2):
+    """Products of (n, 4) arrays of quaternions"""
+    w_1, x_1, y_1, z_1 = quats_1.T
+    w_2, x_2, y_2, z_2 = quats_2.T
+    return np.column_stack((w_1 * w_2 - x_1 * x_2 - y_1 * y_2 - z_1 * z_2,
+                            w_1 * x_2 + x_1 * w_2 + y_1 * z_2 - z_1 * y_2,
+                            w_1 * y_2 - x_1 * z_2 + y_1 * w_2 + z_1 * x_2,
+                            w_1 * z_2 + x_1 * y_2 - y_1 * x_2 + z_1 * w_2))
+
+
+def track_quats(directions):
+    """Quaternions aligning Z with each of directions keeping Y up, as Vector.to_track_quat('Z', 'Y')"""
+    tvec = directions / np.linalg.norm(directions, axis=1)[:, None]
+    nor = np.column_stack((-tvec[:, 1], tvec[:, 0], np.zeros(len(tvec))))
+    nor[np.abs(tvec[:, 0]) + np.abs(tvec[:, 1]) < 1e-4, 0] = 1
+    quats = axis_angle_quats(nor, np.arccos(np.clip(tvec[:, 2], -1, 1)))
+    # then spin about the track axis to bring Y up
+    w, x, y, z = quats.T
+    angle = -0.5 * np.arctan2(-2 * (x * z + w * y), -2 * (y * z - w * x))
+    spin = np.column_stack((np.cos(angle), tvec * np.sin(angle)[:, None]))
+    return multiply_quats(spin, quats)
+
+
+def leaf_frames(leaves):
+    """Positions, directions and right vectors of leaves as (n, 3) arrays"""
+    frames = np.array([(tuple(leaf.position), tuple(leaf.direction), tuple(leaf.right)) for leaf in leaves],
+                      dtype=float).reshape(-1, 3, 3)
+    return frames[:, 0], frames[:, 1], frames[:, 2]
+
+
+def leaf_rotations(positions, directions, rights, bend):
+    """(n, 3, 3) rotation matrices moving the base leaf mesh to each leaf, as Leaf.get_transform does
+    for one leaf"""
+    rotations = quats_to_matrices(track_quats(directions))
+    # right vectors in the tracked frame give the spin about the leaf's own z axis
+    right_t = np.einsum('nji,nj->ni', rotations, rights)
+    spin = pi - np.arccos(np.clip(right_t[:, 0] / np.linalg.norm(right_t, axis=1), -1, 1))
+    z_axes = np.tile([0., 0., 1.], (len(spin), 1))
+    rotations = np.matmul(rotations, quats_to_matrices(axis_angle_quats(z_axes, spin)))
+    if bend > 0:
+        normals = np.cross(directions, rights)
+        theta_bend = np.arctan2(positions[:, 1], positions[:, 0]) - np.arctan2(normals[:, 1], normals[:, 0])
+        bend_1 = quats_to_matrices(axis_angle_quats(z_axes, theta_bend * bend))
+        bent_rights = np.einsum('nij,nj->ni', bend_1, rights)
+        normals = np.cross(np.einsum('nij,nj->ni', bend_1, directions), bent_rights)
+        # Vector.declination gives degrees, compared with pi as in calc_bend_trf
+        phi_bend = np.degrees(np.arctan2(np.sqrt(normals[:, 0] ** 2 + normals[:, 1] ** 2), normals[:, 2]))
+        phi_bend = np.where(phi_bend > pi / 2, phi_bend - pi, phi_bend)
+        bend_2 = quats_to_matrices(axis_angle_quats(bent_rights, phi_bend * bend))
+        rotations = np.matmul(bend_2, np.matmul(bend_1, rotations))
+    return rotations
+
+
+def leaf_vertices(positions, rotations, base_shape):
+    """(n * k, 3) vertices of copies of the k vertices of base_shape moved to each leaf"""
+    verts = np.matmul(rotations, np.asarray(base_shape[0]).T[None]).transpose(0, 2, 1) + positions[:, None]
+    return verts.reshape(-1, 3)
+
+
 class Leaf(object):
     """Class to store data for each leaf in the system"""
     position = None
@@ -22,74 +115,51 @@ class Leaf(object):
 
     @classmethod
     def get_shape(cls, leaf_type, g_scale, scale, scale_x):
-        """returns the base leaf shape mesh"""
-        u_v = []
-
-        if leaf_type < 0: # blossom
-            if leaf_type < -3: # out of range
-                leaf_type = -1
-            shape = leaf_geom.blossom(abs(leaf_type + 1))
-        else: # leaf
-            if leaf_type < 1 or leaf_type > 10: # is out of range or explicitly default
-                leaf_type = 8
-            shape = leaf_geom.leaves(leaf_type - 1)
-
-        verts = shape[0]
-        faces = shape[1]
-        if len(shape) == 3:
-            u_v = shape[2]
-
-        for vert in verts:
-            vert *= scale * g_scale
-            vert.x *= scale_x
-        return verts, faces, u_v
+        """returns the base leaf shape mesh, shared between calls so must not be modified"""
+        return leaf_geom.get_shape(leaf_type, g_scale, scale, scale_x)
 
-    def get_mesh(self, bend, base_shape, index):
-        """produce leaf mesh at position of this leaf given base mesh as input"""
+    def get_transform(self, bend):
+        """calculate rotation matrix and position which move the base leaf mesh to this leaf"""
         # calculate angles to transform mesh to align with desired direction
         trf = self.direction.to_track_quat('Z', 'Y')
         right_t = self.right.rotated(trf.inverted())
         spin_ang = pi - right_t.angle(Vector([1, 0, 0]))
 
-        # calculate bend transform if needed
+        # rotate to correct direction
+        rotation = quat_to_matrix(trf).dot(quat_to_matrix(Quaternion(Vector([0, 0, 1]), spin_ang)))
+        # apply bend if needed
         if bend > 0:
             bend_trf_1, bend_trf_2 = self.calc_bend_trf(bend)
-        else:
-            bend_trf_1 = bend_trf_2 = None
-
-        vertices = []
-        for vertex in base_shape[0]:
-            # rotate to correct direction
-            vertex = vertex.copy()
-            vertex.rotate(Quaternion(Vector([0, 0, 1]), spin_ang))
-            vertex.rotate(trf)
-            # apply bend if needed
-            if bend > 0:
-                vertex.rotate(bend_trf_1)
-                vertex.rotate(bend_trf_2)
-            # move to right position
-            vertex += self.position
-            # add to vertex array
-            vertices.append(vertex)
+            rotation = quat_to_matrix(bend_trf_2).dot(quat_to_matrix(bend_trf_1)).dot(rotation)
+        return rotation, np.array(self.position)
+
+    def get_mesh(self, bend, base_shape, index):
+        """produce leaf mesh at position of this leaf given base mesh as input"""
+        rotation, position = self.get_transform(bend)
+        # transform all vertices at once, this leaves the shared base shape untouched
+        vertices = base_shape[0].dot(rotation.T) + position
         # set face to refer to vertices at correct offset in big vertex list
         index *= len(vertices)
-        faces = deepcopy(base_shape[1])
-        for face in faces:
-            for ind, elem in enumerate(face):
-                face[ind] = elem + index
+        faces = [[elem + index for elem in face] for face in base_shape[1]]
         return vertices, faces
 
+    def get_instance(self, bend, scale, blossom=False):
+        """get instance transform placing a copy of the unit size base mesh at this leaf"""
+        rotation, position = self.get_transform(bend)
+        return position, matrix_to_quat(rotation), scale, blossom
+
     def calc_bend_trf(self, bend):
-        """calculate the transformations required to 'bend' the leaf out/up from WP"""
+        """calculate the transformations required to 'bend' the leaf out/up from WP, leaving the leaf
+        unchanged so its mesh can be made again"""
         normal = self.direction.cross(self.right)
         theta_pos = atan2(self.position.y, self.position.x)
         theta_bend = theta_pos - atan2(normal.y, normal.x)
         bend_trf_1 = Quaternion(Vector([0, 0, 1]), theta_bend * bend)
-        self.direction.rotate(bend_trf_1)
-        self.right.rotate(bend_trf_1)
-        normal = self.direction.cross(self.right)
+        direction = self.direction.rotated(bend_trf_1)
+        right = self.right.rotated(bend_trf_1)
+        normal = direction.cross(right)
         phi_bend = normal.declination()
         if phi_bend > pi / 2:
             phi_bend = phi_bend - pi
-        bend_trf_2 = Quaternion(self.right, phi_bend * bend)
+        bend_trf_2 = Quaternion(right, phi_bend * bend)
         return bend_trf_1, bend_trf_2
@@ -6,8 +6,14 @@ from random import random
 from time import time
 
 import bpy
+import numpy as np
+from ch_trees.budget import level_factors
 from ch_trees.chturtle import CHTurtle, Vector
+from ch_trees.datablocks import new_data, remove_groups, remove_objects
+from ch_trees.export import CHUNK_VERTS
+from ch_trees.instancing import INSTANCE_DTYPE, create_instanced_leaves
 from ch_trees.leaf import Leaf
+from ch_trees.pipeline import make_leaf_meshes
 from mathutils import Quaternion
 
 
@@ -45,6 +51,37 @@ def calc_tangent_to_bezier(offset, start_point, end_point):
     return Vector([res.x, res.y, res.z])
 
 
+def index_branches(symbols):
+    """Match brackets in symbols in a single linear scan. Returns list giving the index of the
+    matching "]" for each "[", list giving the number of F directly within the branch started at each
+    "[" (with the count for the root branch last) and list flagging each "[" whose branch draws
+    anything (F, L or @) at any depth"""
+    match = [None] * len(symbols)
+    f_counts = [0] * (len(symbols) + 1)
+    has_geometry = [False] * len(symbols)
+    stack = [len(symbols)]  # root branch uses final entry of f_counts
+    for ind, dat in enumerate(symbols):
+        ltr = dat.letter
+        if ltr == "[":
+            stack.append(ind)
+        elif ltr == "]":
+            if len(stack) == 1:
+                raise Exception("Invalid system input - unmatched end branch")
+            start = stack.pop()
+            match[start] = ind
+            # geometry in a sub-branch means the branch containing it draws something too
+            if has_geometry[start] and stack[-1] < len(symbols):
+                has_geometry[stack[-1]] = True
+        elif ltr == "F" or ltr == "L" or ltr == "@":
+            if ltr == "F":
+                f_counts[stack[-1]] += 1
+            if stack[-1] < len(symbols):
+                has_geometry[stack[-1]] = True
+    if len(stack) > 1:
+        raise Exception("Invalid system input - missing end branch.")
+    return match, f_counts, has_geometry
+
+
 class LSymbol(object):
     """L-System Symbol"""
     letter = ""
@@ -79,8 +116,31 @@ class LSystem(object):
     blossom_rate = 0
     blossom_shape = 0
     blossom_scale = 1
-
-    tree_object = None
+    leaf_instancing = False
+    leaf_instances = None
+
+    instance_subtrees = False
+    subtree_min_symbols = 16
+    subtree_precision = None
+    subtrees = None
+    subtree_groups = None
+    subtree_instance_count = 0
+    vertical = (Vector([0, 0, 1]), Vector([1, 0, 0]))
+
+    budget = None
+    branch_factors = None
+    leaf_factor = 1
+    stem_count = 0
+    point_count = 0
+    leaf_count = 0
+
+    tree_obj = None
+    branches_curve = None
+    leaves_array = None
+    phase_times = None
+    memory_profile = None
+    exporter = None
+    reuse = None
 
     def __init__(self,
                  axiom,
@@ -94,7 +154,10 @@ class LSystem(object):
                  leaf_scale_x=1,
                  blossom_rate=0,
                  blossom_shape=0,
-                 blossom_scale=0):
+                 blossom_scale=0,
+                 leaf_instancing=False,
+                 instance_subtrees=False,
+                 budget=None):
         """initialise L-system with specified parameters"""
         self.data = axiom
         self.rules = rules
@@ -108,17 +171,19 @@ class LSystem(object):
         self.blossom_rate = blossom_rate
         self.blossom_shape = blossom_shape
         self.blossom_scale = blossom_scale
-        self.tree_obj = bpy.data.objects.new('Tree', None)
-        bpy.context.scene.objects.link(self.tree_obj)
-        bpy.context.scene.objects.active = self.tree_obj
+        self.leaf_instancing = leaf_instancing
+        self.instance_subtrees = instance_subtrees
+        self.budget = budget
+        # seconds spent in each phase of generation
+        self.phase_times = {}
 
     def __str__(self):
         """return string representation of l-system"""
         return str(self.data)
 
     def iterate(self):
-        """perform single iteration of l-system"""
-        self.iterations += 1
+        """perform single iteration of l-system, returns False if the iteration was abandoned to keep
+        within budget, leaving the system as it was"""
         output = []
         for dat in self.data:
             if dat.letter in self.rules.keys():
@@ -126,38 +191,253 @@ class LSystem(object):
                 output.extend(rule(dat))
             else:
                 output.append(dat)
+            if self.budget is not None:
+                if self.budget.max_symbols is not None and len(output) > self.budget.max_symbols:
+                    self.budget.note('iteration %i abandoned at symbol limit' % (self.iterations + 1))
+                    return False
+                if self.budget.expired():
+                    self.budget.note('iteration %i abandoned at deadline' % (self.iterations + 1))
+                    return False
+        self.iterations += 1
         self.data = output
         sys.stdout.write('\r-> ' + str(self.iterations) + ' iterations performed, ' +
                          str(len(self.data)) + ' symbols generated')
         sys.stdout.flush()
+        return True
 
     def iterate_n(self, num):
-        """perform n iterations of l-system"""
+        """perform n iterations of l-system, stopping early if over budget"""
+        if num <= 0:
+            return
         start = time()
         if self.iterations == 0:
             print('Iterating System')
-        if num > 0:
-            self.iterate()
-            self.iterate_n(num - 1)
+        for ind in range(num):
+            if not self.iterate():
+                self.budget.note('stopped after %i of %i iterations' % (ind, num))
+                break
+        self.phase_times['iterate'] = self.phase_times.get('iterate', 0) + time() - start
+        self.mark_memory('iterate')
+        print('\nMade %i symbols in %f seconds' % (len(self.data), time() - start))
+
+    def apply_budget(self):
+        """Remove a fraction of the branches at each level of nesting from data and work out the
+        fraction of leaves to make so the tree is expected to be within budget, thinning the most
+        deeply nested branches most"""
+        match, f_counts, _ = index_branches(self.data)
+        # count splines, points and leaves at each level of nesting, branches without an F of their
+        # own have no spline
+        stems = [1]
+        points = [f_counts[-1] + 1]
+        leaves = [0]
+        depth = 0
+        for ind, dat in enumerate(self.data):
+            ltr = dat.letter
+            if ltr == "[":
+                depth += 1
+                if depth == len(stems):
+                    stems.append(0)
+                    points.append(0)
+                    leaves.append(0)
+                if f_counts[ind] > 0:
+                    stems[depth] += 1
+                    points[depth] += f_counts[ind] + 1
+            elif ltr == "]":
+                depth -= 1
+            elif ltr == "L":
+                leaves[depth] += 1
+            elif ltr == "F" and "leaves" in dat.parameters and abs(dat.parameters["leaves"]) > 1:
+                leaves[depth] += abs(dat.parameters["leaves"])
+        self.branch_factors = [min(stem_factor, point_factor) for stem_factor, point_factor in
+                               zip(level_factors(stems, self.budget.max_stems),
+                                   level_factors(points, self.budget.max_points))]
+
+        kept = 1
+        kept_leaves = 0
+        for depth, factor in enumerate(self.branch_factors):
+            if factor < 1:
+                self.budget.note('nesting level %i branches thinned to %i%% (of %i)' % (depth, round(factor * 100),
+                                                                                       stems[depth]))
+            kept *= factor
+            kept_leaves += leaves[depth] * kept
+        if self.budget.max_leaves is not None and kept_leaves > self.budget.max_leaves:
+            self.leaf_factor = self.budget.max_leaves / kept_leaves
+            self.budget.note('leaves thinned to %i%% (of %i)' % (round(self.leaf_factor * 100), kept_leaves))
+
+        if min(self.branch_factors) < 1:
+            # drop thinned branches, spread evenly using FS error
+            output = []
+            depth = 0
+            ind = 0
+            while ind < len(self.data):
+                dat = self.data[ind]
+                if dat.letter == "[":
+                    depth += 1
+                    if f_counts[ind] > 0 and not self.budget.keep(('stems', depth), self.branch_factors[depth]):
+                        self.budget.cut('branches thinned')
+                        depth -= 1
+                        ind = match[ind] + 1
+                        continue
+                elif dat.letter == "]":
+                    depth -= 1
+                output.append(dat)
+                ind += 1
+            self.data = output
+
+    def keep_branch(self):
+        """Whether to draw the next branch within budget"""
+        budget = self.budget
+        if budget.expired():
+            budget.cut('branches skipped at deadline')
+            return False
+        if budget.max_stems is not None and self.stem_count >= budget.max_stems:
+            budget.cut('branches skipped at stem limit')
+            return False
+        if budget.max_points is not None and self.point_count >= budget.max_points:
+            budget.cut('branches skipped at point limit')
+            return False
+        return True
+
+    def add_leaf(self, leaf_array, leaf):
+        """Add leaf to leaf_array unless cut to keep within budget"""
+        budget = self.budget
+        if budget is not None:
+            if budget.expired():
+                budget.cut('leaves skipped at deadline')
+                return
+            if budget.max_leaves is not None and self.leaf_count >= budget.max_leaves:
+                budget.cut('leaves skipped at leaf limit')
+                return
+            if not budget.keep('leaves', self.leaf_factor):
+                budget.cut('leaves thinned')
+                return
+        leaf_array.append(leaf)
+        self.leaf_count += 1
+
+    def hash_cons_subtrees(self):
+        """Replace bracketed substructures which occur more than once in data by an "@" symbol
+        referencing a single shared copy held in subtrees"""
+        # first pass, intern the structure of every bracketed group, inner groups are referred to by
+        # id in the key of their parent so each key is built in time linear in the group length
+        interned = {}
+        counts = []
+        groups = {}
+        stack = [[]]
+        starts = []
+        for ind, dat in enumerate(self.data):
+            if dat.letter == "[":
+                stack.append([])
+                starts.append(ind)
+            elif dat.letter == "]":
+                if len(starts) == 0:
+                    raise Exception("Invalid system input - unmatched end branch")
+                key = tuple(stack.pop())
+                group_id = interned.setdefault(key, len(interned))
+                if group_id == len(counts):
+                    counts.append(0)
+                counts[group_id] += 1
+                groups[starts.pop()] = (group_id, ind)
+                stack[-1].append(("@", group_id))
+            else:
+                stack[-1].append(self.symbol_key(dat))
+        if len(starts) > 0:
+            raise Exception("Invalid system input - missing end branch.")
+
+        # second pass, rebuild data with repeated groups replaced by references to a shared copy
+        self.subtrees = {}
+
+        def compress(start, end):
+            """return symbols in data[start:end] with repeated groups replaced"""
+            output = []
+            ind = start
+            while ind < end:
+                dat = self.data[ind]
+                if dat.letter == "[":
+                    group_id, close = groups[ind]
+                    if counts[group_id] > 1 and close - ind + 1 >= self.subtree_min_symbols:
+                        if group_id not in self.subtrees:
+                            self.subtrees[group_id] = [dat] + compress(ind + 1, close) + [self.data[close]]
+                        output.append(LSymbol("@", {"id": group_id}))
+                        ind = close + 1
+                        continue
+                output.append(dat)
+                ind += 1
+            return output
+
+        n_symbols = len(self.data)
+        self.data = compress(0, n_symbols)
+        print('Found %i shared subtrees, %i symbols reduced to %i' % (len(self.subtrees), n_symbols,
+                                                                       len(self.data)))
+
+    def symbol_key(self, dat):
+        """return hashable key representing symbol, rounding parameters to subtree_precision if set"""
+        if not dat.parameters:
+            return dat.letter
+        if self.subtree_precision is None:
+            return (dat.letter, tuple(sorted(dat.parameters.items())))
+        return (dat.letter, tuple(sorted((name, round(val, self.subtree_precision))
+                                         for name, val in dat.parameters.items())))
+
+    def new_branch_curve(self, curve=None):
+        """set up curve datablock for branches, new unless curve is given"""
+        if curve is None:
+            curve = bpy.data.curves.new('branches', type='CURVE')
+        curve.dimensions = '3D'
+        curve.resolution_u = 4
+        curve.fill_mode = 'FULL'
+        curve.bevel_depth = self.thickness
+        curve.bevel_resolution = 10
+        curve.use_uv_as_generated = True
+        return curve
+
+    def new_object(self, name, data_type, group=None):
+        """object called name with empty data of data_type, 'CURVE' or 'MESH', added to the tree or group.
+        Taken over from the tree being replaced if it had one"""
+        obj = self.reuse.take(name, data_type) if self.reuse is not None and group is None else None
+        if obj is None:
+            obj = bpy.data.objects.new(name, new_data(name.lower(), data_type))
+            self.add_object(obj, group)
+        return obj
+
+    def remove(self):
+        """remove all objects and data made for the tree, including shared subtrees"""
+        if self.tree_obj is not None:
+            remove_objects([self.tree_obj])
+            self.tree_obj = None
+        remove_groups(list((self.subtree_groups or {}).values()))
+        self.subtree_groups = {}
+
+    def add_object(self, obj, group=None):
+        """link new object into the scene under the tree object, or into group if building a shared
+        subtree"""
+        if group is None:
+            bpy.context.scene.objects.link(obj)
+            obj.parent = self.tree_obj
         else:
-            print('\nMade %i symbols in %f seconds' % (len(self.data), time() - start))
+            group.objects.link(obj)
 
     def parse(self):
         """parse l-system and generate model"""
+        self.stem_count = self.point_count = self.leaf_count = 0
+        if self.budget is not None:
+            self.apply_budget()
+        if self.instance_subtrees:
+            self.hash_cons_subtrees()
+            self.subtree_groups = {}
+            self.subtree_instance_count = 0
         print('Parsing System')
         start_time = time()
 
+        # create parent object
+        if self.reuse is not None:
+            self.tree_obj = self.reuse.take_tree()
+        else:
+            self.tree_obj = bpy.data.objects.new('Tree', None)
+            bpy.context.scene.objects.link(self.tree_obj)
+            bpy.context.scene.objects.active = self.tree_obj
+
         # set up curve object
-        curve = bpy.data.curves.new('branches', type='CURVE')
-        curve.dimensions = '3D'
-        curve.resolution_u = 4
-        curve.fill_mode = 'FULL'
-        curve.bevel_depth = self.thickness
-        curve.bevel_resolution = 10
-        curve.use_uv_as_generated = True
-        branches_obj = bpy.data.objects.new('Branches', curve)
-        bpy.context.scene.objects.link(branches_obj)
-        branches_obj.parent = self.tree_obj
+        curve = self.new_branch_curve(self.new_object('Branches', 'CURVE').data)
 
         # set up turtle etc.
         turtle = CHTurtle()
@@ -165,26 +445,77 @@ class LSystem(object):
         turtle.dir = Vector([0, 0, 1])
         turtle.right = Vector([1, 0, 0])
         turtle.pos = Vector([0, 0, 0])
+        leaf_array = []
+        self.parse_symbols(self.data, curve, turtle, leaf_array)
+        # kept so the finished tree can be saved with ch_trees.compact
+        self.branches_curve = curve
+        self.leaves_array = leaf_array
+        if self.exporter is not None:
+            self.exporter.add_branches(curve)
+
+        self.phase_times['parse'] = time() - start_time
+        self.mark_memory('parse')
+        print('\nSystem parsed in %f seconds' % self.phase_times['parse'])
+        if self.instance_subtrees:
+            print('Subtree instances: %i of %i shared subtrees' % (self.subtree_instance_count,
+                                                                  len(self.subtree_groups)))
+
+        curve_points = 0
+        for spline in curve.splines:
+            curve_points += len(spline.bezier_points)
+        # TODO do this better, could calc vertices by multiplying by bevel res and curve res?
+        print('Curve points: %i' % curve_points)
+
+        start_time = time()
+        self.create_leaf_mesh(leaf_array)
+        if self.reuse is not None:
+            self.reuse.finish()
+            self.reuse = None
+        self.phase_times['leaves'] = time() - start_time
+        self.mark_memory('leaves')
+        if self.budget is not None:
+            print(self.budget.report())
+        if self.memory_profile is not None:
+            print(self.memory_profile.report())
+            self.memory_profile.stop()
+
+    def mark_memory(self, phase):
+        """record memory use at the end of phase if profiling"""
+        if self.memory_profile is not None:
+            self.memory_profile.mark(phase)
+
+    def parse_symbols(self, symbols, curve, turtle, leaf_array, group=None):
+        """walk symbols with turtle adding branch splines to curve and leaves to leaf_array, any
+        objects created are added to group if given"""
+        # pre-pass so splines are only made for branches containing an F, and made at full size
+        match, f_counts, has_geometry = index_branches(symbols)
+        # shared subtrees are made entirely of branches so have no use for the trunk spline, it is
+        # removed at the end and not counted
+        keep_trunk = group is None or f_counts[-1] > 0
         trunk = curve.splines.new('BEZIER')
         active_branch = trunk
         active_branch.radius_interpolation = 'CARDINAL'
         active_branch.resolution_u = 2
-        leaf_array = []
+        active_branch.bezier_points.add(f_counts[-1])
+        if keep_trunk:
+            self.stem_count += 1
+            self.point_count += f_counts[-1] + 1
+        n_points = 1  # number of points of active branch filled so far
         stack = []  # keeps track of branches and turtle
-        valid_branch = False  # keeps track of whether branch contains any F
         # at_end_of_inv_branch = False
         prev_leaf_ang = rand_in_range(0, 360)
-        for ind, dat in enumerate(self.data):
-            sys.stdout.write('\r-> ' + str(ind + 1) + ' of ' + str(len(self.data)) + ' symbols parsed')
-            sys.stdout.flush()
+        ind = 0
+        while ind < len(symbols):
+            dat = symbols[ind]
+            if group is None:
+                sys.stdout.write('\r-> ' + str(ind + 1) + ' of ' + str(len(symbols)) + ' symbols parsed')
+                sys.stdout.flush()
             ltr = dat.letter
             if ltr == "!":
                 # set width
                 turtle.set_width(dat.parameters["w"])
             elif ltr == "F":
                 # draw branch
-                if not valid_branch:
-                    valid_branch = True  # has an F so make branch valid
                 old = turtle.pos.copy()
                 # apply tropism force
                 h_cross_t = turtle.dir.cross(self.tropism)
@@ -193,14 +524,16 @@ class LSystem(object):
                 turtle.dir.rotate(Quaternion(h_cross_t, radians(alpha)))
                 # move turtle and extend spline
                 turtle.move(dat.parameters["l"])
-                self.add_points_to_bez(active_branch, old, turtle.pos, turtle.width, active_branch == trunk)
+                self.add_points_to_bez(active_branch, n_points, old, turtle.pos, turtle.width,
+                                       active_branch == trunk)
                 if "leaves" in dat.parameters and abs(dat.parameters["leaves"]) > 1:
                     prev_leaf_ang = self.add_leaves_to_seg(dat.parameters, active_branch, leaf_array, turtle,
-                                                           prev_leaf_ang)
+                                                           prev_leaf_ang, n_points)
+                n_points += 1
             elif ltr == "A" or ltr == "%":
                 # at end of branch so taper width to 0
-                if len(active_branch.bezier_points) > 0:
-                    active_branch.bezier_points[-1].radius = 0
+                if active_branch is not None:
+                    active_branch.bezier_points[n_points - 1].radius = 0
                 # correct for end within invalid branch
                 # at_end_of_inv_branch = not valid_branch
             elif ltr == "+":
@@ -226,28 +559,37 @@ class LSystem(object):
                 leaf_turtle = CHTurtle(turtle)
                 leaf_turtle.roll_left(dat.parameters["r_ang"])
                 leaf_turtle.pitch_down(dat.parameters["d_ang"])
-                leaf_array.append(Leaf(leaf_turtle.pos, leaf_turtle.dir, leaf_turtle.right))
+                self.add_leaf(leaf_array, Leaf(leaf_turtle.pos, leaf_turtle.dir, leaf_turtle.right))
             elif ltr == "[":
+                if not has_geometry[ind] or (self.budget is not None and not self.keep_branch()):
+                    # nothing drawn anywhere in branch (or it is cut to keep within budget) and turtle
+                    # is restored at its end so skip it
+                    ind = match[ind] + 1
+                    continue
                 # start branch
-                stack.append((active_branch, valid_branch, prev_leaf_ang, CHTurtle(turtle)))
-                valid_branch = False  # new branch not valid yet
-                # set up new spline
-                active_branch = curve.splines.new('BEZIER')
-                active_branch.radius_interpolation = 'CARDINAL'
-                active_branch.resolution_u = 4
-                start_point = active_branch.bezier_points[-1]
-                start_point.co = turtle.pos
-                start_point.handle_left = turtle.pos - turtle.dir
-                start_point.handle_right = turtle.pos + turtle.dir
-                start_point.radius = turtle.width
+                stack.append((active_branch, n_points, prev_leaf_ang, CHTurtle(turtle)))
+                if f_counts[ind] > 0:
+                    # set up new spline with a point for the start and one for each F
+                    active_branch = curve.splines.new('BEZIER')
+                    active_branch.radius_interpolation = 'CARDINAL'
+                    active_branch.resolution_u = 4
+                    active_branch.bezier_points.add(f_counts[ind])
+                    self.stem_count += 1
+                    self.point_count += f_counts[ind] + 1
+                    start_point = active_branch.bezier_points[0]
+                    start_point.co = turtle.pos
+                    start_point.handle_left = turtle.pos - turtle.dir
+                    start_point.handle_right = turtle.pos + turtle.dir
+                    start_point.radius = turtle.width
+                else:
+                    # branch has no F of its own (only sub-branches or leaves) so needs no spline
+                    active_branch = None
+                n_points = 1
             elif ltr == "]":
                 # end branch
-                # delete spline if not valid branch
-                if not valid_branch:
-                    curve.splines.remove(active_branch)
-                # restore branch spline, validity, turtle
+                # restore branch spline, point count, turtle
                 if len(stack) > 0:
-                    active_branch, valid_branch, prev_leaf_ang, turtle = stack.pop()
+                    active_branch, n_points, prev_leaf_ang, turtle = stack.pop()
                 else:
                     raise Exception("Invalid system input - unmatched end branch")
                 # if at_end_of_inv_branch:
@@ -256,32 +598,65 @@ class LSystem(object):
                 #     at_end_of_inv_branch = False
             elif ltr == "$":
                 # set turtle to vertical
-                turtle.dir = Vector([0, 0, 1])
-                turtle.right = Vector([1, 0, 0])
+                turtle.dir = self.vertical[0].copy()
+                turtle.right = self.vertical[1].copy()
+            elif ltr == "@":
+                # place instance of shared subtree, turtle is left unchanged as after a matching ]
+                self.place_subtree(dat.parameters["id"], turtle, group)
+            ind += 1
 
         if active_branch != trunk:
             raise Exception("Invalid system input - missing end branch.")
-
-        print('\nSystem parsed in %f seconds' % (time() - start_time))
-
-        curve_points = 0
-        for spline in curve.splines:
-            curve_points += len(spline.bezier_points)
-        # TODO do this better, could calc vertices by multiplying by bevel res and curve res?
-        print('Curve points: %i' % curve_points)
-
-        self.create_leaf_mesh(leaf_array)
-
-    def add_points_to_bez(self, line, point1, point2, width, trunk=False):
-        """add point to specific bezier spline"""
+        if not keep_trunk:
+            curve.splines.remove(trunk)
+
+    def place_subtree(self, subtree_id, turtle, group=None):
+        """place instance of shared subtree at turtle, building the subtree first if needed"""
+        # subtree is built in local frame of turtle but start width is taken from turtle so part of key
+        key = (subtree_id, round(turtle.width, 6))
+        subtree_group = self.subtree_groups.get(key)
+        if subtree_group is None:
+            subtree_group = self.build_subtree(subtree_id, turtle)
+            self.subtree_groups[key] = subtree_group
+        instance = bpy.data.objects.new('Subtree', None)
+        instance.dupli_type = 'GROUP'
+        instance.dupli_group = subtree_group
+        instance.matrix_world = turtle.matrix()
+        self.add_object(instance, group)
+        self.subtree_instance_count += 1
+
+    def build_subtree(self, subtree_id, turtle):
+        """build geometry for shared subtree in local frame of turtle, returning group containing it"""
+        subtree_group = bpy.data.groups.new('Subtree')
+        curve = self.new_branch_curve()
+        self.add_object(bpy.data.objects.new('Branches', curve), subtree_group)
+        local_turtle = CHTurtle()
+        local_turtle.dir = Vector([0, 0, 1])
+        local_turtle.right = Vector([1, 0, 0])
+        local_turtle.pos = Vector([0, 0, 0])
+        local_turtle.width = turtle.width
+        # express global directions in local frame, this is exact for the first instance of the
+        # subtree and an approximation for all others
+        tropism, vertical = self.tropism, self.vertical
+        self.tropism = turtle.to_local(tropism)
+        self.vertical = (turtle.to_local(vertical[0]), turtle.to_local(vertical[1]))
+        leaf_array = []
+        self.parse_symbols(self.subtrees[subtree_id], curve, local_turtle, leaf_array, subtree_group)
+        self.tropism, self.vertical = tropism, vertical
+        self.create_leaf_mesh(leaf_array, subtree_group)
+        return subtree_group
+
+    def add_points_to_bez(self, line, ind, point1, point2, width, trunk=False):
+        """set point ind of specific bezier spline, which must already have been allocated, to end
+        segment from point1 to point2"""
         direction = (point2 - point1)
         handle_f = 0.3
 
         # if exists get middle point in branch
-        if len(line.bezier_points) > 1:
-            start_point = line.bezier_points[-1]
+        if ind > 1:
+            start_point = line.bezier_points[ind - 1]
             # linearly interpolate branch width between start and end of branch
-            start_point.radius = line.bezier_points[-2].radius * 0.5 + width * 0.5
+            start_point.radius = line.bezier_points[ind - 2].radius * 0.5 + width * 0.5
             # add bendiness to branch by rotating direction about random axis by random angle
             if self.bendiness > 0:
                 acc_dir = direction.rotated(Quaternion(Vector.random(), radians(self.bendiness * (random() * 35 - 20))))
@@ -291,7 +666,7 @@ class LSystem(object):
             start_point.handle_left = point1 - handle_f * acc_dir
         else:
             # scale initial handle to match branch length
-            start_point = line.bezier_points[-1]
+            start_point = line.bezier_points[0]
             if trunk:
                 # if trunk we also need to set the start width
                 start_point.radius = width
@@ -302,46 +677,53 @@ class LSystem(object):
                 start_point.handle_left = start_point.co + (start_point.handle_left -
                                                             start_point.co) * direction.magnitude * handle_f
 
-        # add new point to line and set position, direction and width
-        line.bezier_points.add()
-        end_point = line.bezier_points[-1]
+        # set position, direction and width of new point
+        end_point = line.bezier_points[ind]
         end_point.co = point2
         end_point.handle_right = point2 + handle_f * direction
         end_point.handle_left = point2 - handle_f * direction
         end_point.radius = width
 
-    def add_leaves_to_seg(self, params, spline, leaf_array, base_turtle, prev_leaf_ang):
-        """add leaves to branch segment 'F'"""
+    def add_leaves_to_seg(self, params, spline, leaf_array, base_turtle, prev_leaf_ang, end_ind=-1):
+        """add leaves to branch segment 'F' ending at point end_ind of spline"""
         n_leaves = abs(params["leaves"])
+        start_point = spline.bezier_points[end_ind - 1]
+        end_point = spline.bezier_points[end_ind]
         for ind in range(n_leaves):
             offset = ind / (n_leaves - 1)
             leaf_dir_turtle = CHTurtle()
-            leaf_dir_turtle.pos = calc_point_on_bezier(offset, spline.bezier_points[-2], spline.bezier_points[-1])
-            leaf_dir_turtle.dir = calc_tangent_to_bezier(offset, spline.bezier_points[-2],
-                                                         spline.bezier_points[-1]).normalized()
+            leaf_dir_turtle.pos = calc_point_on_bezier(offset, start_point, end_point)
+            leaf_dir_turtle.dir = calc_tangent_to_bezier(offset, start_point, end_point).normalized()
             if leaf_dir_turtle.dir.magnitude > 0:
                 leaf_dir_turtle.right = leaf_dir_turtle.dir.cross(base_turtle.dir.cross(base_turtle.right)).normalized()
                 prev_leaf_ang += params["leaf_r_ang"] * rand_in_range(0.9, 1.1)
                 leaf_dir_turtle.roll_left(prev_leaf_ang)
 
-                rad = calc_radius_on_bezier(offset, spline.bezier_points[-2], spline.bezier_points[-1])
+                rad = calc_radius_on_bezier(offset, start_point, end_point)
                 leaf_pos_turtle = CHTurtle(leaf_dir_turtle)
                 leaf_pos_turtle.pitch_down(90)
                 leaf_pos_turtle.move(rad * self.thickness)
 
                 leaf_dir_turtle.pitch_down(params["leaf_d_ang"] * rand_in_range(0.9, 1.1))
-                leaf_array.append(Leaf(leaf_pos_turtle.pos, leaf_dir_turtle.dir, leaf_dir_turtle.right))
+                self.add_leaf(leaf_array, Leaf(leaf_pos_turtle.pos, leaf_dir_turtle.dir, leaf_dir_turtle.right))
         return prev_leaf_ang
 
-    def create_leaf_mesh(self, leaves_array):
-        """Create leaf mesh for tree"""
+    def create_leaf_mesh(self, leaves_array, group=None):
+        """Create leaf mesh for tree, or for shared subtree in group if given"""
         if len(leaves_array) <= 0:
             return
-        print('Making Leaves')
+        if self.leaf_instancing and self.exporter is None:
+            self.create_leaf_instances(leaves_array, group)
+            return
+        if group is None:
+            print('Making Leaves')
         start_time = time()
         # go through global leaf array populated in branch making phase and add polygons to mesh
         base_leaf_shape = Leaf.get_shape(self.leaf_shape, 1, self.leaf_scale, self.leaf_scale_x)
         base_blossom_shape = Leaf.get_shape(self.blossom_shape, 1, self.blossom_scale, 1)
+        if self.exporter is None:
+            self.create_leaf_meshes(leaves_array, base_leaf_shape, base_blossom_shape, start_time, group)
+            return
         leaf_verts = []
         leaf_faces = []
         leaf_count = 0
@@ -349,9 +731,10 @@ class LSystem(object):
         blossom_faces = []
         blossom_count = 0
         for leaf in leaves_array:
-            sys.stdout.write('\r-> ' + str(leaf_count) + ' leaves made, ' + str(
-                blossom_count) + ' blossom made')
-            sys.stdout.flush()
+            if group is None:
+                sys.stdout.write('\r-> ' + str(leaf_count) + ' leaves made, ' + str(
+                    blossom_count) + ' blossom made')
+                sys.stdout.flush()
             if random() < self.blossom_rate:
                 self.make_leaf(leaf, base_blossom_shape, blossom_count, blossom_verts,
                                blossom_faces)
@@ -359,17 +742,21 @@ class LSystem(object):
             else:
                 self.make_leaf(leaf, base_leaf_shape, leaf_count, leaf_verts, leaf_faces)
                 leaf_count += 1
+            if self.exporter is not None and len(leaf_verts) + len(blossom_verts) >= CHUNK_VERTS:
+                self.export_leaves(leaf_verts, leaf_faces, blossom_verts, blossom_faces)
+
+        if self.exporter is not None:
+            self.export_leaves(leaf_verts, leaf_faces, blossom_verts, blossom_faces)
+            print('\nLeaves exported: %i : %i in %f seconds' % (leaf_count, blossom_count, time() - start_time))
+            return
 
         # set up mesh object
         if leaf_count > 0:
-            leaves = bpy.data.meshes.new('leaves')
-            leaves_obj = bpy.data.objects.new('Leaves', leaves)
-            bpy.context.scene.objects.link(leaves_obj)
-            leaves_obj.parent = self.tree_obj
+            leaves = self.new_object('Leaves', 'MESH', group).data
             leaves.from_pydata(leaf_verts, (), leaf_faces)
             # set up UVs for leaf polygons
             leaf_uv = base_leaf_shape[2]
-            if leaf_uv:
+            if leaf_uv is not None:
                 leaves.uv_textures.new("leavesUV")
                 uv_layer = leaves.uv_layers.active.data
                 for seg_dat in range(int(len(leaf_faces) / len(base_leaf_shape[1]))):
@@ -378,13 +765,64 @@ class LSystem(object):
                         # leaves.validate()
 
         if blossom_count > 0:
-            blossom = bpy.data.meshes.new('blossom')
-            blossom_obj = bpy.data.objects.new('Blossom', blossom)
-            bpy.context.scene.objects.link(blossom_obj)
+            blossom = self.new_object('Blossom', 'MESH', group).data
             blossom.from_pydata(blossom_verts, (), blossom_faces)
             # blossom.validate()
 
-        print('\nLeaves made: %i : %i in %f seconds' % (leaf_count, blossom_count, time() - start_time))
+        if group is None:
+            print('\nLeaves made: %i : %i in %f seconds' % (leaf_count, blossom_count, time() - start_time))
+
+    def create_leaf_meshes(self, leaves_array, base_leaf_shape, base_blossom_shape, start_time, group=None):
+        """Create leaf and blossom meshes, computing leaf geometry on a worker thread while the meshes
+        are set up"""
+        def new_mesh(name):
+            return self.new_object(name, 'MESH', group).data
+
+        def progress(leaf_count, blossom_count):
+            if group is None:
+                sys.stdout.write('\r-> ' + str(leaf_count) + ' leaves made, ' + str(blossom_count) + ' blossom made')
+                sys.stdout.flush()
+
+        blossom = np.array([random() < self.blossom_rate for _ in leaves_array], dtype=bool)
+        buffers = make_leaf_meshes(leaves_array, base_leaf_shape, base_blossom_shape, self.leaf_bend, blossom,
+                                   new_mesh, progress)
+        if group is None:
+            print('\nLeaves made: %i : %i in %f seconds' % (buffers[0].count, buffers[1].count, time() - start_time))
+
+    def export_leaves(self, leaf_verts, leaf_faces, blossom_verts, blossom_faces):
+        """pass leaves made so far to the exporter, emptying the lists so they don't grow with the tree"""
+        self.exporter.add_leaves('leaves', leaf_verts, leaf_faces)
+        self.exporter.add_leaves('blossom', blossom_verts, blossom_faces)
+        for arr in [leaf_verts, leaf_faces, blossom_verts, blossom_faces]:
+            del arr[:]
+
+    def create_leaf_instances(self, leaves_array, group=None):
+        """Create instanced leaves for tree, storing a transform for each leaf rather than its mesh"""
+        if group is None:
+            print('Making Leaf Instances')
+        start_time = time()
+        # base shapes are unit size, scale is applied per instance
+        base_leaf_shape = Leaf.get_shape(self.leaf_shape, 1, 1, self.leaf_scale_x)
+        base_blossom_shape = Leaf.get_shape(self.blossom_shape, 1, 1, 1)
+        instances = []
+        for leaf in leaves_array:
+            if random() < self.blossom_rate:
+                instances.append(leaf.get_instance(self.leaf_bend, self.blossom_scale, True))
+            else:
+                instances.append(leaf.get_instance(self.leaf_bend, self.leaf_scale))
+        instances = np.array(instances, dtype=INSTANCE_DTYPE)
+
+        is_blossom = instances['blossom']
+        leaf_count = len(instances) - np.count_nonzero(is_blossom)
+        blossom_count = len(instances) - leaf_count
+        if leaf_count > 0:
+            create_instanced_leaves('Leaves', base_leaf_shape, instances[~is_blossom], self.tree_obj, group)
+        if blossom_count > 0:
+            create_instanced_leaves('Blossom', base_blossom_shape, instances[is_blossom], self.tree_obj, group)
+
+        if group is None:
+            self.leaf_instances = instances
+            print('Leaf instances made: %i : %i in %f seconds' % (leaf_count, blossom_count, time() - start_time))
 
     def make_leaf(self, leaf, base_leaf_shape, index, verts_array, faces_array):
         """get vertices and faces for leaf and append to appropriate arrays"""
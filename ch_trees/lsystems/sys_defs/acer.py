@@ -9,6 +9,7 @@ __len_rat__ = 0.9
 __n_leaves__ = 15
 __width_d__ = 0.4 / 8
 __len_d__ = 0.1
+default_iterations = 9
 
 
 def d1_ang():
@@ -108,8 +109,8 @@ def a_prod(sym):
                 LSymbol("]")]
 
 
-def system():
-    """initialize and iterate the system as appropriate"""
+def system(iterations=default_iterations):
+    """initialize and iterate the system as appropriate, performing iterations iterations"""
     l_sys = LSystem(axiom=[LSymbol("!", {"w": 0.7}),
                            LSymbol("F", {"l": 0.5}),
                            LSymbol("/", {"a": 45}),
@@ -121,5 +122,5 @@ def system():
                     leaf_shape=5,
                     leaf_scale=0.2,
                     leaf_bend=0.2)
-    l_sys.iterate_n(9)
+    l_sys.iterate_n(iterations)
     return l_sys
@@ -8,6 +8,7 @@ from ch_trees.lsystems.lsystem import LSystem, LSymbol
 
 __iterations__ = 10.0
 __base_width__ = 0.7
+default_iterations = 15
 
 
 def q_prod(sym):
@@ -65,8 +66,8 @@ def a_prod(sym):
     return ret
 
 
-def system():
-    """initialize and iterate the system as appropriate"""
+def system(iterations=default_iterations):
+    """initialize and iterate the system as appropriate, performing iterations iterations"""
     l_sys = LSystem(axiom=[LSymbol("!", {"w": __base_width__}),
                            LSymbol("/", {"a": 45}),
                            LSymbol("Q", {"w": __base_width__, "l": 0.5})],
@@ -77,5 +78,5 @@ def system():
                     leaf_shape=0,
                     leaf_scale=0.3,
                     leaf_bend=0.7)
-    l_sys.iterate_n(15)
+    l_sys.iterate_n(iterations)
     return l_sys
@@ -9,6 +9,7 @@ from ch_trees.lsystems.lsystem import LSystem, LSymbol
 __d_t__ = 4
 __t_max__ = 350
 __p_max__ = 0.93
+default_iterations = 100
 
 
 def q_prod(sym):
@@ -56,8 +57,8 @@ def a_prod(_):
     return res
 
 
-def system():
-    """initialize and iterate the system as appropriate"""
+def system(iterations=default_iterations):
+    """initialize and iterate the system as appropriate, performing iterations iterations"""
     l_sys = LSystem(axiom=[LSymbol("!", {"w": 0.2}),
                            LSymbol("/", {"a": random() * 360}),
                            LSymbol("Q", {"t": 0})],
@@ -69,5 +70,5 @@ def system():
                     leaf_scale=1,
                     leaf_scale_x=0.1,
                     leaf_bend=0)
-    l_sys.iterate_n(100)
+    l_sys.iterate_n(iterations)
     return l_sys
@@ -8,6 +8,7 @@ from ch_trees.lsystems.lsystem import LSystem, LSymbol
 
 __base_width__ = 0.3
 __base_length__ = 4
+default_iterations = 12
 
 
 def q_prod(sym):
@@ -75,8 +76,8 @@ def a_prod(sym):
     return ret
 
 
-def system():
-    """initialize and iterate the system as appropriate"""
+def system(iterations=default_iterations):
+    """initialize and iterate the system as appropriate, performing iterations iterations"""
     axiom = []
     con = int(__base_length__ / 0.1)
     s = random() * 0.2 + 0.9
@@ -92,5 +93,5 @@ def system():
                     leaf_shape=3,
                     leaf_scale=0.17,
                     leaf_bend=0.2)
-    l_sys.iterate_n(12)
+    l_sys.iterate_n(iterations)
     return l_sys
@@ -11,6 +11,7 @@ __branch_length_r__ = 0.93
 __sec_branch_ang__ = 80
 __sec_branch_ang_v__ = 30
 __n_leaves__ = 300
+default_iterations = 15
 
 
 def q_prod(sym):
@@ -77,8 +78,8 @@ def a_prod(sym):
                               "w": sym.parameters["w"] * __width_r__})]
 
 
-def system():
-    """initialize and iterate the system as appropriate"""
+def system(iterations=default_iterations):
+    """initialize and iterate the system as appropriate, performing iterations iterations"""
     l_sys = LSystem(axiom=[LSymbol("!", {"w": 0.2}),
                            LSymbol("F", {"l": 0.6}),
                            LSymbol("Q", {"w": 0.2, "bw": 0.05, "l": 0.5, "bl": 0.4})],
@@ -90,5 +91,5 @@ def system():
                     leaf_scale=0.15,
                     leaf_scale_x=0.3,
                     leaf_bend=0)
-    l_sys.iterate_n(15)
+    l_sys.iterate_n(iterations)
     return l_sys
@@ -3,15 +3,62 @@
 from imp import reload
 from time import time
 
+from ch_trees.chunks import split_tree
+from ch_trees.datablocks import DatablockReuse
+from ch_trees.export import check_export_options, make_exporter
+from ch_trees.memory_profile import MemoryProfile
+from ch_trees.radius_classes import split_by_radius
 
-def construct(modname):
-    """Construct the tree"""
+
+def construct(modname, leaf_instancing=False, instance_subtrees=False, budget=None, profile_memory=False,
+              export_path=None, replace=None, chunks=0, bevel_tolerance=None):
+    """Construct the tree, optionally outputting leaves as instances of a single base mesh and
+    repeated subtrees as instances of a single shared copy. If a Budget is given the tree is kept
+    within it. If profile_memory memory used by each phase is reported. If export_path is given the
+    tree is written to it as .glb or .obj as flat meshes, so it can't also be instanced or split into
+    several objects: asking for both raises an Exception rather than one being ignored. If replace, a
+    tree made by either generator, is given the new tree takes over its objects and datablocks. If
+    chunks is more than one the branches and leaves are split into that many objects each by region
+    of the tree, see ch_trees.chunks. If bevel_tolerance is given branches are split into curve objects
+    by the bevel resolution their radius needs to keep within it, see ch_trees.radius_classes"""
+    if chunks < 0:
+        raise Exception('Number of chunks can\'t be negative: %s' % chunks)
+    if export_path is not None:
+        check_export_options(leaf_instancing or instance_subtrees, chunks, bevel_tolerance)
+    if replace is not None and replace.tree_obj is None:
+        raise Exception('Tree to replace has no objects left, it was already replaced or removed')
     start_time = time()
     print('** Generating Tree **')
     mod = __import__(modname, fromlist=[''])
     reload(mod)
-    mod.system().parse()
+    if budget is None and not profile_memory:
+        l_sys = mod.system()
+    else:
+        # iterate here so iterations can stop early to keep within budget and are profiled
+        l_sys = mod.system(0)
+        l_sys.budget = budget
+        if profile_memory:
+            l_sys.memory_profile = MemoryProfile()
+        l_sys.iterate_n(mod.default_iterations)
+    l_sys.leaf_instancing = leaf_instancing
+    l_sys.instance_subtrees = instance_subtrees
+    if replace is not None:
+        l_sys.reuse = DatablockReuse.from_tree(replace)
+    if export_path is not None:
+        l_sys.exporter = make_exporter(export_path)
+    l_sys.parse()
+    if export_path is not None:
+        l_sys.exporter.close()
+        l_sys.exporter = None
+    else:
+        if bevel_tolerance is not None:
+            split_by_radius(l_sys.tree_obj, bevel_tolerance)
+            l_sys.branches_curve = None
+        if chunks > 1:
+            split_tree(l_sys.tree_obj, chunks)
+            l_sys.branches_curve = None
     print('Tree generated in %f seconds' % (time() - start_time))
+    return l_sys
 
 
 # construct('ch_trees.lsystems.sys_defs.quaking_aspen')
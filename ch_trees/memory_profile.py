@@ -0,0 +1,105 @@
+"""Opt-in profiling of memory use by each phase of generating a tree.
+
+At the end of each phase a tracemalloc snapshot is taken and compared with the one taken at the end
+of the previous phase, attributing the Python memory the phase left allocated to the source lines
+that allocated it. Resident set size is sampled at the same points, and the part of its growth not
+traced by tracemalloc is reported as untraced, which is mostly memory held by Blender datablocks and
+NumPy arrays. Tracing slows generation down a lot so times measured while profiling are not
+representative."""
+
+import os
+import resource
+import tracemalloc
+from collections import namedtuple
+
+# memory at the end of one phase, sizes in bytes. peak_traced is the highest traced memory during the
+# phase if tracemalloc can reset its peak, otherwise since profiling started
+PhaseMemory = namedtuple('PhaseMemory', ['phase', 'rss', 'peak_rss', 'traced', 'peak_traced', 'sites'])
+
+# one source line and the memory it allocated during a phase and still held at its end
+AllocationSite = namedtuple('AllocationSite', ['location', 'size', 'count'])
+
+MB = 1024 * 1024
+
+
+def current_rss():
+    """Resident set size of this process in bytes, or None where it can't be read"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes"""
+    # ru_maxrss is in kilobytes on Linux but bytes on macOS
+    scale = 1 if os.uname().sysname == 'Darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+class MemoryProfile(object):
+    """Memory use at the end of each phase of generating one tree, keeping the top allocation sites of
+    each phase"""
+    top = 10
+    started_tracing = False
+
+    def __init__(self, top=10):
+        """Start profiling, tracing allocations if they aren't already being traced"""
+        self.top = top
+        self.phases = []
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+        self.start_rss = current_rss()
+        self.start_traced = tracemalloc.get_traced_memory()[0]
+        self.snapshot = self.take_snapshot()
+
+    @staticmethod
+    def take_snapshot():
+        """Snapshot of traced allocations, leaving out those made by tracemalloc itself"""
+        return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+    def mark(self, phase):
+        """Record memory at the end of phase, attributing what it allocated to source lines"""
+        traced, peak_traced = tracemalloc.get_traced_memory()
+        snapshot = self.take_snapshot()
+        sites = []
+        for stat in snapshot.compare_to(self.snapshot, 'lineno'):
+            if stat.size_diff <= 0:
+                continue
+            frame = stat.traceback[0]
+            sites.append(AllocationSite('%s:%i' % (frame.filename, frame.lineno), stat.size_diff,
+                                        stat.count_diff))
+            if len(sites) == self.top:
+                break
+        self.phases.append(PhaseMemory(phase, current_rss(), peak_rss(), traced, peak_traced, sites))
+        self.snapshot = snapshot
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+
+    def stop(self):
+        """Stop tracing allocations if this profile started it"""
+        self.snapshot = None
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def report(self):
+        """Return text describing memory use of each phase"""
+        lines = ['Memory use by phase (MB):']
+        last_rss, last_traced = self.start_rss, self.start_traced
+        for phase in self.phases:
+            line = '  %s: traced %.1f (%+.1f), peak traced %.1f' % (
+                phase.phase, phase.traced / MB, (phase.traced - last_traced) / MB, phase.peak_traced / MB)
+            if phase.rss is not None and last_rss is not None:
+                # rss growth not seen by tracemalloc is held outside python objects
+                line += ', rss %.1f (%+.1f, untraced %+.1f)' % (
+                    phase.rss / MB, (phase.rss - last_rss) / MB,
+                    ((phase.rss - last_rss) - (phase.traced - last_traced)) / MB)
+            line += ', peak rss %.1f' % (phase.peak_rss / MB)
+            lines.append(line)
+            for site in phase.sites:
+                lines.append('    %10.2f MB %8i blocks  %s' % (site.size / MB, site.count, site.location))
+            last_rss, last_traced = phase.rss, phase.traced
+        return '\n'.join(lines)
@@ -0,0 +1,198 @@
+"""Batch generation of labelled Parametric tree datasets.
+
+Parameter vectors are sampled around the presets, each sample being a random blend of two presets
+in the flattened form given by TreeParam.param_to_arr with some noise added. Trees are generated
+headlessly across a process pool, each within a Budget so no single sample can stall the run, and
+their feature vectors, geometry statistics and optionally a point cloud are written to .npz shards of
+shard_size samples. Every sample is seeded from its index so a run can be stopped and resumed, shards
+already written are skipped.
+
+The stats array of a shard has a column for each of stat_names. Its last column, cut, is 1 for trees
+the Budget thinned or the deadline stopped, whose geometry is then not what their features describe.
+Cut samples are left out of the shards unless keep_cut is set, the index column showing which are
+missing. The default stem and leaf limits fit trees up to the size of the larger presets, and the
+deadline only stops samples far bigger or slower than those.
+
+Run from Blender in background mode, e.g.
+    blender -b --python ch_trees/parametric/dataset.py -- out_dir --count 100000 --points 2048"""
+
+import argparse
+import os
+import random
+import sys
+from multiprocessing import Pool
+from time import time
+
+import numpy as np
+
+from ch_trees.budget import Budget
+from ch_trees.parametric.tree_params.tree_param import TreeParam
+from ch_trees.standin.fallback import install_fallback
+
+PRESETS = ['acer', 'apple', 'balsam_fir', 'bamboo', 'black_oak', 'black_tupelo', 'douglas_fir', 'european_larch',
+           'fan_palm', 'hill_cherry', 'lombardy_poplar', 'palm', 'quaking_aspen', 'sassafras', 'silver_birch',
+           'small_pine', 'weeping_willow']
+
+STAT_NAMES = ['stems', 'splines', 'points', 'leaves', 'height', 'radius', 'seconds', 'cut']
+
+
+def load_presets(names):
+    """Parameter dictionaries of presets names"""
+    return [__import__('ch_trees.parametric.tree_params.' + name, fromlist=['']).params for name in names]
+
+
+def sample_params(rng, presets, arrs, jitter):
+    """Sample parameter dictionary as a random blend of two of presets, arrs being their arrays, with
+    noise of jitter times the range of each value across the presets added"""
+    low, high = arrs.min(axis=0), arrs.max(axis=0)
+    first, second = rng.choice(len(presets), 2)
+    blend = rng.random_sample()
+    arr = arrs[first] + blend * (arrs[second] - arrs[first])
+    arr = np.clip(arr + rng.normal(0, 1, len(arr)) * jitter * (high - low), low, high)
+    # parameters left out of the array come from the nearer preset
+    return TreeParam.arr_to_param(arr, presets[first] if blend < 0.5 else presets[second])
+
+
+def make_jobs(count, shard_size, out_dir, preset_names, jitter, seed):
+    """Generator of (index, seed, params) for each sample in shards which haven't been written yet"""
+    presets = load_presets(preset_names)
+    arrs = np.array([TreeParam(params).param_to_arr() for params in presets], dtype=float)
+    for shard in range(int(np.ceil(count / shard_size))):
+        if os.path.exists(shard_path(out_dir, shard)):
+            continue
+        for index in range(shard * shard_size, min(count, (shard + 1) * shard_size)):
+            rng = np.random.RandomState([seed, index])
+            yield index, int(rng.randint(1, 9999999)), sample_params(rng, presets, arrs, jitter)
+
+
+def shard_path(out_dir, shard):
+    """Path of shard number shard"""
+    return os.path.join(out_dir, 'shard_%05i.npz' % shard)
+
+
+# budget limits for each tree, set in each worker process
+budget_limits = {}
+
+
+def init_worker(limits):
+    """Set up worker process, silencing generation output"""
+    global budget_limits
+    budget_limits = limits
+    install_fallback()
+    from ch_trees.parametric import gen
+    gen.__logging__ = False
+    sys.stdout = open(os.devnull, 'w')
+
+
+def make_sample(job, n_points=0):
+    """Generate tree for job, returning its index, seed, features, statistics and point cloud of
+    n_points points sampled from its branches and leaves"""
+    from ch_trees.parametric import gen
+    index, seed, params = job
+    start_time = time()
+    random.seed(seed)
+    budget = Budget(**budget_limits)
+    tree = gen.Tree(TreeParam(params), budget=budget)
+    tree.make()
+
+    # gather branch points and leaf positions
+    clouds = []
+    for spline in tree.branches_curve.splines:
+        co = np.zeros(len(spline.bezier_points) * 3)
+        spline.bezier_points.foreach_get('co', co)
+        clouds.append(co.reshape(-1, 3))
+    clouds.append(np.array([leaf.position for leaf in tree.leaves_array]).reshape(-1, 3))
+    cloud = np.concatenate(clouds)
+    height = radius = 0
+    if len(cloud) > 0:
+        height = cloud[:, 2].max()
+        radius = np.hypot(cloud[:, 0], cloud[:, 1]).max()
+    stats = [tree.stem_count, len(tree.branches_curve.splines), len(cloud) - len(tree.leaves_array),
+             len(tree.leaves_array), height, radius, time() - start_time, len(budget.notes) + len(budget.cuts) > 0]
+    points = None
+    if n_points > 0:
+        if len(cloud) > 0:
+            points = cloud[np.random.RandomState(seed).randint(0, len(cloud), n_points)]
+        else:
+            points = np.zeros((n_points, 3))
+    tree.remove()
+    return index, seed, TreeParam(params).param_to_arr(), stats, points
+
+
+def sample_job(args):
+    """Pool entry point for make_sample"""
+    return make_sample(*args)
+
+
+def write_shard(out_dir, shard, samples, n_features):
+    """Write samples, each having n_features features, to shard, via a temporary file so partly written
+    shards are never left behind. A shard whose samples were all cut is written empty so it isn't made
+    again when resuming"""
+    data = {
+        'index': np.array([sample[0] for sample in samples], dtype=np.int64),
+        'seed': np.array([sample[1] for sample in samples], dtype=np.int64),
+        'features': np.array([sample[2] for sample in samples], dtype=np.float32).reshape(-1, n_features),
+        'stats': np.array([sample[3] for sample in samples], dtype=np.float32).reshape(-1, len(STAT_NAMES)),
+        'stat_names': np.array(STAT_NAMES),
+    }
+    if samples and samples[0][4] is not None:
+        data['points'] = np.array([sample[4] for sample in samples], dtype=np.float32)
+    path = shard_path(out_dir, shard)
+    with open(path + '.tmp', 'wb') as shard_file:
+        np.savez_compressed(shard_file, **data)
+    os.replace(path + '.tmp', path)
+
+
+def generate_dataset(out_dir, count, shard_size=1000, n_points=0, processes=None, presets=None, jitter=0.1,
+                     seed=0, max_stems=20000, max_leaves=400000, deadline=60, keep_cut=False):
+    """Generate count samples into shards in out_dir using a pool of processes processes (default one
+    per CPU), keeping each tree within the given budget. Samples the budget cut are dropped unless
+    keep_cut"""
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    start_time = time()
+    limits = {'max_stems': max_stems, 'max_leaves': max_leaves, 'deadline': deadline}
+    jobs = ((job, n_points) for job in make_jobs(count, shard_size, out_dir, presets or PRESETS, jitter, seed))
+    n_features = len(TreeParam(load_presets(presets or PRESETS)[0]).param_to_arr())
+    samples = []
+    made = dropped = 0
+    with Pool(processes, init_worker, (limits,)) as pool:
+        # results come back in order so each shard is written once its last sample is made
+        for sample in pool.imap(sample_job, jobs, chunksize=4):
+            made += 1
+            if sample[3][-1] and not keep_cut:
+                dropped += 1
+            else:
+                samples.append(sample)
+            if (sample[0] + 1) % shard_size == 0 or sample[0] == count - 1:
+                write_shard(out_dir, sample[0] // shard_size, samples, n_features)
+                samples = []
+            sys.stdout.write('\r-> %i samples made, %i cut and dropped, %f per second' % (
+                made, dropped, made / (time() - start_time)))
+            sys.stdout.flush()
+    print('\nMade %i samples, dropping %i cut by the budget, in %f seconds' % (made, dropped, time() - start_time))
+
+
+def main(argv):
+    """Generate dataset from command line arguments argv"""
+    parser = argparse.ArgumentParser(description='Generate dataset of Parametric trees')
+    parser.add_argument('out_dir')
+    parser.add_argument('--count', type=int, default=1000)
+    parser.add_argument('--shard-size', type=int, default=1000)
+    parser.add_argument('--points', type=int, default=0, help='points in point cloud of each sample')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--presets', nargs='+', default=None)
+    parser.add_argument('--jitter', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-stems', type=int, default=20000)
+    parser.add_argument('--max-leaves', type=int, default=400000)
+    parser.add_argument('--deadline', type=float, default=60)
+    parser.add_argument('--keep-cut', action='store_true', help='keep samples the budget cut, flagged in stats')
+    args = parser.parse_args(argv)
+    generate_dataset(args.out_dir, args.count, args.shard_size, args.points, args.processes, args.presets,
+                     args.jitter, args.seed, args.max_stems, args.max_leaves, args.deadline, args.keep_cut)
+
+
+if __name__ == '__main__':
+    # blender passes script arguments after --
+    main(sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else sys.argv[1:])
@@ -9,17 +9,47 @@ from imp import reload  # required to fix Blender weirdness
 from math import ceil, sqrt, degrees, radians, tan, sin, cos, pow, pi
 from time import time
 
-# blender imports
+# blender imports, outside blender the entry points install the stand-ins in ch_trees.standin first
 import bpy
 from enum import Enum
 from mathutils import Quaternion
 
+import numpy as np
+
+from ch_trees.budget import level_factors
 from ch_trees.chturtle import Vector, CHTurtle
-from ch_trees.leaf import Leaf
+from ch_trees.chunks import split_tree
+from ch_trees.datablocks import DatablockReuse, new_data, remove_objects
+from ch_trees.export import CHUNK_VERTS, check_export_options, make_exporter
+from ch_trees.instancing import INSTANCE_DTYPE, create_instanced_leaves
+from ch_trees.leaf import Leaf, leaf_frames, leaf_rotations, leaf_vertices
+from ch_trees.memory_profile import MemoryProfile
 from ch_trees.parametric.tree_params.tree_param import TreeParam
+from ch_trees.pipeline import LeafMeshBuffer, add_leaf_meshes, make_leaf_meshes
+from ch_trees.radius_classes import split_by_radius
 
 __logging__ = True
 
+# stages of generation in order: the skeleton of stems at each depth, placing leaves on the deepest
+# stems and making leaf meshes. Leaves are placed as the deepest stems are walked so placing them again
+# makes those stems again
+STAGES = ['skeleton 0', 'skeleton 1', 'skeleton 2', 'skeleton 3', 'leaf placement', 'leaf meshing']
+# earliest stage each parameter affects, any parameter not listed affects the trunk and everything after
+PARAM_STAGES = {'shape': 'skeleton 1', 'ratio_power': 'skeleton 1', 'leaf_blos_num': 'leaf placement',
+                'leaf_shape': 'leaf meshing', 'leaf_scale': 'leaf meshing', 'leaf_scale_x': 'leaf meshing',
+                'leaf_bend': 'leaf meshing', 'blossom_shape': 'leaf meshing', 'blossom_scale': 'leaf meshing',
+                'blossom_rate': 'leaf meshing'}
+# per level parameters, with the offset from the index of an entry to the depth of the stems that use it.
+# Entries used by stems at their own depth have offset 0, those for placing children -1 as the parent
+# stem places its children
+LEVEL_PARAMS = {'base_size': 0, 'taper': 0, 'seg_splits': 0, 'split_angle': 0, 'split_angle_v': 0, 'curve_res': 0,
+                'curve': 0, 'curve_back': 0, 'curve_v': 0, 'bend_v': 0, 'radius_mod': 0,
+                'down_angle': -1, 'down_angle_v': -1, 'rotate': -1, 'rotate_v': -1, 'branches': -1, 'length': -1,
+                'length_v': -1, 'branch_dist': -1}
+
+# tree made by the last incremental construct, with the seed and options it was made with
+cached_tree = None
+
 
 # ----- GENERAL FUNCTIONS ----- #
 
@@ -129,6 +159,233 @@ class Stem(object):
         return '%s %s %s' % (self.length, self.offset, self.radius)
 
 
+StemSegment = namedtuple('StemSegment', ['seg_ind', 'co', 'handle_left', 'handle_right', 'turtle', 'num_of_splits',
+                                         'num_branches_factor', 'reduce_branches', 'random_state', 'split_error'])
+
+
+StemRecord = namedtuple('StemRecord', ['make', 'turtle', 'pos_corr_turtle', 'stem', 'tree_scale', 'base_length',
+                                       'random_state', 'split_error', 'splines', 'leaves', 'children'])
+
+
+class StemWalk(object):
+    """Walk of the turtle along a stem deciding point positions and splits, shared by stem generation
+    and pruning tests so both follow exactly the same path. Iterating steps yields a StemSegment for
+    each point once the number of splits there is decided, before the split angles are drawn and the
+    turtle is turned for the next segment. A commit walk makes the clone stems for each split as it
+    goes, a dry-run walk instead records its segments so it can later be replayed without walking
+    again"""
+
+    def __init__(self, tree, turtle, stem, start=0, split_corr_angle=0, clone_prob=1, num_branches_factor=1,
+                 cloned_turtle=None, commit=False):
+        """Set up walk of stem from start segment, drawing rotation and helix parameters"""
+        self.tree = tree
+        self.turtle = turtle
+        self.stem = stem
+        self.start = start
+        self.split_corr_angle = split_corr_angle
+        self.clone_prob = clone_prob
+        self.num_branches_factor = num_branches_factor
+        self.cloned_turtle = cloned_turtle
+        self.commit = commit
+        self.length = stem.length
+        self.segments = None
+        self.complete = False
+        self.has_splits = False
+        self.check_points = self.outside = False
+        self.start_state = self.end_state = None
+        if not commit:
+            self.segments = []
+            self.start_state = (random.getstate(), copy(tree.split_num_error))
+
+        param = tree.param
+        depth = stem.depth
+        d_plus_1 = min(3, depth + 1)
+        self.curve_res = int(param.curve_res[depth])
+        self.seg_length = stem.length / self.curve_res
+        self.base_seg_ind = ceil(param.base_size[0] * int(param.curve_res[0]))
+        self.helix = param.curve_v[depth] < 0
+        # apply full tropism if not trunk/main branch and horizontal tropism if is
+        if depth > 1:
+            self.tropism = Vector(param.tropism)
+        else:
+            self.tropism = Vector([param.tropism[0], param.tropism[1], 0])
+
+        # decide on start rotation for branches/leaves
+        # use array to allow other methods to modify the value (otherwise passed by value)
+        self.prev_rotation_angle = [0]
+        if param.rotate[d_plus_1] >= 0:
+            # start at random rotation
+            self.prev_rotation_angle[0] = rand_in_range(0, 360)
+        else:
+            # on this case prev_rotation_angle used as multiplier to alternate side of branch
+            self.prev_rotation_angle[0] = 1
+
+        # calc helix parameters if needed
+        self.helix_points = None
+        if self.helix:
+            tan_ang = tan(radians(90 - abs(param.curve_v[depth])))
+            hel_pitch = 2 * stem.length / self.curve_res * rand_in_range(0.8, 1.2)
+            hel_radius = 3 * hel_pitch / (16 * tan_ang) * rand_in_range(0.8, 1.2)
+            apply_tropism(turtle, self.tropism)
+            self.helix_points = calc_helix_points(turtle, hel_radius, hel_pitch)
+
+    def steps(self):
+        """Generator walking the turtle along the stem, yielding a StemSegment for each point"""
+        tree = self.tree
+        param = tree.param
+        stem = self.stem
+        turtle = self.turtle
+        depth = stem.depth
+        curve_res = self.curve_res
+        seg_splits = param.seg_splits[depth]
+        prev_co = None
+        for seg_ind in range(self.start, curve_res + 1):
+            remaining_segs = curve_res + 1 - seg_ind
+            # set up next bezier point
+            if self.helix:
+                # negative curve_v so helix branch
+                hel_p_0, hel_p_1, hel_p_2, hel_axis = self.helix_points
+                pos = turtle.pos
+                if seg_ind == 0:
+                    co = pos.copy()
+                    handle_right = hel_p_0 + pos
+                    handle_left = pos.copy()
+                elif seg_ind == 1:
+                    co = hel_p_2 + pos
+                    handle_left = hel_p_1 + pos
+                    handle_right = 2 * co - handle_left
+                else:
+                    co = hel_p_2.rotated(Quaternion(hel_axis, (seg_ind - 1) * pi))
+                    co += prev_co
+                    dif_p = (hel_p_2 - hel_p_1).rotated(Quaternion(hel_axis, (seg_ind - 1) * pi))
+                    handle_left = co - dif_p
+                    handle_right = 2 * co - handle_left
+                turtle.pos = co.copy()
+                turtle.dir = handle_right.copy().normalized()
+            else:
+                # normal curved branch
+                if seg_ind != self.start:
+                    turtle.move(self.seg_length)
+                # if this is a clone then correct initial direction to match original to make
+                # split smoother
+                co = turtle.pos.copy()
+                if self.cloned_turtle and seg_ind == self.start:
+                    handle_left = turtle.pos - self.cloned_turtle.dir * (stem.length / (curve_res * 3))
+                    handle_right = turtle.pos + self.cloned_turtle.dir * (stem.length / (curve_res * 3))
+                else:
+                    handle_left = turtle.pos - turtle.dir * stem.length / (curve_res * 3)
+                    handle_right = turtle.pos + turtle.dir * stem.length / (curve_res * 3)
+            prev_co = co
+
+            # a dry run stops as soon as a point falls outside the pruning envelope, before the splits
+            # there are drawn, so rejected walks use up the same random numbers and split error as ever
+            if self.check_points and seg_ind != self.start and not tree.point_inside(co):
+                self.outside = True
+                return
+
+            # calc number of splits at this seg (N/A for helix)
+            num_of_splits = 0
+            reduce_branches = False
+            if seg_ind > self.start and not self.helix:
+                if param.base_splits > 0 and depth == 0 and seg_ind == self.base_seg_ind:
+                    # if base_seg_ind and has base splits then override with base split number
+                    # take random number of splits up to max of base_splits if negative
+                    if param.base_splits < 0:
+                        num_of_splits = int(rand_in_range(0, 1) * (abs(param.base_splits) + 0.5))
+                    else:
+                        num_of_splits = int(param.base_splits)
+                elif seg_splits > 0 and seg_ind < curve_res and (depth > 0 or seg_ind > self.base_seg_ind):
+                    # otherwise get number of splits from seg_splits and use floyd-steinberg to
+                    # fix non-integer values only clone with probability clone_prob
+                    if rand_in_range(0, 1) <= self.clone_prob:
+                        num_of_splits = int(seg_splits + tree.split_num_error[depth])
+                        tree.split_num_error[depth] -= num_of_splits - seg_splits
+                        # reduce clone/branch propensity
+                        self.clone_prob /= num_of_splits + 1
+                        self.num_branches_factor /= num_of_splits + 1
+                        self.num_branches_factor = max(0.8, self.num_branches_factor)
+                        reduce_branches = True
+            if num_of_splits > 0:
+                self.has_splits = True
+
+            if self.segments is None:
+                seg_turtle = turtle
+                random_state = None
+            else:
+                seg_turtle = CHTurtle(turtle)
+                random_state = random.getstate()
+            segment = StemSegment(seg_ind, co, handle_left, handle_right, seg_turtle, num_of_splits,
+                                  self.num_branches_factor, reduce_branches, random_state,
+                                  tree.split_num_error[depth])
+            if self.segments is not None:
+                self.segments.append(segment)
+            yield segment
+
+            # perform cloning if needed and turn turtle ready for next segment, not allowed for helix (also
+            # don't curve/apply tropism as irrelevant)
+            if seg_ind > self.start and not self.helix:
+                if num_of_splits > 0:
+                    # calc angles for split
+                    is_base_split = (param.base_splits > 0 and depth == 0 and seg_ind == self.base_seg_ind)
+                    using_direct_split = param.split_angle[depth] < 0
+                    if using_direct_split:
+                        spr_angle = abs(param.split_angle[depth]) + rand_for_param_var() * param.split_angle_v[depth]
+                        spl_angle = 0
+                        self.split_corr_angle = 0
+                    else:
+                        declination = turtle.dir.declination()
+                        spl_angle = param.split_angle[depth] + rand_for_param_var() * param.split_angle_v[
+                            depth] - declination
+                        spl_angle = max(0, spl_angle)
+                        self.split_corr_angle = spl_angle / remaining_segs
+                        spr_angle = - (20 + 0.75 * (30 + abs(declination - 90) * rand_in_range(0, 1) ** 2))
+
+                    # make clone branches
+                    if self.commit:
+                        r_state = random.getstate()
+                        tree.make_clones(turtle, seg_ind, self.split_corr_angle, self.num_branches_factor,
+                                         self.clone_prob, stem, num_of_splits, spl_angle, spr_angle, is_base_split)
+                        random.setstate(r_state)
+
+                    # apply split to base stem
+                    turtle.pitch_down(spl_angle / 2)
+                    # apply spread if splitting to 2 and not base split
+                    if not is_base_split and num_of_splits == 1:
+                        if using_direct_split:
+                            turtle.turn_right(spr_angle / 2)
+                        else:
+                            turtle.dir.rotate(Quaternion(Vector([0, 0, 1]), radians(-spr_angle / 2)))
+                            turtle.dir.normalize()
+                            turtle.right.rotate(Quaternion(Vector([0, 0, 1]), radians(-spr_angle / 2)))
+                            turtle.right.normalize()
+                else:
+                    # just apply curve and split correction
+                    turtle.turn_left(rand_for_param_var() * param.bend_v[depth] / curve_res)
+                    curve_angle = tree.calc_curve_angle(depth, seg_ind)
+                    turtle.pitch_down(curve_angle - self.split_corr_angle)
+
+                apply_tropism(turtle, self.tropism)
+
+        self.complete = True
+        if self.segments is not None:
+            self.end_state = (random.getstate(), copy(tree.split_num_error))
+
+    def dry_run(self):
+        """Walk stem without making any geometry, returning whether it stays inside the pruning
+        envelope. Stops as soon as a point falls outside"""
+        self.check_points = not self.helix and not (self.stem.depth == 0 and self.start < self.base_seg_ind)
+        for _ in self.steps():
+            pass
+        return not self.outside and self.tree.point_inside(self.turtle.pos)
+
+    def can_replay(self, stem):
+        """Whether this recorded walk is exactly the walk that stem would take from the current random
+        state. Walks which split can't be replayed as the clones change the split error part way"""
+        return (self.complete and not self.commit and not self.has_splits and
+                stem.length == self.length and
+                self.start_state == (random.getstate(), self.tree.split_num_error))
+
+
 class Tree(object):
     """Class to store data for the tree"""
     tree_scale = 0
@@ -140,11 +397,54 @@ class Tree(object):
     tree_obj = None
     stem_count = 0
     trunk_length = 0
-
-    def __init__(self, param):
-        """initialize tree with specified parameters"""
+    leaf_instancing = False
+    leaf_instances = None
+    twig_prototypes = 0
+    prototype_depth = 2
+    twig_pools = None
+    budget = None
+    branch_factors = None
+    leaf_factor = 1
+    point_count = 0
+    branches_obj = None
+    leaf_objs = None
+    leaf_random_state = None
+    stem_records = None
+    stem_record = None
+    leaf_blossom = None
+    leaf_buffers = None
+    phase_times = None
+    memory_profile = None
+    exporter = None
+    reuse = None
+
+    def __init__(self, param, leaf_instancing=False, twig_prototypes=0, prototype_depth=2, budget=None,
+                 editable=False, memory_profile=None, exporter=None, reuse=None):
+        """initialize tree with specified parameters, optionally outputting leaves as instances of a
+        single base mesh rather than one combined mesh, placing stems at prototype_depth and
+        above as copies of a pool of twig_prototypes prototypes per depth and keeping within the
+        limits of Budget budget. If editable each stem is recorded so it can later be regenerated.
+        Memory use of each phase is recorded in MemoryProfile memory_profile if given. If a
+        TreeExporter exporter is given branches and leaves are written to it, leaves being made as
+        they are exported rather than as Blender meshes. If a DatablockReuse reuse is given the objects
+        of the tree it holds are taken over rather than making new ones"""
         self.param = param
+        self.leaf_instancing = leaf_instancing
+        self.twig_prototypes = twig_prototypes
+        self.prototype_depth = prototype_depth
+        self.budget = budget
+        self.memory_profile = memory_profile
+        self.exporter = exporter
+        self.reuse = reuse
+        self.twig_pools = {}
+        # per tree, sharing the class list would carry rounding errors over from the last tree made
+        self.split_num_error = [0, 0, 0, 0, 0, 0, 0]
         self.leaves_array = []
+        self.leaf_objs = []
+        # seconds spent in each phase of generation
+        self.phase_times = {}
+        if editable:
+            self.stem_records = []
 
     def make(self):
         """make the tree"""
@@ -152,16 +452,164 @@ class Tree(object):
         if __logging__:
             print('** Generating Tree **')
         # create parent object
-        self.tree_obj = bpy.data.objects.new('Tree', None)
-        bpy.context.scene.objects.link(self.tree_obj)
-        bpy.context.scene.objects.active = self.tree_obj
+        if self.reuse is not None:
+            self.tree_obj = self.reuse.take_tree()
+        else:
+            self.tree_obj = bpy.data.objects.new('Tree', None)
+            bpy.context.scene.objects.link(self.tree_obj)
+            bpy.context.scene.objects.active = self.tree_obj
+        # decide how much to thin the tree by if it would be over budget
+        if self.budget is not None:
+            phase_start = time()
+            self.plan_budget()
+            self.phase_times['budget'] = time() - phase_start
+            self.mark_memory('budget')
         # create branches
-        self.create_branches()
+        self.phase_times['branches'] = self.create_branches()
+        self.mark_memory('branches')
+        if self.exporter is not None:
+            self.exporter.add_branches(self.branches_curve)
+        # keep random state so leaves can be remade the same way
+        self.leaf_random_state = random.getstate()
         # create leaf mesh if needed
+        phase_start = time()
         self.create_leaf_mesh()
+        self.phase_times['leaves'] = time() - phase_start
+        self.mark_memory('leaves')
+        self.finish_reuse()
         g_time = time() - start_time
         if __logging__:
             print('Tree generated in %f seconds' % g_time)
+            if self.budget is not None:
+                print(self.budget.report())
+            if self.memory_profile is not None:
+                print(self.memory_profile.report())
+        if self.memory_profile is not None:
+            self.memory_profile.stop()
+
+    def mark_memory(self, phase):
+        """record memory use at the end of phase if profiling"""
+        if self.memory_profile is not None:
+            self.memory_profile.mark(phase)
+
+    def remake_leaves(self, param):
+        """Replace leaves with those made with TreeParam param, keeping the branches and leaf positions.
+        Only valid if param differs from the current parameters in leaf meshing stage parameters"""
+        start_time = time()
+        self.param = param
+        random.setstate(self.leaf_random_state)
+        self.remake_leaf_objects()
+        if __logging__:
+            print('Leaves remade in %f seconds' % (time() - start_time))
+
+    def remake_leaf_objects(self):
+        """Make leaf objects again from leaves_array, taking over the current ones"""
+        self.reuse = DatablockReuse(self.tree_obj, self.leaf_objs)
+        self.leaf_objs = []
+        self.create_leaf_mesh()
+        self.finish_reuse()
+
+    def new_object(self, name, data_type):
+        """Object called name under the tree with empty data of data_type, 'CURVE' or 'MESH', taken over
+        from the tree being replaced if it had one"""
+        obj = self.reuse.take(name, data_type) if self.reuse is not None else None
+        if obj is None:
+            obj = bpy.data.objects.new(name, new_data(name.lower(), data_type))
+            bpy.context.scene.objects.link(obj)
+            obj.parent = self.tree_obj
+        return obj
+
+    def new_leaf_object(self, name):
+        """Leaf mesh object called name under the tree, as new_object, added to leaf_objs"""
+        obj = self.new_object(name, 'MESH')
+        self.leaf_objs.append(obj)
+        return obj
+
+    def finish_reuse(self):
+        """Remove objects of the replaced tree that weren't taken over"""
+        if self.reuse is not None:
+            self.reuse.finish()
+            self.reuse = None
+
+    def split_by_radius(self, tolerance):
+        """Split branches into curve objects by the bevel resolution their radius needs to keep within
+        tolerance, after which the tree can't be edited or saved as a compact tree"""
+        split_by_radius(self.tree_obj, tolerance)
+        self.branches_obj = self.branches_curve = None
+
+    def split_chunks(self, count):
+        """Split branches and leaves into count objects each by region of the tree, after which the
+        tree can't be edited or saved as a compact tree"""
+        instanced = [obj for obj in self.leaf_objs if obj.dupli_type != 'NONE']
+        _, mesh_objs = split_tree(self.tree_obj, count)
+        self.branches_obj = self.branches_curve = None
+        self.leaf_objs = instanced + mesh_objs
+
+    def remove(self):
+        """Remove all objects and data made for the tree"""
+        if self.tree_obj is not None:
+            remove_objects([self.tree_obj])
+        self.tree_obj = self.branches_obj = None
+        self.leaf_objs = []
+
+    def plan_budget(self):
+        """Work out fraction of stems at each depth and of leaves to make so the tree is expected to
+        be within budget, thinning the deepest stems most"""
+        # imported here as the estimator itself builds on Tree
+        from ch_trees.complexity import estimate_parametric, stem_points
+        estimate = estimate_parametric(self.param)
+        stems = list(estimate.stems)
+        points = [count * stem_points(self.param, depth) for depth, count in enumerate(stems)]
+        self.branch_factors = [min(stem_factor, point_factor) for stem_factor, point_factor in
+                               zip(level_factors(stems, self.budget.max_stems),
+                                   level_factors(points, self.budget.max_points))]
+        kept = 1
+        for depth, factor in enumerate(self.branch_factors):
+            if factor < 1:
+                self.budget.note('depth %i stems thinned to %i%% (estimated %i)' % (depth, round(factor * 100),
+                                                                                   stems[depth]))
+            kept *= factor
+        # leaves are all on the deepest stems
+        leaves = (estimate.leaves + estimate.blossom) * kept
+        if self.budget.max_leaves is not None and leaves > self.budget.max_leaves:
+            self.leaf_factor = self.budget.max_leaves / leaves
+            self.budget.note('leaves thinned to %i%% (estimated %i)' % (round(self.leaf_factor * 100), leaves))
+
+    def keep_stem(self, depth, clone=False):
+        """Whether to make new stem at depth, or new clone at depth if clone, within budget"""
+        budget = self.budget
+        if budget is None:
+            return True
+        if budget.expired():
+            budget.cut('stems skipped at deadline')
+            return False
+        if budget.max_stems is not None and self.stem_count >= budget.max_stems:
+            budget.cut('stems skipped at stem limit')
+            return False
+        if budget.max_points is not None and self.point_count >= budget.max_points:
+            budget.cut('stems skipped at point limit')
+            return False
+        # clones are part of the shape of their stem so are only cut by the limits
+        if not clone and not budget.keep(('stems', depth), self.branch_factors[depth]):
+            budget.cut('stems thinned')
+            return False
+        return True
+
+    def add_leaf(self, leaf, thinned=False):
+        """Add leaf to leaves_array unless cut to keep within budget, only thinning it if not already
+        thinned"""
+        budget = self.budget
+        if budget is not None:
+            if budget.expired():
+                budget.cut('leaves skipped at deadline')
+                return
+            if budget.max_leaves is not None and len(self.leaves_array) >= budget.max_leaves:
+                budget.cut('leaves skipped at leaf limit')
+                return
+            if not thinned and not budget.keep('leaves', self.leaf_factor):
+                budget.cut('leaves thinned')
+                return
+        self.leaves_array.append(leaf)
 
     def points_for_floor_split(self):
         """Calculate Poissonly distributed points for stem start points"""
@@ -174,7 +622,10 @@ class Tree(object):
         # generate points
         for _ in range(self.param.floor_splits + 1):
             point_ok = False
+            # give up on spacing if the trunks can't all fit, rather than searching forever
+            attempts = 0
             while not point_ok:
+                attempts += 1
                 # distance from center proportional for number of splits, tree scale and stem radius
                 dis = sqrt(rand_in_range(0, 1) * self.param.floor_splits / 2.5 * self.param.g_scale * self.param.ratio)
                 # angle random in circle
@@ -183,7 +634,7 @@ class Tree(object):
                 # test point against those already in array to ensure it will not intersect
                 point_m_ok = True
                 for point in array:
-                    if (point[0] - pos).magnitude < rad:
+                    if (point[0] - pos).magnitude < rad and attempts < 1000:
                         point_m_ok = False
                         break
                 if point_m_ok:
@@ -196,16 +647,14 @@ class Tree(object):
         if __logging__:
             print('Making Branches')
         start_time = time()
-        self.branches_curve = bpy.data.curves.new('branches', type='CURVE')
+        self.branches_obj = self.new_object('Branches', 'CURVE')
+        self.branches_curve = self.branches_obj.data
         self.branches_curve.dimensions = '3D'
         self.branches_curve.resolution_u = 4
         self.branches_curve.fill_mode = 'FULL'
         self.branches_curve.bevel_depth = 1
         self.branches_curve.bevel_resolution = 10
         self.branches_curve.use_uv_as_generated = True
-        branches_obj = bpy.data.objects.new('Branches', self.branches_curve)
-        bpy.context.scene.objects.link(branches_obj)
-        branches_obj.parent = self.tree_obj
         # actually make the branches
         points = self.points_for_floor_split()
         for ind in range(self.param.floor_splits + 1):
@@ -225,11 +674,17 @@ class Tree(object):
             trunk = self.branches_curve.splines.new('BEZIER')
             trunk.radius_interpolation = 'CARDINAL'
             trunk.resolution_u = 2
-            self.make_stem(turtle, Stem(0, trunk))
+            if self.stem_records is None:
+                self.make_stem(turtle, Stem(0, trunk))
+            else:
+                self.make_recorded(self.make_stem, turtle, Stem(0, trunk))
 
         b_time = time() - start_time
         if __logging__:
             print('\nBranches made: %i in %f seconds' % (self.stem_count, b_time))
+            if self.twig_prototypes > 0:
+                print('Twig prototypes: %s' % ', '.join('depth %i: %i' % (depth, len(pool)) for depth, pool in
+                                                        sorted(self.twig_pools.items())))
 
         curve_points = 0
         for spline in self.branches_curve.splines:
@@ -241,8 +696,12 @@ class Tree(object):
 
     def create_leaf_mesh(self):
         """Create leaf mesh for tree"""
+        self.leaf_instances = self.leaf_blossom = self.leaf_buffers = None
         if len(self.leaves_array) <= 0:
             return
+        if self.leaf_instancing and self.exporter is None:
+            self.create_leaf_instances()
+            return
         if __logging__:
             print('Making Leaves')
         start_time = time()
@@ -251,6 +710,9 @@ class Tree(object):
                                          self.param.leaf_scale, self.param.leaf_scale_x)
         base_blossom_shape = Leaf.get_shape(-self.param.blossom_shape, self.tree_scale / self.param.g_scale,
                                             self.param.blossom_scale, 1)
+        if self.exporter is None:
+            self.create_leaf_meshes(base_leaf_shape, base_blossom_shape, start_time)
+            return
         leaf_verts = []
         leaf_faces = []
         leaf_index = 0
@@ -267,17 +729,24 @@ class Tree(object):
             else:
                 self.make_leaf(leaf, base_leaf_shape, leaf_index, leaf_verts, leaf_faces)
                 leaf_index += 1
+            if self.exporter is not None and len(leaf_verts) + len(blossom_verts) >= CHUNK_VERTS:
+                self.export_leaves(leaf_verts, leaf_faces, blossom_verts, blossom_faces)
+
+        if self.exporter is not None:
+            self.export_leaves(leaf_verts, leaf_faces, blossom_verts, blossom_faces)
+            if __logging__:
+                print('\nLeaves exported: %i : %i in %f seconds' % (leaf_index, blossom_index, time() - start_time))
+            return
 
         # set up mesh object
         if leaf_index > 0:
-            leaves = bpy.data.meshes.new('leaves')
-            leaves_obj = bpy.data.objects.new('Leaves', leaves)
-            bpy.context.scene.objects.link(leaves_obj)
-            leaves_obj.parent = self.tree_obj
+            leaves_obj = self.new_object('Leaves', 'MESH')
+            leaves = leaves_obj.data
+            self.leaf_objs.append(leaves_obj)
             leaves.from_pydata(leaf_verts, (), leaf_faces)
             # set up UVs for leaf polygons
             leaf_uv = base_leaf_shape[2]
-            if leaf_uv:
+            if leaf_uv is not None:
                 leaves.uv_textures.new("leavesUV")
                 uv_layer = leaves.uv_layers.active.data
                 for seg_ind in range(int(len(leaf_faces) / len(base_leaf_shape[1]))):
@@ -286,10 +755,9 @@ class Tree(object):
                         # leaves.validate()
 
         if blossom_index > 0:
-            blossom = bpy.data.meshes.new('blossom')
-            blossom_obj = bpy.data.objects.new('Blossom', blossom)
-            bpy.context.scene.objects.link(blossom_obj)
-            blossom_obj.parent = self.tree_obj
+            blossom_obj = self.new_object('Blossom', 'MESH')
+            blossom = blossom_obj.data
+            self.leaf_objs.append(blossom_obj)
             blossom.from_pydata(blossom_verts, (), blossom_faces)
             # blossom.validate()
 
@@ -297,10 +765,71 @@ class Tree(object):
         if __logging__:
             print('\nLeaves made: %i : %i in %f seconds' % (leaf_index, blossom_index, l_time))
 
-            # TODO model complexity stuff? is just linear in no of leaves anyway
-            # vertex count = len(leaf_verts) * leaf_index same for blos
-            # face count = len(leaf_faces) * leaf_index
-            # edge count = len(elements of leaf_faces) * leaf_index
+            # vertex, face and memory counts can be estimated before generating with
+            # ch_trees.complexity.estimate_parametric
+
+    def create_leaf_meshes(self, base_leaf_shape, base_blossom_shape, start_time):
+        """Create leaf and blossom meshes, computing leaf geometry on a worker thread while the meshes
+        are set up"""
+        def progress(leaf_count, blossom_count):
+            if __logging__:
+                sys.stdout.write('\r-> ' + str(leaf_count) + ' leaves made, ' + str(blossom_count) + ' blossom made')
+                sys.stdout.flush()
+
+        blossom = np.array([rand_in_range(0, 1) < self.param.blossom_rate for _ in self.leaves_array], dtype=bool)
+        buffers = make_leaf_meshes(self.leaves_array, base_leaf_shape, base_blossom_shape, self.param.leaf_bend,
+                                   blossom, lambda name: self.new_leaf_object(name).data, progress)
+        if self.stem_records is not None:
+            # keep geometry of each leaf so that of regenerated stems can be spliced in
+            self.leaf_blossom = blossom
+            self.leaf_buffers = buffers
+        if __logging__:
+            print('\nLeaves made: %i : %i in %f seconds' % (buffers[0].count, buffers[1].count, time() - start_time))
+
+    def export_leaves(self, leaf_verts, leaf_faces, blossom_verts, blossom_faces):
+        """pass leaves made so far to the exporter, emptying the lists so they don't grow with the tree"""
+        self.exporter.add_leaves('leaves', leaf_verts, leaf_faces)
+        self.exporter.add_leaves('blossom', blossom_verts, blossom_faces)
+        for arr in [leaf_verts, leaf_faces, blossom_verts, blossom_faces]:
+            del arr[:]
+
+    def create_leaf_instances(self):
+        """Create instanced leaves for tree, storing a transform for each leaf rather than its mesh"""
+        if __logging__:
+            print('Making Leaf Instances')
+        start_time = time()
+        self.leaf_instances = self.get_leaf_instances(self.leaves_array)
+        leaf_index, blossom_index = self.add_instanced_leaves()
+        l_time = time() - start_time
+        if __logging__:
+            print('Leaf instances made: %i : %i in %f seconds' % (leaf_index, blossom_index, l_time))
+
+    def get_leaf_instances(self, leaves):
+        """Array of instance transforms of leaves, choosing which are blossom"""
+        # base shapes are unit size, scale is applied per instance
+        g_scale = self.tree_scale / self.param.g_scale
+        instances = []
+        for leaf in leaves:
+            if rand_in_range(0, 1) < self.param.blossom_rate:
+                instances.append(leaf.get_instance(self.param.leaf_bend, g_scale * self.param.blossom_scale, True))
+            else:
+                instances.append(leaf.get_instance(self.param.leaf_bend, g_scale * self.param.leaf_scale))
+        return np.array(instances, dtype=INSTANCE_DTYPE).reshape(-1)
+
+    def add_instanced_leaves(self):
+        """Make objects instancing leaf and blossom shapes with leaf_instances, returning the number of each"""
+        base_leaf_shape = Leaf.get_shape(self.param.leaf_shape, 1, 1, self.param.leaf_scale_x)
+        base_blossom_shape = Leaf.get_shape(-self.param.blossom_shape, 1, 1, 1)
+        is_blossom = self.leaf_instances['blossom']
+        blossom_index = np.count_nonzero(is_blossom)
+        leaf_index = len(self.leaf_instances) - blossom_index
+        if leaf_index > 0:
+            self.leaf_objs.append(create_instanced_leaves('Leaves', base_leaf_shape, self.leaf_instances[~is_blossom],
+                                                          self.tree_obj))
+        if blossom_index > 0:
+            self.leaf_objs.append(create_instanced_leaves('Blossom', base_blossom_shape,
+                                                          self.leaf_instances[is_blossom], self.tree_obj))
+        return leaf_index, blossom_index
 
     def make_leaf(self, leaf, base_leaf_shape, index, verts_array, faces_array):
         """get vertices and faces for leaf and append to appropriate arrays"""
@@ -343,6 +872,7 @@ class Tree(object):
             turtle.pos = pos_corr_turtle.pos
 
         # apply pruning, not required if is a clone, as this will have been tested already
+        accepted_walk = None
         if self.param.prune_ratio > 0:
             # save start length and random state
             start_length = stem.length
@@ -350,7 +880,9 @@ class Tree(object):
             split_err_state = copy(self.split_num_error)
             # iteratively scale length by 0.9 until it fits, or remove entirely if we get to 80%
             # reduction
-            in_pruning_envelope = self.test_stem(CHTurtle(turtle), stem, start, split_corr_angle, clone_prob)
+            accepted_walk = StemWalk(self, CHTurtle(turtle), stem, start, split_corr_angle, clone_prob,
+                                     num_branches_factor, cloned_turtle)
+            in_pruning_envelope = accepted_walk.dry_run()
             while not in_pruning_envelope:
                 stem.length *= 0.9
                 if stem.length < 0.15 * start_length:
@@ -362,7 +894,9 @@ class Tree(object):
                         return
                 random.setstate(r_state)
                 self.split_num_error = split_err_state
-                in_pruning_envelope = self.test_stem(CHTurtle(turtle), stem, start, split_corr_angle, clone_prob)
+                accepted_walk = StemWalk(self, CHTurtle(turtle), stem, start, split_corr_angle, clone_prob,
+                                         num_branches_factor, cloned_turtle)
+                in_pruning_envelope = accepted_walk.dry_run()
             fitting_length = stem.length
             # apply reduction scaled by prune ratio
             stem.length = start_length * (1 - self.param.prune_ratio) + fitting_length * self.param.prune_ratio
@@ -374,11 +908,6 @@ class Tree(object):
 
         # get parameters
         curve_res = int(self.param.curve_res[depth])
-        seg_splits = self.param.seg_splits[depth]
-        seg_length = stem.length / curve_res
-
-        # calc base segment
-        base_seg_ind = ceil(self.param.base_size[0] * int(self.param.curve_res[0]))
 
         leaf_count = branch_count = 0
         if depth == self.param.levels - 1 and depth > 0 and self.param.leaf_blos_num != 0:
@@ -405,28 +934,16 @@ class Tree(object):
         branch_num_error = 0
         leaf_num_error = 0
 
-        # decide on start rotation for branches/leaves
-        # use array to allow other methods to modify the value (otherwise passed by value)
-        prev_rotation_angle = [0]
-        if self.param.rotate[d_plus_1] >= 0:
-            # start at random rotation
-            prev_rotation_angle[0] = rand_in_range(0, 360)
+        # reuse the dry-run walk from pruning if it is exactly the walk this stem would take, otherwise
+        # walk the stem now
+        if accepted_walk is not None and accepted_walk.can_replay(stem):
+            walk = accepted_walk
+            segments = walk.segments
         else:
-            # on this case prev_rotation_angle used as multiplier to alternate side of branch
-            prev_rotation_angle[0] = 1
-
-        # calc helix parameters if needed
-        hel_p_0 = hel_p_1 = hel_p_2 = hel_axis = None
-        if self.param.curve_v[depth] < 0:
-            tan_ang = tan(radians(90 - abs(self.param.curve_v[depth])))
-            hel_pitch = 2 * stem.length / curve_res * rand_in_range(0.8, 1.2)
-            hel_radius = 3 * hel_pitch / (16 * tan_ang) * rand_in_range(0.8, 1.2)
-            # apply full tropism if not trunk/main branch and horizontal tropism if is
-            if depth > 1:
-                apply_tropism(turtle, self.param.tropism)
-            else:
-                apply_tropism(turtle, Vector([self.param.tropism[0], self.param.tropism[1], 0]))
-            hel_p_0, hel_p_1, hel_p_2, hel_axis = calc_helix_points(turtle, hel_radius, hel_pitch)
+            walk = StemWalk(self, turtle, stem, start, split_corr_angle, clone_prob, num_branches_factor,
+                            cloned_turtle, commit=True)
+            segments = walk.steps()
+        prev_rotation_angle = walk.prev_rotation_angle
 
         # point resolution for this seg, max_points_per_seg if base, 1 otherwise
         if depth == 0 or self.param.taper[depth] > 1:
@@ -434,83 +951,31 @@ class Tree(object):
         else:
             points_per_seg = 2
 
-        for seg_ind in range(start, curve_res + 1):
-            remaining_segs = curve_res + 1 - seg_ind
-            # set up next bezier point
-            if self.param.curve_v[depth] < 0:
-                # negative curve_v so helix branch
-                pos = turtle.pos
-                if seg_ind == 0:
-                    new_point = stem.curve.bezier_points[0]
-                    new_point.co = pos.copy()
-                    new_point.handle_right = hel_p_0 + pos
-                    new_point.handle_left = pos.copy()
-                else:
-                    stem.curve.bezier_points.add()
-                    new_point = stem.curve.bezier_points[-1]
-                    if seg_ind == 1:
-                        new_point.co = hel_p_2 + pos
-                        new_point.handle_left = hel_p_1 + pos
-                        new_point.handle_right = 2 * new_point.co - new_point.handle_left
-                    else:
-                        prev_point = stem.curve.bezier_points[-2]
-                        new_point.co = hel_p_2.rotated(Quaternion(hel_axis, (seg_ind - 1) * pi))
-                        new_point.co += prev_point.co
-                        dif_p = (hel_p_2 - hel_p_1).rotated(Quaternion(hel_axis, (seg_ind - 1) * pi))
-                        new_point.handle_left = new_point.co - dif_p
-                        new_point.handle_right = 2 * new_point.co - new_point.handle_left
-                turtle.pos = new_point.co.copy()
-                turtle.dir = new_point.handle_right.copy().normalized()
+        for segment in segments:
+            seg_ind = segment.seg_ind
+            if segment.random_state is not None:
+                # replaying a recorded walk so put random state and split error back to where the walk
+                # was, children only change the split error of deeper levels
+                random.setstate(segment.random_state)
+                self.split_num_error[depth] = segment.split_error
+            # get/make new point to be modified
+            if seg_ind == start:
+                new_point = stem.curve.bezier_points[0]
             else:
-                # normal curved branch
-                # get/make new point to be modified
-                if seg_ind == start:
-                    new_point = stem.curve.bezier_points[0]
-                else:
-                    turtle.move(seg_length)
-                    stem.curve.bezier_points.add()
-                    new_point = stem.curve.bezier_points[-1]
-
-                # set position and handles of new point
-                # if this is a clone then correct initial direction to match original to make
-                # split smoother
-                new_point.co = turtle.pos.copy()
-                if cloned_turtle and seg_ind == start:
-                    new_point.handle_left = turtle.pos - cloned_turtle.dir * (stem.length / (curve_res * 3))
-                    new_point.handle_right = turtle.pos + cloned_turtle.dir * (stem.length / (curve_res * 3))
-                else:
-                    new_point.handle_left = turtle.pos - turtle.dir * stem.length / (curve_res * 3)
-                    new_point.handle_right = turtle.pos + turtle.dir * stem.length / (curve_res * 3)
-
-            # set radius of new point
-            actual_radius = self.radius_at_offset(stem, seg_ind / curve_res)
-            new_point.radius = actual_radius
+                stem.curve.bezier_points.add()
+                new_point = stem.curve.bezier_points[-1]
+            # set position, handles and radius of new point
+            new_point.co = segment.co
+            new_point.handle_left = segment.handle_left
+            new_point.handle_right = segment.handle_right
+            new_point.radius = self.radius_at_offset(stem, seg_ind / curve_res)
 
             if seg_ind > start:
-                # calc number of splits at this seg (N/A for helix)
-                if self.param.curve_v[depth] >= 0:
-                    num_of_splits = 0
-                    if self.param.base_splits > 0 and depth == 0 and seg_ind == base_seg_ind:
-                        # if base_seg_ind and has base splits then override with base split number
-                        # take random number of splits up to max of base_splits if negative
-                        if self.param.base_splits < 0:
-                            num_of_splits = int(rand_in_range(0, 1) * (abs(self.param.base_splits) + 0.5))
-                        else:
-                            num_of_splits = int(self.param.base_splits)
-                    elif seg_splits > 0 and seg_ind < curve_res and (depth > 0 or seg_ind > base_seg_ind):
-                        # otherwise get number of splits from seg_splits and use floyd-steinberg to
-                        # fix non-integer values only clone with probability clone_prob
-                        if rand_in_range(0, 1) <= clone_prob:
-                            num_of_splits = int(seg_splits + self.split_num_error[depth])
-                            self.split_num_error[depth] -= num_of_splits - seg_splits
-                            # reduce clone/branch propensity
-                            clone_prob /= num_of_splits + 1
-                            num_branches_factor /= num_of_splits + 1
-                            num_branches_factor = max(0.8, num_branches_factor)
-                            # TODO do this better?
-                            # if depth != self.param.levels - 1:
-                            branch_count *= num_branches_factor
-                            f_branches_on_seg = branch_count / curve_res
+                if segment.reduce_branches:
+                    # TODO do this better?
+                    # if depth != self.param.levels - 1:
+                    branch_count *= segment.num_branches_factor
+                    f_branches_on_seg = branch_count / curve_res
 
                 # add branches/leaves for this seg
                 # if below max level of recursion then draw branches, otherwise draw leaves
@@ -528,7 +993,7 @@ class Tree(object):
                         branch_num_error -= branches_on_seg - f_branches_on_seg
                     # add branches
                     if abs(branches_on_seg) > 0:
-                        self.make_branches(turtle, stem, seg_ind, branches_on_seg, prev_rotation_angle)
+                        self.make_branches(segment.turtle, stem, seg_ind, branches_on_seg, prev_rotation_angle)
                 elif abs(leaf_count) > 0 and depth > 0:
                     if leaf_count < 0:
                         # fan leaves
@@ -542,187 +1007,27 @@ class Tree(object):
                         leaf_num_error -= leaves_on_seg - f_leaves_on_seg
                     # add leaves
                     if abs(leaves_on_seg) > 0:
-                        self.make_leaves(turtle, stem, seg_ind, leaves_on_seg, prev_rotation_angle)
+                        self.make_leaves(segment.turtle, stem, seg_ind, leaves_on_seg, prev_rotation_angle)
                 random.setstate(r_state)
 
-                # perform cloning if needed, not allowed for helix (also don't curve/apply tropism as irrelevant)
-                if self.param.curve_v[depth] >= 0:
-                    if num_of_splits > 0:
-                        # calc angles for split
-                        is_base_split = (self.param.base_splits > 0 and depth == 0 and seg_ind == base_seg_ind)
-                        using_direct_split = self.param.split_angle[depth] < 0
-                        if using_direct_split:
-                            spr_angle = abs(self.param.split_angle[depth]) + rand_for_param_var() * \
-                                                                             self.param.split_angle_v[depth]
-                            spl_angle = 0
-                            split_corr_angle = 0
-                        else:
-                            declination = turtle.dir.declination()
-                            spl_angle = self.param.split_angle[depth] + rand_for_param_var() * self.param.split_angle_v[
-                                depth] - declination
-                            spl_angle = max(0, spl_angle)
-                            split_corr_angle = spl_angle / remaining_segs
-                            spr_angle = - (20 + 0.75 * (30 + abs(declination - 90) * rand_in_range(0, 1) ** 2))
-
-                        # make clone branches
-                        r_state = random.getstate()
-                        self.make_clones(turtle, seg_ind, split_corr_angle, num_branches_factor, clone_prob, stem,
-                                         num_of_splits, spl_angle, spr_angle, is_base_split)
-                        random.setstate(r_state)
-
-                        # apply split to base stem
-                        turtle.pitch_down(spl_angle / 2)
-                        # apply spread if splitting to 2 and not base split
-                        if not is_base_split and num_of_splits == 1:
-                            if using_direct_split:
-                                turtle.turn_right(spr_angle / 2)
-                            else:
-                                turtle.dir.rotate(Quaternion(Vector([0, 0, 1]), radians(-spr_angle / 2)))
-                                turtle.dir.normalize()
-                                turtle.right.rotate(Quaternion(Vector([0, 0, 1]), radians(-spr_angle / 2)))
-                                turtle.right.normalize()
-                    else:
-                        # just apply curve and split correction
-                        turtle.turn_left(rand_for_param_var() * self.param.bend_v[depth] / curve_res)
-                        curve_angle = self.calc_curve_angle(depth, seg_ind)
-                        turtle.pitch_down(curve_angle - split_corr_angle)
-
-                    # apply full tropism if not trunk/main branch and horizontal tropism if is
-                    if depth > 1:
-                        apply_tropism(turtle, Vector(self.param.tropism))
-                    else:
-                        apply_tropism(turtle, Vector([self.param.tropism[0], self.param.tropism[1], 0]))
-
                 # increase point resolution at base of trunk and apply flaring effect
                 if points_per_seg > 2:
                     self.increase_bezier_point_res(stem, seg_ind, points_per_seg)
 
+        if walk is accepted_walk:
+            # leave random state, split error and turtle as walking the stem would have
+            random.setstate(walk.end_state[0])
+            self.split_num_error[depth] = walk.end_state[1][depth]
+            turtle.pos, turtle.dir, turtle.right = walk.turtle.pos, walk.turtle.dir, walk.turtle.right
+
         # scale down bezier point handles for flared base of trunk
         if points_per_seg > 2:
             scale_bezier_handles_for_flare(stem, max_points_per_seg)
+        self.point_count += len(stem.curve.bezier_points)
 
     def test_stem(self, turtle, stem, start=0, split_corr_angle=0, clone_prob=1):
         """Test if stem is inside pruning envelope"""
-        # use level 3 parameters for any depth greater than this
-        depth = stem.depth
-        d_plus_1 = depth + 1
-        if d_plus_1 > 3:
-            d_plus_1 = 3
-
-        # get parameters
-        curve_res = int(self.param.curve_res[depth])
-        seg_splits = self.param.seg_splits[depth]
-        seg_length = stem.length / curve_res
-
-        # calc base segment
-        base_seg_ind = ceil(self.param.base_size[0] * int(self.param.curve_res[0]))
-
-        # decide on start rotation for branches/leaves
-        # use array to allow other methods to modify the value (otherwise passed by value)
-        prev_rotation_angle = [0]
-        if self.param.rotate[d_plus_1] >= 0:
-            # start at random rotation
-            prev_rotation_angle[0] = rand_in_range(0, 360)
-        else:
-            # on this case prev_rotation_angle used as multiplier to alternate side of branch
-            prev_rotation_angle[0] = 1
-
-        # calc helix parameters if needed
-        hel_p_2 = hel_axis = previous_helix_point = None
-        if self.param.curve_v[depth] < 0:
-            tan_ang = tan(radians(90 - abs(self.param.curve_v[depth])))
-            hel_pitch = 2 * stem.length / curve_res * rand_in_range(0.8, 1.2)
-            hel_radius = 3 * hel_pitch / (16 * tan_ang) * rand_in_range(0.8, 1.2)
-            # apply full tropism if not trunk/main branch and horizontal tropism if is
-            if depth > 1:
-                apply_tropism(turtle, self.param.tropism)
-            else:
-                apply_tropism(turtle, Vector([self.param.tropism[0], self.param.tropism[1], 0]))
-            _, _, hel_p_2, hel_axis = calc_helix_points(turtle, hel_radius, hel_pitch)
-
-        for seg_ind in range(start, curve_res + 1):
-            remaining_segs = curve_res + 1 - seg_ind
-
-            # set up next bezier point
-            if self.param.curve_v[depth] < 0:
-                # negative curve_v so helix branch
-                pos = turtle.pos.copy()
-                if seg_ind == 0:
-                    turtle.pos = pos
-                else:
-                    if seg_ind == 1:
-                        turtle.pos = hel_p_2 + pos
-                    else:
-                        hel_p_2.rotate(Quaternion(hel_axis, (seg_ind - 1) * pi))
-                        turtle.pos = hel_p_2 + previous_helix_point
-                previous_helix_point = turtle.pos.copy()
-            else:
-                # normal curved branch
-                # move turtle
-                if seg_ind != start:
-                    turtle.move(seg_length)
-                    if not (stem.depth == 0 and start < base_seg_ind) and not self.point_inside(turtle.pos):
-                        return False
-
-            if seg_ind > start:
-                # calc number of splits at this seg (N/A for helix)
-                if self.param.curve_v[depth] >= 0:
-                    num_of_splits = 0
-                    if self.param.base_splits > 0 and depth == 0 and seg_ind == base_seg_ind:
-                        # if base_seg_ind and has base splits then override with base split number
-                        # take random number of splits up to max of base_splits
-                        num_of_splits = int(rand_in_range(0, 1) * (self.param.base_splits + 0.5))
-                    elif seg_splits > 0 and seg_ind < curve_res and (depth > 0 or seg_ind > base_seg_ind):
-                        # otherwise get number of splits from seg_splits and use Floyd-Steinberg to
-                        # fix non-integer values only clone with probability clone_prob
-                        if rand_in_range(0, 1) <= clone_prob:
-                            num_of_splits = int(seg_splits + self.split_num_error[depth])
-                            self.split_num_error[depth] -= num_of_splits - seg_splits
-                            # reduce clone/branch propensity
-                            clone_prob /= num_of_splits + 1
-
-                    # perform cloning if needed, not allowed for helix (also don't curve/apply tropism as irrelevant)
-                    if num_of_splits > 0:
-                        # calc angles for split
-                        is_base_split = (self.param.base_splits > 0 and depth == 0 and seg_ind == base_seg_ind)
-                        using_direct_split = self.param.split_angle[depth] < 0
-                        if using_direct_split:
-                            spr_angle = abs(self.param.split_angle[depth]) + rand_for_param_var() * \
-                                                                             self.param.split_angle_v[depth]
-                            spl_angle = 0
-                            split_corr_angle = 0
-                        else:
-                            declination = turtle.dir.declination()
-                            spl_angle = self.param.split_angle[depth] + rand_for_param_var() * self.param.split_angle_v[
-                                depth] - declination
-                            spl_angle = max(0, spl_angle)
-                            split_corr_angle = spl_angle / remaining_segs
-                            spr_angle = - (20 + 0.75 * (30 + abs(declination - 90) * rand_in_range(0, 1) ** 2))
-
-                        # apply split to base stem
-                        turtle.pitch_down(spl_angle / 2)
-                        # apply spread if splitting to 2 and not base split
-                        if not is_base_split and num_of_splits == 1:
-                            if using_direct_split:
-                                turtle.turn_left(spr_angle / 2)
-                            else:
-                                turtle.dir.rotate(Quaternion(Vector([0, 0, 1]), radians(-spr_angle / 2)))
-                                turtle.dir.normalize()
-                                turtle.right.rotate(Quaternion(Vector([0, 0, 1]), radians(-spr_angle / 2)))
-                                turtle.right.normalize()
-                    else:
-                        # just apply curve and split correction
-                        turtle.turn_left(rand_for_param_var() * self.param.bend_v[depth] / curve_res)
-                        curve_angle = self.calc_curve_angle(depth, seg_ind)
-                        turtle.pitch_down(curve_angle - split_corr_angle)
-
-                    # apply full tropism if not trunk/main branch and horizontal tropism if is
-                    if depth > 1:
-                        apply_tropism(turtle, Vector(self.param.tropism))
-                    else:
-                        apply_tropism(turtle, Vector([self.param.tropism[0], self.param.tropism[1], 0]))
-
-        return self.point_inside(turtle.pos)
+        return StemWalk(self, turtle, stem, start, split_corr_angle, clone_prob).dry_run()
 
     def make_clones(self, turtle, seg_ind, split_corr_angle, num_branches_factor, clone_prob,
                     stem, num_of_splits, spl_angle, spr_angle, is_base_split):
@@ -752,6 +1057,8 @@ class Tree(object):
                 n_turtle.right.rotate(Quaternion(Vector([0, 0, 1]), radians(eff_spr_angle)))
                 turtle.right.normalize()
             # create new clone branch and set up then recurse
+            if not self.keep_stem(stem.depth, clone=True):
+                continue
             split_stem = self.branches_curve.splines.new('BEZIER')
             split_stem.resolution_u = stem.curve.resolution_u
             split_stem.radius_interpolation = 'CARDINAL'
@@ -849,12 +1156,284 @@ class Tree(object):
         # set the position of branch_turtle in this call
         for pos_tur, dir_tur, rad, b_offset in branches_array:
             if is_leaves:
-                self.leaves_array.append(Leaf(pos_tur.pos, dir_tur.dir, dir_tur.right))
-            else:
+                self.add_leaf(Leaf(pos_tur.pos, dir_tur.dir, dir_tur.right))
+            elif self.keep_stem(d_plus_1):
                 new_spline = self.branches_curve.splines.new('BEZIER')
                 new_spline.resolution_u = 6
                 new_spline.radius_interpolation = 'CARDINAL'
-                self.make_stem(dir_tur, Stem(d_plus_1, new_spline, stem, b_offset, rad), pos_corr_turtle=pos_tur)
+                new_stem = Stem(d_plus_1, new_spline, stem, b_offset, rad)
+                if self.twig_prototypes > 0 and d_plus_1 >= self.prototype_depth:
+                    make = self.make_twig
+                else:
+                    make = self.make_stem
+                if self.stem_records is None:
+                    make(dir_tur, new_stem, pos_corr_turtle=pos_tur)
+                else:
+                    self.make_recorded(make, dir_tur, new_stem, pos_tur)
+
+    def make_recorded(self, make, turtle, stem, pos_corr_turtle=None):
+        """Make stem using make (make_stem or make_twig), recording what it starts from and the splines
+        and leaves made for it and its children under the stem being made"""
+        record = StemRecord(make, CHTurtle(turtle), pos_corr_turtle and CHTurtle(pos_corr_turtle), stem.copy(),
+                            self.tree_scale, self.base_length, random.getstate(), copy(self.split_num_error), [], [],
+                            [])
+        if self.stem_record is None:
+            self.stem_records.append(record)
+        else:
+            self.stem_record.children.append(record)
+        self.fill_record(record, turtle, stem, pos_corr_turtle)
+
+    def fill_record(self, record, turtle, stem, pos_corr_turtle):
+        """Make stem into record, stem spline being the last made"""
+        first_spline = len(self.branches_curve.splines) - 1
+        first_leaf = len(self.leaves_array)
+        parent_record = self.stem_record
+        self.stem_record = record
+        record.make(turtle, stem, pos_corr_turtle=pos_corr_turtle)
+        self.stem_record = parent_record
+        record.splines.extend(self.branches_curve.splines[first_spline:])
+        record.leaves.extend(self.leaves_array[first_leaf:])
+
+    def regenerate_stem(self, path, seed):
+        """Regenerate the stem at path, and all its children, with random seed seed leaving the rest of
+        the tree as it was. Path is the index of the trunk followed by the index of the stem among the
+        branches of its parent at each depth, so [0, 3] is the fourth branch of the first trunk. Only
+        available for trees made editable"""
+        if self.stem_records is None:
+            raise Exception('Tree was not made editable')
+        start_time = time()
+        # find record and those of the stems it is a child of, along with the index of the first leaf of
+        # each. Leaves of a stem and its children are made one after another, so come after the leaves
+        # of the stems before it at each depth
+        records = self.stem_records
+        ancestors = []
+        offsets = []
+        offset = 0
+        for ind in path:
+            if not 0 <= ind < len(records):
+                raise Exception('No stem at path %s' % path)
+            offset += sum(len(record.leaves) for record in records[:ind])
+            ancestors.append(records[ind])
+            offsets.append(offset)
+            records = ancestors[-1].children
+        old_record = ancestors.pop()
+        offsets.pop()
+        old_count = len(old_record.leaves)
+
+        # make new stem in place of old one from same start with new seed, its leaves taking the place of
+        # the old ones in leaves_array
+        following = self.leaves_array[offset + old_count:]
+        del self.leaves_array[offset:]
+        r_state = random.getstate()
+        split_err_state = self.split_num_error
+        random.seed(seed)
+        record = self.remake_record(old_record, random.getstate(), old_record.split_error,
+                                    ancestors[-1] if len(ancestors) > 0 else None)
+        self.split_num_error = split_err_state
+        self.leaves_array.extend(following)
+        if len(ancestors) > 0:
+            ancestors[-1].children[path[-1]] = record
+        else:
+            self.stem_records[path[-1]] = record
+        if self.tree_obj is not None:
+            self.splice_leaf_objects(offset, old_count, len(record.leaves))
+        random.setstate(r_state)
+
+        # splice new splines and leaves into the records of the stems it is a child of
+        old_splines = set(id(spline) for spline in old_record.splines)
+        for ancestor, ancestor_offset in zip(ancestors, offsets):
+            ancestor.splines[:] = [spline for spline in ancestor.splines if id(spline) not in old_splines]
+            ancestor.splines.extend(record.splines)
+            start = offset - ancestor_offset
+            ancestor.leaves[start:start + old_count] = record.leaves
+        if __logging__:
+            print('\nStem %s regenerated: %i splines, %i leaves in %f seconds' % (
+                path, len(record.splines), len(record.leaves), time() - start_time))
+
+    def splice_leaf_objects(self, start, old_count, new_count):
+        """Replace the geometry of old_count leaves from index start of leaves_array by that of the
+        new_count leaves now there, keeping the geometry of every other leaf"""
+        new_leaves = self.leaves_array[start:start + new_count]
+        if self.leaf_instances is not None:
+            self.leaf_instances = np.concatenate([self.leaf_instances[:start], self.get_leaf_instances(new_leaves),
+                                                  self.leaf_instances[start + old_count:]])
+            # instancing carriers can't be reused so are removed and made again
+            self.reuse = DatablockReuse(self.tree_obj, self.leaf_objs)
+            self.leaf_objs = []
+            self.add_instanced_leaves()
+            self.finish_reuse()
+            return
+        if self.leaf_buffers is None:
+            # leaves weren't made as meshes on this tree, so make them all
+            self.remake_leaf_objects()
+            return
+        blossom = np.array([rand_in_range(0, 1) < self.param.blossom_rate for _ in new_leaves], dtype=bool)
+        positions, directions, rights = leaf_frames(new_leaves)
+        rotations = leaf_rotations(positions, directions, rights, self.param.leaf_bend)
+        buffers = []
+        for buffer, old_mask, new_mask in zip(self.leaf_buffers, [~self.leaf_blossom, self.leaf_blossom],
+                                              [~blossom, blossom]):
+            n_verts = len(buffer.shape[0])
+            first = np.count_nonzero(old_mask[:start]) * n_verts
+            last = first + np.count_nonzero(old_mask[start:start + old_count]) * n_verts
+            verts = np.concatenate([buffer.verts[:first],
+                                    leaf_vertices(positions[new_mask], rotations[new_mask], buffer.shape),
+                                    buffer.verts[last:]])
+            buffers.append(LeafMeshBuffer(buffer.shape, len(verts) // n_verts))
+            buffers[-1].append(verts)
+        self.leaf_blossom = np.concatenate([self.leaf_blossom[:start], blossom, self.leaf_blossom[start + old_count:]])
+        self.leaf_buffers = buffers
+        # meshes are filled again from the spliced vertices, no leaf needs its geometry made again
+        self.reuse = DatablockReuse(self.tree_obj, self.leaf_objs)
+        self.leaf_objs = []
+        add_leaf_meshes(buffers, lambda name: self.new_leaf_object(name).data)
+        for buffer in buffers:
+            if buffer.mesh is not None:
+                buffer.finish()
+        self.finish_reuse()
+
+    def remake_from_depth(self, param, depth):
+        """Replace stems at depth and deeper, with their leaves, by those made with TreeParam param from
+        the same starts and random states, keeping the stems above as they are. Only valid if param
+        differs from the current parameters in stages from the skeleton at depth on, depth being at
+        least 1, and for trees made editable without twig prototypes"""
+        start_time = time()
+        self.param = param
+        if depth < param.levels:
+            r_state = random.getstate()
+            split_err_state = self.split_num_error
+            # leaves are all on stems that are made again, so are placed again in the same order
+            self.leaves_array = []
+            for record in self.stem_records:
+                self.remake_children(record, depth)
+            self.split_num_error = split_err_state
+            random.setstate(r_state)
+        if self.tree_obj is not None:
+            random.setstate(self.leaf_random_state)
+            self.remake_leaf_objects()
+        if __logging__:
+            print('\nStems from depth %i remade in %f seconds' % (depth, time() - start_time))
+
+    def remake_children(self, record, depth):
+        """Make the stems at depth under record again from their recorded start, updating the splines
+        and leaves of record and of the stems between"""
+        child_splines = set(id(spline) for child in record.children for spline in child.splines)
+        own_splines = [spline for spline in record.splines if id(spline) not in child_splines]
+        for ind, child in enumerate(record.children):
+            if child.stem.depth < depth:
+                self.remake_children(child, depth)
+            else:
+                record.children[ind] = self.remake_record(child, child.random_state, child.split_error, record)
+        # stems above the deepest have no leaves of their own
+        record.splines[:] = own_splines + [spline for child in record.children for spline in child.splines]
+        record.leaves[:] = [leaf for child in record.children for leaf in child.leaves]
+
+    def remake_record(self, old_record, random_state, split_error, parent_record):
+        """Make the stem of old_record again from the same start with random state random_state and split
+        error split_error, in place of its splines, as a child of parent_record (None for a trunk). Returns
+        the new record, its leaves having been added to leaves_array"""
+        resolution_u = old_record.splines[0].resolution_u
+        for spline in old_record.splines:
+            self.branches_curve.splines.remove(spline)
+        tree_scale, base_length = self.tree_scale, self.base_length
+        random.setstate(random_state)
+        self.split_num_error = copy(split_error)
+        self.tree_scale, self.base_length = old_record.tree_scale, old_record.base_length
+        spline = self.branches_curve.splines.new('BEZIER')
+        spline.resolution_u = resolution_u
+        spline.radius_interpolation = 'CARDINAL'
+        stem = old_record.stem.copy()
+        stem.curve = spline
+        record = old_record._replace(random_state=random_state, split_error=copy(split_error), splines=[], leaves=[],
+                                     children=[])
+        self.stem_record = parent_record
+        self.fill_record(record, CHTurtle(old_record.turtle), stem,
+                         old_record.pos_corr_turtle and CHTurtle(old_record.pos_corr_turtle))
+        self.stem_record = None
+        self.tree_scale, self.base_length = tree_scale, base_length
+        return record
+
+    def make_twig(self, turtle, stem, pos_corr_turtle):
+        """Make stem (and its children) as a copy of a prototype from the pool for its depth, until
+        the pool is full stems are generated normally and captured as new prototypes"""
+        pool = self.twig_pools.setdefault(stem.depth, [])
+        if len(pool) < self.twig_prototypes:
+            frame = CHTurtle(turtle)
+            first_spline = len(self.branches_curve.splines) - 1
+            first_leaf = len(self.leaves_array)
+            first_stem = self.stem_count
+            self.make_stem(turtle, stem, pos_corr_turtle=pos_corr_turtle)
+            # only keep stems which weren't culled or pruned away entirely
+            if stem.length > 0 and len(stem.curve.bezier_points) > 1:
+                frame.pos = stem.curve.bezier_points[0].co.copy()
+                pool.append(capture_twig(frame, stem, self.branches_curve.splines[first_spline:],
+                                         self.leaves_array[first_leaf:], self.stem_count - first_stem))
+            return
+
+        # calc length and radius for this stem as make_stem would, prototype is then scaled to match
+        stem.length = self.calc_stem_length(stem)
+        stem.radius = self.calc_stem_radius(stem)
+        if 0 <= stem.radius_limit < 0.0001 or stem.length <= 0:
+            self.stem_count += 1
+            return
+        # choose randomly from the half of the pool closest in length, as child and leaf counts scale
+        # with stem length so copying a much longer or shorter prototype would change the density
+        candidates = sorted(pool, key=lambda proto: abs(proto.length - stem.length))
+        prototype = random.choice(candidates[:ceil(len(candidates) / 2)])
+
+        rotation = np.array(turtle.axes()).T
+        corr_turtle = CHTurtle(pos_corr_turtle)
+        corr_turtle.move(-min(stem.radius, stem.radius_limit))
+        origin = np.array(corr_turtle.pos)
+        points = [proto_spline[1].dot(rotation.T) * stem.length + origin for proto_spline in prototype.splines]
+        # a copy which would pass the budget limits or leave the pruning envelope is generated normally
+        # instead, so its children are cut or pruned one by one as usual
+        if not self.twig_fits(prototype, points):
+            self.make_stem(turtle, stem, pos_corr_turtle=pos_corr_turtle)
+            return
+        turtle.pos = corr_turtle.pos
+
+        for ind, (resolution_u, co, handle_left, handle_right, radius) in enumerate(prototype.splines):
+            if ind == 0:
+                spline = stem.curve
+            else:
+                spline = self.branches_curve.splines.new('BEZIER')
+                spline.resolution_u = resolution_u
+                spline.radius_interpolation = 'CARDINAL'
+            set_spline_points(spline, points[ind],
+                              handle_left.dot(rotation.T) * stem.length + origin,
+                              handle_right.dot(rotation.T) * stem.length + origin,
+                              radius * stem.radius)
+        leaf_pos = prototype.leaf_pos.dot(rotation.T) * stem.length + origin
+        leaf_dir = prototype.leaf_dir.dot(rotation.T)
+        leaf_right = prototype.leaf_right.dot(rotation.T)
+        # thin leaves if the prototype has more than this stem should, using FS error to pick them. The
+        # prototype's leaves were already thinned to keep within budget so aren't thinned again
+        leaf_ratio = 1
+        if len(leaf_pos) > 0 and stem.depth == self.param.levels - 1 and self.param.leaf_blos_num > 0:
+            leaf_ratio = min(1, self.calc_leaf_count(stem) * self.leaf_factor / len(leaf_pos))
+        leaf_num_error = 0
+        for pos, direction, right in zip(leaf_pos, leaf_dir, leaf_right):
+            leaf_num_error += leaf_ratio
+            if leaf_num_error >= 1:
+                leaf_num_error -= 1
+                self.add_leaf(Leaf(Vector(pos), Vector(direction), Vector(right)), thinned=True)
+        self.stem_count += prototype.stem_count
+        self.point_count += sum(len(proto_points) for proto_points in points)
+
+    def twig_fits(self, prototype, points):
+        """Whether a copy of prototype with spline points points keeps within the stem and point limits
+        of the budget and inside the pruning envelope"""
+        budget = self.budget
+        if budget is not None:
+            if budget.max_stems is not None and self.stem_count + prototype.stem_count > budget.max_stems:
+                return False
+            point_count = sum(len(proto_points) for proto_points in points)
+            if budget.max_points is not None and self.point_count + point_count > budget.max_points:
+                return False
+        if self.param.prune_ratio > 0:
+            return all(self.point_inside(Vector(point)) for proto_points in points for point in proto_points)
+        return True
 
     def make_leaves(self, turtle, stem, seg_ind, leaves_on_seg, prev_rotation_angle):
         """Make the required leaves for a segment of the stem"""
@@ -1118,6 +1697,54 @@ class Tree(object):
 
 # ------ RELATED FUNCTIONS ------ #
 
+TwigPrototype = namedtuple('TwigPrototype', ['length', 'splines', 'leaf_pos', 'leaf_dir', 'leaf_right',
+                                             'stem_count'])
+
+
+def get_spline_points(spline):
+    """Read positions, handles and radii of all points on spline into NumPy arrays"""
+    n_points = len(spline.bezier_points)
+    co = np.empty(n_points * 3, dtype=np.float32)
+    handle_left = np.empty(n_points * 3, dtype=np.float32)
+    handle_right = np.empty(n_points * 3, dtype=np.float32)
+    radius = np.empty(n_points, dtype=np.float32)
+    spline.bezier_points.foreach_get('co', co)
+    spline.bezier_points.foreach_get('handle_left', handle_left)
+    spline.bezier_points.foreach_get('handle_right', handle_right)
+    spline.bezier_points.foreach_get('radius', radius)
+    return co.reshape(-1, 3), handle_left.reshape(-1, 3), handle_right.reshape(-1, 3), radius
+
+
+def set_spline_points(spline, co, handle_left, handle_right, radius):
+    """Set positions, handles and radii of spline from NumPy arrays, adding points as required"""
+    if len(co) > len(spline.bezier_points):
+        spline.bezier_points.add(len(co) - len(spline.bezier_points))
+    spline.bezier_points.foreach_set('co', co.astype(np.float32).ravel())
+    spline.bezier_points.foreach_set('handle_left', handle_left.astype(np.float32).ravel())
+    spline.bezier_points.foreach_set('handle_right', handle_right.astype(np.float32).ravel())
+    spline.bezier_points.foreach_set('radius', radius.astype(np.float32))
+
+
+def capture_twig(frame, stem, splines, leaves, stem_count):
+    """Capture splines and leaves of a generated stem as a prototype, in the local frame of the
+    turtle frame with positions normalised by stem length and radii by stem radius"""
+    rotation = np.array(frame.axes()).T
+    origin = np.array(frame.pos)
+    proto_splines = []
+    for spline in splines:
+        co, handle_left, handle_right, radius = get_spline_points(spline)
+        proto_splines.append((spline.resolution_u,
+                              (co - origin).dot(rotation) / stem.length,
+                              (handle_left - origin).dot(rotation) / stem.length,
+                              (handle_right - origin).dot(rotation) / stem.length,
+                              radius / stem.radius))
+    leaf_pos = np.array([leaf.position for leaf in leaves]).reshape(-1, 3)
+    leaf_dir = np.array([leaf.direction for leaf in leaves]).reshape(-1, 3)
+    leaf_right = np.array([leaf.right for leaf in leaves]).reshape(-1, 3)
+    return TwigPrototype(stem.length, proto_splines, (leaf_pos - origin).dot(rotation) / stem.length,
+                         leaf_dir.dot(rotation), leaf_right.dot(rotation), stem_count)
+
+
 def make_branch_pos_turtle(dir_turtle, offset, start_point, end_point, radius_limit):
     """Create and setup the turtle for the position of a new branch, also returning the radius
     of the parent to use as a limit for the child"""
@@ -1167,16 +1794,121 @@ def scale_bezier_handles_for_flare(stem, max_points_per_seg):
         point.handle_right = point.co + (point.handle_right - point.co) / max_points_per_seg
 
 
-def construct(params, seed=0, render=False, out_path=None):
-    """Construct the tree"""
-    if seed == 0:
-        seed = int(random.random() * 9999999)
-        # print('Seed: ', seed)
-    random.seed(seed)
-    Tree(TreeParam(params)).make()
+def changed_stage(old_param, new_param):
+    """Earliest stage of generation affected by the differences between TreeParams old_param and
+    new_param, None if they are the same"""
+    stage = None
+    for name in vars(TreeParam):
+        if name.startswith('_') or callable(getattr(TreeParam, name)):
+            continue
+        old_value, new_value = getattr(old_param, name), getattr(new_param, name)
+        if old_value == new_value:
+            continue
+        if name in LEVEL_PARAMS and len(old_value) == len(new_value):
+            # stems at the depth of the first entry that differs are made again, with all below them
+            index = min(ind for ind, (old, new) in enumerate(zip(old_value, new_value)) if old != new)
+            param_stage = STAGES[max(0, index + LEVEL_PARAMS[name])]
+        else:
+            param_stage = PARAM_STAGES.get(name, STAGES[0])
+        if stage is None or STAGES.index(param_stage) < STAGES.index(stage):
+            stage = param_stage
+    return stage
+
+
+def stage_depth(stage, levels):
+    """Depth of the shallowest stems made again to re-run stage, levels if none are"""
+    if stage == 'leaf meshing':
+        return levels
+    if stage == 'leaf placement':
+        return levels - 1
+    return STAGES.index(stage)
+
+
+def construct(params, seed=0, render=False, out_path=None, leaf_instancing=False, twig_prototypes=0, budget=None,
+              incremental=False, editable=False, profile_memory=False, export_path=None, replace=None, chunks=0,
+              bevel_tolerance=None):
+    """Construct the tree, keeping within Budget budget if given and reporting memory used by each phase
+    if profile_memory. If export_path is given the tree is written to it as .glb or .obj. If incremental and the last
+    incremental construct used the same seed and options its tree is updated in place, re-running only
+    the stages affected by the parameters that changed, otherwise it is replaced. If editable stems of
+    the returned tree can be regenerated with Tree.regenerate_stem. If replace, a tree made by either
+    generator, is given the new tree takes over its objects and datablocks rather than making new
+    ones, as a replaced incremental tree does. If chunks is more than one the branches and leaves are
+    split into that many objects each by region of the tree, see ch_trees.chunks. If bevel_tolerance is
+    given branches are split into curve objects by the bevel resolution their radius needs to keep
+    within it, see ch_trees.radius_classes. Options that can't be combined raise an Exception rather
+    than one of them being ignored: exported trees are flat so can't use leaf_instancing, chunks or
+    bevel_tolerance and aren't kept up to date so can't be incremental, incremental trees need a
+    fixed seed and can't keep to a budget, and trees split into several objects can't be edited"""
+    global cached_tree
+    if chunks < 0:
+        raise Exception('Number of chunks can\'t be negative: %s' % chunks)
+    if render and out_path is None:
+        raise Exception('Rendering needs an out_path to write the image to')
+    if export_path is not None:
+        check_export_options(leaf_instancing, chunks, bevel_tolerance)
+        if incremental:
+            raise Exception('Exported trees can\'t be incremental as later updates wouldn\'t be exported')
+    if incremental and seed == 0:
+        raise Exception('Incremental trees need a fixed non zero seed to be updated rather than made again')
+    if incremental and budget is not None:
+        raise Exception('Incremental trees can\'t keep within a budget')
+    if (chunks > 1 or bevel_tolerance is not None) and (incremental or editable):
+        raise Exception('Trees split into several objects can\'t be incremental or editable')
+    if replace is not None and replace.tree_obj is None:
+        raise Exception('Tree to replace has no objects left, it was already replaced or removed')
+    param = TreeParam(params)
+    key = (seed, leaf_instancing, twig_prototypes, editable)
+    if incremental and cached_tree is not None and cached_tree[0] == key:
+        tree = cached_tree[1]
+        stage = changed_stage(tree.param, param)
+        if __logging__:
+            print('Changes affect stage: %s' % stage)
+        if stage is not None:
+            depth = stage_depth(stage, param.levels)
+            if depth >= param.levels:
+                tree.remake_leaves(param)
+            elif depth > 0 and twig_prototypes == 0:
+                tree.remake_from_depth(param, depth)
+            else:
+                # twig prototypes would be copied from stems made with the old parameters
+                replace = tree
+                stage = STAGES[0]
+    else:
+        stage = STAGES[0]
+        if incremental and cached_tree is not None and cached_tree[1] is not replace:
+            if replace is None:
+                replace = cached_tree[1]
+            else:
+                cached_tree[1].remove()
+
+    if stage == STAGES[0]:
+        if seed == 0:
+            seed = int(random.random() * 9999999)
+            # print('Seed: ', seed)
+        random.seed(seed)
+        memory_profile = MemoryProfile() if profile_memory else None
+        exporter = make_exporter(export_path) if export_path is not None else None
+        reuse = DatablockReuse.from_tree(replace) if replace is not None and replace.tree_obj is not None else None
+        # incremental trees record their stems so those below a change can be made again
+        tree = Tree(param, leaf_instancing, twig_prototypes, budget=budget, editable=editable or incremental,
+                    memory_profile=memory_profile, exporter=exporter, reuse=reuse)
+        tree.make()
+        if exporter is not None:
+            exporter.close()
+            # later edits to the tree aren't exported
+            tree.exporter = None
+        else:
+            if bevel_tolerance is not None:
+                tree.split_by_radius(bevel_tolerance)
+            if chunks > 1:
+                tree.split_chunks(chunks)
+        if incremental:
+            cached_tree = (key, tree)
     if render:
         bpy.data.scenes['Scene'].render.filepath = out_path
         bpy.ops.render.render(write_still=True)
+    return tree
 
 #mod = __import__('ch_trees.parametric.tree_params.quaking_aspen', fromlist=[''])
 #reload(mod)
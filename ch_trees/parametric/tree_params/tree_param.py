@@ -165,3 +165,44 @@ class TreeParam(object):
         res.append(abs(self.leaf_blos_num))
         res.extend(self.tropism)
         return res
+
+    @staticmethod
+    def arr_to_param(arr, params=None):
+        """convert array output by param_to_arr back to dictionary representation, taking parameters
+        not included in the array from dictionary params if given (otherwise defaults). Values which
+        must be whole numbers are rounded"""
+        params = params or {}
+        vals = iter([float(val) for val in arr])
+
+        def take(count):
+            """next count values from array"""
+            return [next(vals) for _ in range(count)]
+
+        def first(name):
+            """first element of list parameter name, which is left out of the array"""
+            return params.get(name, getattr(TreeParam, name))[0]
+
+        res = dict(params)
+        res['g_scale'], res['g_scale_v'] = take(2)
+        res['levels'] = max(1, int(round(next(vals))))
+        res['ratio'], res['ratio_power'], res['flare'] = take(3)
+        res['floor_splits'] = max(0, int(round(next(vals))))
+        res['base_splits'] = int(round(next(vals)))
+        res['base_size'] = take(4)
+        for name in ['down_angle', 'down_angle_v', 'rotate', 'rotate_v', 'branches']:
+            res[name] = [first(name)] + take(3)
+        for name in ['length', 'length_v', 'taper', 'seg_splits', 'split_angle', 'split_angle_v']:
+            res[name] = take(4)
+        res['curve_res'] = [max(0, int(round(val))) for val in take(4)]
+        for name in ['curve', 'curve_back', 'curve_v']:
+            res[name] = take(4)
+        for name in ['bend_v', 'branch_dist']:
+            res[name] = [first(name)] + take(3)
+        res['radius_mod'] = take(4)
+        # sign of leaf_blos_num is left out of the array
+        leaf_blos_num = int(round(next(vals)))
+        if params.get('leaf_blos_num', TreeParam.leaf_blos_num) < 0:
+            leaf_blos_num = -leaf_blos_num
+        res['leaf_blos_num'] = leaf_blos_num
+        res['tropism'] = take(3)
+        return res
@@ -0,0 +1,191 @@
+"""Leaf meshes made in a pipeline, computing geometry on a worker thread alongside Blender calls.
+
+Blender's API can only be used from the main thread, so making leaves used to alternate between
+transforming each leaf and handing Python lists of its vertices and faces to Blender. Here the main
+thread walks the leaves in chunks of CHUNK_LEAVES reading the leaf frames, while a worker thread
+turns each chunk it is given into vertex arrays with NumPy, which releases the interpreter lock for
+the heavy array operations. As every copy of a leaf shape has the same polygons, the meshes are sized
+and given all their polygons and uvs while the worker computes the first chunk. Each finished chunk
+is written into its slice of a pre-sized vertex array as it arrives, and as Blender can only set
+vertex positions all at once they are passed over with one foreach_set at the end. At most DEPTH
+chunks wait for the worker so memory stays bounded."""
+
+import queue
+import threading
+
+import numpy as np
+
+from ch_trees.leaf import leaf_frames, leaf_rotations, leaf_vertices
+
+# leaves handed to the worker at a time
+CHUNK_LEAVES = 4096
+
+# chunks that may wait for the worker
+DEPTH = 4
+
+
+class Pipeline(object):
+    """Compute results of chunks on a worker thread, committing them in order on the calling thread"""
+
+    def __init__(self, compute, commit, depth=DEPTH):
+        """Set up pipeline calling compute(chunk) on the worker and commit(result) on this thread"""
+        self.compute = compute
+        self.commit = commit
+        self.depth = depth
+
+    def work(self, inbox, outbox):
+        """Worker loop computing each chunk from inbox until None is received"""
+        try:
+            for chunk in iter(inbox.get, None):
+                outbox.put((True, self.compute(chunk)))
+        except Exception as err:
+            outbox.put((False, err))
+            # drain so the feeding thread isn't left blocked on a full inbox
+            for _ in iter(inbox.get, None):
+                pass
+        outbox.put(None)
+
+    def run(self, chunks):
+        """Feed chunks to the worker, committing results as they are finished"""
+        inbox = queue.Queue(self.depth)
+        outbox = queue.Queue()
+        worker = threading.Thread(target=self.work, args=(inbox, outbox), daemon=True)
+        worker.start()
+        error = None
+        try:
+            for chunk in chunks:
+                inbox.put(chunk)
+                while error is None and not outbox.empty():
+                    error = self.take(outbox.get())
+        finally:
+            inbox.put(None)
+        for item in iter(outbox.get, None):
+            if error is None:
+                error = self.take(item)
+        worker.join()
+        if error is not None:
+            raise error
+
+    def take(self, item):
+        """Commit result of a chunk, returning the error instead if computing it failed"""
+        ok, value = item
+        if not ok:
+            return value
+        self.commit(value)
+        return None
+
+
+class LeafMeshBuffer(object):
+    """Mesh made of count copies of one leaf shape. Polygons of every copy are the same, offset to its own
+    vertices, so are added as soon as the mesh is begun, while vertex positions are written into a
+    pre-sized array a chunk at a time and passed to Blender once all are in"""
+
+    def __init__(self, shape, count):
+        """Set up buffer for count copies of leaf shape"""
+        self.shape = shape
+        self.count = count
+        self.verts = np.zeros((count * len(shape[0]), 3), dtype=np.float32)
+        self.filled = 0
+        self.mesh = None
+
+    def begin(self, mesh):
+        """Add the vertices and polygons of every leaf to empty mesh datablock"""
+        self.mesh = mesh
+        n_verts = len(self.shape[0])
+        loops = np.concatenate([np.asarray(face, dtype=np.int32) for face in self.shape[1]])
+        totals = np.array([len(face) for face in self.shape[1]], dtype=np.int32)
+        loops = (loops[None, :] + (np.arange(self.count, dtype=np.int32) * n_verts)[:, None]).ravel()
+        add_polygons(mesh, len(self.verts), loops, np.tile(totals, self.count))
+
+    def append(self, verts):
+        """Write vertices of the next leaves"""
+        start = self.filled * len(self.shape[0])
+        self.verts[start:start + len(verts)] = verts
+        self.filled += len(verts) // len(self.shape[0])
+
+    def finish(self):
+        """Pass vertex positions to the mesh, Blender can only set them all at once"""
+        self.mesh.vertices.foreach_set('co', self.verts.ravel())
+        self.mesh.update(calc_edges=True)
+
+
+def add_polygons(mesh, n_verts, loops, totals):
+    """Add n_verts vertices to empty mesh datablock along with polygons given by the vertex index of each
+    loop and the number of loops of each polygon"""
+    loops = np.asarray(loops, dtype=np.int32)
+    totals = np.asarray(totals, dtype=np.int32)
+    starts = (np.cumsum(totals) - totals).astype(np.int32)
+    mesh.vertices.add(n_verts)
+    mesh.loops.add(len(loops))
+    mesh.polygons.add(len(totals))
+    mesh.loops.foreach_set('vertex_index', loops)
+    mesh.polygons.foreach_set('loop_start', starts)
+    mesh.polygons.foreach_set('loop_total', totals)
+
+
+def fill_mesh(mesh, verts, loops, totals):
+    """Fill empty mesh datablock with vertices verts and polygons given by the vertex index of each
+    loop and the number of loops of each polygon, returning the number of polygons"""
+    add_polygons(mesh, len(verts), loops, totals)
+    mesh.vertices.foreach_set('co', np.asarray(verts, dtype=np.float32).ravel())
+    mesh.update(calc_edges=True)
+    return len(totals)
+
+
+def make_leaf_meshes(leaves, base_leaf_shape, base_blossom_shape, bend, blossom, new_mesh, progress=None):
+    """Make leaf and blossom meshes of leaves, those where the bool array blossom is set being blossom,
+    returning their LeafMeshBuffers. new_mesh(name) is called for 'Leaves' and 'Blossom' if there are
+    any, returning an empty mesh datablock to fill, and progress(leaves, blossom) after each chunk is
+    written"""
+    buffers = (LeafMeshBuffer(base_leaf_shape, len(blossom) - np.count_nonzero(blossom)),
+               LeafMeshBuffer(base_blossom_shape, np.count_nonzero(blossom)))
+
+    def chunks():
+        """Frames and blossom choices of each chunk of leaves"""
+        for start in range(0, len(leaves), CHUNK_LEAVES):
+            yield leaf_frames(leaves[start:start + CHUNK_LEAVES]), blossom[start:start + CHUNK_LEAVES]
+            if start == 0:
+                # the worker has the first chunk, so make the meshes while it works
+                add_leaf_meshes(buffers, new_mesh)
+
+    def compute(chunk):
+        """Vertices of the leaves and blossom of chunk"""
+        (positions, directions, rights), chunk_blossom = chunk
+        rotations = leaf_rotations(positions, directions, rights, bend)
+        return [leaf_vertices(positions[mask], rotations[mask], buffer.shape)
+                for buffer, mask in zip(buffers, [~chunk_blossom, chunk_blossom])]
+
+    def commit(verts):
+        """Write vertices of one chunk"""
+        for buffer, chunk_verts in zip(buffers, verts):
+            buffer.append(chunk_verts)
+        if progress is not None:
+            progress(buffers[0].filled, buffers[1].filled)
+
+    Pipeline(compute, commit).run(chunks())
+    for buffer in buffers:
+        if buffer.mesh is not None:
+            buffer.finish()
+    return buffers
+
+
+def add_leaf_meshes(buffers, new_mesh):
+    """Begin a mesh from new_mesh(name) for each of the leaf and blossom LeafMeshBuffers buffers with any
+    leaves, giving that of leaves their uvs"""
+    for buffer, name in zip(buffers, ['Leaves', 'Blossom']):
+        if buffer.count > 0:
+            buffer.begin(new_mesh(name))
+            if name == 'Leaves':
+                set_leaf_uvs(buffer.mesh, buffer, 'leavesUV')
+
+
+def set_leaf_uvs(mesh, buffer, name):
+    """Give mesh made from buffer a uv layer name holding the uvs of its leaf shape, if it has them"""
+    leaf_uv = buffer.shape[2]
+    if leaf_uv is None:
+        return
+    mesh.uv_textures.new(name)
+    uvs = np.zeros((len(mesh.loops), 2))
+    # as when made per leaf, the uvs of each copy follow one another from the first loop
+    uvs[:buffer.count * len(leaf_uv)] = np.tile(np.asarray(leaf_uv, dtype=float), (buffer.count, 1))
+    mesh.uv_layers.active.data.foreach_set('uv', uvs.astype(np.float32).ravel())
@@ -0,0 +1,56 @@
+"""Branch curves split by radius, each class of branch given its own bevel and curve resolution.
+
+The branch curve has one bevel_resolution for every branch, so twigs a pixel or two wide get as many
+vertices around them as the trunk. A ring of 4 + 2 * bevel_resolution vertices is a polygon within
+radius * (1 - cos(pi / sides)) of the round branch, so each spline is given the lowest resolution
+keeping that within a tolerance, in world units, and the splines of each resolution are moved to a
+curve object of their own. Splines also get resolution_u cut to 1 + bevel_resolution // 2, as branches
+thin enough for few sides are too thin for their bends between control points to show. The tolerance
+can be worked out from a camera with screen_tolerance so the error stays under a fraction of a pixel.
+Branches the tolerance allows no less than the full resolution are left unchanged."""
+
+from math import tan
+
+import numpy as np
+
+import bpy
+
+from ch_trees.chunks import split_curve
+from ch_trees.export import spline_arrays
+
+
+def screen_tolerance(distance, angle, resolution, pixels=0.5):
+    """Width in world units of pixels pixels at distance from a camera with field of view angle, in
+    radians, across resolution pixels"""
+    return pixels * 2 * distance * tan(angle / 2) / resolution
+
+
+def bevel_resolutions(radii, tolerance, max_resolution=10):
+    """Lowest bevel_resolution, up to max_resolution, making a ring around each of radii within
+    tolerance of the circle"""
+    resolutions = np.arange(max_resolution + 1)
+    errors = 1 - np.cos(np.pi / (4 + 2 * resolutions))
+    within = np.asarray(radii, dtype=float)[:, None] * errors[None, :] <= tolerance
+    # the full resolution is used where none is within tolerance
+    within[:, -1] = True
+    return np.argmax(within, axis=1)
+
+
+def split_by_radius(tree_obj, tolerance):
+    """Split each branch curve parented to Tree empty tree_obj into a curve object per bevel resolution
+    its splines need for tolerance. Returns the new curve objects"""
+    curves = [obj for obj in bpy.data.objects if obj.parent == tree_obj and obj.type == 'CURVE']
+    objs = []
+    for obj in curves:
+        curve = obj.data
+        radii = np.array([spline_arrays(spline)[3].max() for spline in curve.splines]) * curve.bevel_depth
+        labels = bevel_resolutions(radii, tolerance, curve.bevel_resolution)
+        classes = np.unique(labels)
+        if len(classes) == 1 and classes[0] == curve.bevel_resolution:
+            objs.append(obj)
+            continue
+        settings = dict((label, {'bevel_resolution': int(label)}) for label in classes)
+        max_resolution = dict((label, 1 + int(label) // 2) for label in classes
+                              if label < curve.bevel_resolution)
+        objs.extend(split_curve(obj, labels, settings, max_resolution))
+    return objs
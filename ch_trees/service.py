@@ -0,0 +1,275 @@
+"""Local HTTP service generating trees on demand, for tools that ask for the same trees at once.
+
+POST /generate with a JSON job returns the tree as a file, a compact tree (.cht) by default or .glb
+or .obj if format is given. A job is a dict with
+    kind     'parametric' (default) or 'lsystem'
+    preset   name of the preset in tree_params or sys_defs
+    params   Parametric parameters overriding those of the preset, not allowed for L-Systems
+    seed     random seed, required as trees with random seeds can't be shared
+    lod      level of detail, an index into LOD_BUDGETS, 0 being the full tree
+    format   'cht', 'glb' or 'obj'
+Identical jobs that arrive while one is being generated wait for it rather than generating it
+again, and finished trees are kept in a cache of the most recently used up to max_cache_bytes. Cache
+misses run on a pool of processes using the headless generators. When more than max_pending misses
+are waiting for the pool, new jobs are turned away with 503 so callers back off rather than the
+queue growing without bound. GET /metrics returns request, cache and queue counts as JSON.
+
+Run from the repository root, e.g.
+    python -m ch_trees.service serve --port 8766 --processes 4
+    python -m ch_trees.service get palm --seed 3 --format glb --out palm.glb"""
+
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import signal
+import sys
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from time import time
+
+from ch_trees.farm import run_job
+
+FORMATS = {'cht': 'application/octet-stream', 'glb': 'model/gltf-binary', 'obj': 'text/plain'}
+
+# budget limits for each level of detail
+LOD_BUDGETS = [None,
+               {'max_stems': 2000, 'max_leaves': 20000},
+               {'max_stems': 500, 'max_leaves': 5000},
+               {'max_stems': 100, 'max_leaves': 1000}]
+
+
+def job_key(job):
+    """Normalised job, as text, identifying the tree it makes"""
+    return json.dumps({'kind': job.get('kind', 'parametric'), 'preset': job['preset'],
+                       'params': job.get('params', {}), 'seed': job['seed'], 'lod': job.get('lod', 0),
+                       'format': job.get('format', 'cht')}, sort_keys=True)
+
+
+def generate(key):
+    """Pool entry point making the tree for normalised job key, returning its file and result"""
+    job = json.loads(key)
+    handle, path = tempfile.mkstemp('.' + job['format'])
+    os.close(handle)
+    try:
+        result = run_job({'kind': job['kind'], 'preset': job['preset'], 'params': job['params'],
+                          'seed': job['seed'], 'budget': LOD_BUDGETS[job['lod']], 'output': path})
+        with open(path, 'rb') as out_file:
+            data = out_file.read()
+    finally:
+        os.remove(path)
+    del result['output']
+    return data, result
+
+
+def init_worker():
+    """Silence generation output in pool processes"""
+    sys.stdout = open(os.devnull, 'w')
+
+
+class TreeService(object):
+    """Coalescing, caching front of a process pool generating trees"""
+
+    def __init__(self, processes=None, max_pending=64, max_cache_bytes=256 * 1024 * 1024):
+        """Set up pool of processes (default one per CPU), allowing max_pending jobs to wait for it"""
+        self.processes = processes or os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(self.processes, initializer=init_worker) \
+            if sys.version_info >= (3, 7) else ProcessPoolExecutor(self.processes)
+        self.slots = asyncio.Semaphore(self.processes)
+        self.max_pending = max_pending
+        self.max_cache_bytes = max_cache_bytes
+        self.cache = OrderedDict()
+        self.cache_bytes = 0
+        self.in_flight = {}
+        self.pending = 0
+        self.running = 0
+        self.counts = {'requests': 0, 'hits': 0, 'coalesced': 0, 'misses': 0, 'rejected': 0, 'errors': 0}
+        self.generate_seconds = 0
+
+    async def get(self, job):
+        """File and result for job, with how it was served: hit, coalesced or miss. Returns None if
+        turned away for backpressure"""
+        key = job_key(job)
+        self.counts['requests'] += 1
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.counts['hits'] += 1
+            return self.cache[key] + ('hit',)
+        if key in self.in_flight:
+            self.counts['coalesced'] += 1
+            data, result = await asyncio.shield(self.in_flight[key])
+            return data, result, 'coalesced'
+        if self.pending >= self.max_pending:
+            self.counts['rejected'] += 1
+            return None
+        self.counts['misses'] += 1
+        future = asyncio.ensure_future(self.run(key))
+        self.in_flight[key] = future
+        try:
+            data, result = await asyncio.shield(future)
+        finally:
+            self.in_flight.pop(key, None)
+        return data, result, 'miss'
+
+    async def run(self, key):
+        """Generate tree for key on the pool once a process is free, and cache it"""
+        self.pending += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.pending -= 1
+        self.running += 1
+        start_time = time()
+        try:
+            data, result = await asyncio.get_event_loop().run_in_executor(self.pool, generate, key)
+        except Exception:
+            self.counts['errors'] += 1
+            raise
+        finally:
+            self.running -= 1
+            self.generate_seconds += time() - start_time
+            self.slots.release()
+        self.store(key, data, result)
+        return data, result
+
+    def store(self, key, data, result):
+        """Cache data and result for key, dropping the least recently used trees to make room"""
+        if len(data) > self.max_cache_bytes:
+            return
+        self.cache[key] = (data, result)
+        self.cache_bytes += len(data)
+        while self.cache_bytes > self.max_cache_bytes:
+            _, (old_data, _) = self.cache.popitem(last=False)
+            self.cache_bytes -= len(old_data)
+
+    def metrics(self):
+        """Counts describing the service"""
+        metrics = dict(self.counts)
+        metrics.update({'queue_depth': self.pending, 'running': self.running, 'processes': self.processes,
+                        'in_flight': len(self.in_flight), 'cached': len(self.cache),
+                        'cache_bytes': self.cache_bytes, 'generate_seconds': self.generate_seconds})
+        return metrics
+
+    async def handle(self, reader, writer):
+        """Answer one HTTP request"""
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1').strip()
+                if not line:
+                    break
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get('content-length', 0)))
+            status, content_type, extra, content = await self.respond(request_line, body)
+        except (ValueError, IndexError, KeyError, asyncio.IncompleteReadError) as err:
+            status, content_type, extra, content = 400, 'text/plain', {}, ('Bad request: %s' % err).encode()
+        except Exception as err:
+            status, content_type, extra, content = 500, 'text/plain', {}, str(err).encode()
+        lines = ['HTTP/1.1 %i %s' % (status, http.client.responses.get(status, '')),
+                 'Content-Type: %s' % content_type, 'Content-Length: %i' % len(content), 'Connection: close']
+        lines.extend('%s: %s' % item for item in sorted(extra.items()))
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + content)
+        await writer.drain()
+        writer.close()
+
+    async def respond(self, request_line, body):
+        """Status, content type, extra headers and body answering request"""
+        method, path = request_line[0], request_line[1]
+        if method == 'GET' and path == '/metrics':
+            return 200, 'application/json', {}, json.dumps(self.metrics(), sort_keys=True).encode()
+        if method != 'POST' or path != '/generate':
+            return 404, 'text/plain', {}, b'Not found'
+        job = json.loads(body.decode())
+        if not job.get('seed'):
+            raise ValueError('seed must be given and non zero')
+        if not 0 <= job.get('lod', 0) < len(LOD_BUDGETS):
+            raise ValueError('lod must be between 0 and %i' % (len(LOD_BUDGETS) - 1))
+        if job.get('format', 'cht') not in FORMATS:
+            raise ValueError('format must be one of %s' % ', '.join(sorted(FORMATS)))
+        # L-Systems have no parameters to override, so params would only split the cache
+        if job.get('kind', 'parametric') == 'lsystem' and job.get('params'):
+            raise ValueError('params can only be given for parametric trees')
+        served = await self.get(job)
+        if served is None:
+            return 503, 'text/plain', {'Retry-After': '1'}, b'Too many trees queued'
+        data, result, how = served
+        return 200, FORMATS[job.get('format', 'cht')], {'X-Cache': how, 'X-Result': json.dumps(result)}, data
+
+
+def serve(host, port, service):
+    """Run service on host and port until interrupted"""
+    loop = asyncio.get_event_loop()
+    server = loop.run_until_complete(asyncio.start_server(service.handle, host, port))
+    loop.add_signal_handler(signal.SIGTERM, loop.stop)
+    print('Serving trees on http://%s:%i' % (host, port))
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        loop.run_until_complete(server.wait_closed())
+        service.pool.shutdown()
+
+
+def request(host, port, job=None):
+    """Send job to the service, or ask for its metrics if job is None, returning status, headers
+    and body"""
+    connection = http.client.HTTPConnection(host, port)
+    if job is None:
+        connection.request('GET', '/metrics')
+    else:
+        connection.request('POST', '/generate', json.dumps(job), {'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    body = response.read()
+    connection.close()
+    return response.status, dict(response.getheaders()), body
+
+
+def main(argv):
+    """Run the service or a client from command line arguments argv"""
+    parser = argparse.ArgumentParser(description='Local tree generation service')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8766)
+    commands = parser.add_subparsers(dest='command')
+    serve_parser = commands.add_parser('serve', help='run the service')
+    serve_parser.add_argument('--processes', type=int, default=None)
+    serve_parser.add_argument('--max-pending', type=int, default=64)
+    serve_parser.add_argument('--cache-mb', type=float, default=256)
+    get_parser = commands.add_parser('get', help='request a tree and write it to a file')
+    get_parser.add_argument('preset')
+    get_parser.add_argument('--kind', default='parametric', choices=['parametric', 'lsystem'])
+    get_parser.add_argument('--seed', type=int, default=1)
+    get_parser.add_argument('--params', default='{}', help='JSON parameters overriding the preset')
+    get_parser.add_argument('--lod', type=int, default=0)
+    get_parser.add_argument('--format', default='cht', choices=sorted(FORMATS))
+    get_parser.add_argument('--out', default=None)
+    commands.add_parser('metrics', help='print service metrics')
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        serve(args.host, args.port, TreeService(args.processes, args.max_pending, int(args.cache_mb * 1024 * 1024)))
+    elif args.command == 'get':
+        job = {'kind': args.kind, 'preset': args.preset, 'seed': args.seed, 'params': json.loads(args.params),
+               'lod': args.lod, 'format': args.format}
+        status, headers, body = request(args.host, args.port, job)
+        if status != 200:
+            print('%i: %s' % (status, body.decode()))
+            return 1
+        out = args.out or '%s_%i.%s' % (args.preset, args.seed, args.format)
+        with open(out, 'wb') as out_file:
+            out_file.write(body)
+        print('%s (%s) %s' % (out, headers.get('X-Cache'), headers.get('X-Result')))
+    elif args.command == 'metrics':
+        print(json.dumps(json.loads(request(args.host, args.port)[2].decode()), indent=2, sort_keys=True))
+    else:
+        parser.print_help()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
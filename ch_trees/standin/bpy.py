@@ -0,0 +1,431 @@
+"""Stand-in for the subset of Blender's bpy module used by ch_trees"""
+
+import types
+from collections import OrderedDict
+
+import numpy as np
+from ch_trees.standin.mathutils import Vector, Matrix
+
+
+def _vec_prop(name):
+    """Property storing a Vector that copies on assignment, like bpy float vector props"""
+    attr = '_' + name
+
+    def getter(self):
+        return getattr(self, attr)
+
+    def setter(self, value):
+        getattr(self, attr)[:] = value if not isinstance(value, Vector) else value._v
+
+    return property(getter, setter)
+
+
+class _VecStore(Vector):
+    __slots__ = ()
+
+    def __setitem__(self, ind, value):
+        self._v[ind] = value
+
+
+class ID(object):
+    """Base datablock"""
+    users = 0
+    use_fake_user = False
+
+    def __init__(self, name):
+        self.name = name
+
+
+class Collection(object):
+    """Named collection of datablocks, as bpy.data.objects etc. Items are found by the name they were
+    given when made"""
+
+    def __init__(self, factory=None):
+        self._items = OrderedDict()
+        self._names = {}
+        # next numeric suffix to try for each name, so making many of one name doesn't rescan them
+        self._suffixes = {}
+        self._factory = factory
+
+    def new(self, name, *args, **kwargs):
+        item = self._factory(name, *args, **kwargs)
+        # mimic blender's name deduplication
+        if name in self._names:
+            ind = self._suffixes.get(name, 1)
+            while '%s.%03i' % (name, ind) in self._names:
+                ind += 1
+            self._suffixes[name] = ind + 1
+            item.name = '%s.%03i' % (name, ind)
+        self._items[id(item)] = item
+        self._names[item.name] = item
+        return item
+
+    def remove(self, item, do_unlink=True):
+        del self._items[id(item)]
+        if self._names.get(item.name) is item:
+            del self._names[item.name]
+
+    def get(self, key, default=None):
+        return self._names.get(key, default)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(list(self._items.values()))
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self._names[key]
+        return list(self._items.values())[key]
+
+    def __contains__(self, key):
+        if isinstance(key, str):
+            return key in self._names
+        return id(key) in self._items
+
+
+class BezierSplinePoint(object):
+    """Point on a bezier spline"""
+    co = _vec_prop('co')
+    handle_left = _vec_prop('handle_left')
+    handle_right = _vec_prop('handle_right')
+
+    def __init__(self):
+        self._co = _VecStore([0.0, 0.0, 0.0])
+        self._handle_left = _VecStore([0.0, 0.0, 0.0])
+        self._handle_right = _VecStore([0.0, 0.0, 0.0])
+        self.radius = 1.0
+        self.tilt = 0.0
+        self.handle_left_type = 'FREE'
+        self.handle_right_type = 'FREE'
+
+
+class BezierPoints(object):
+    """bezier_points collection of a spline"""
+
+    def __init__(self):
+        self._points = [BezierSplinePoint()]
+
+    def add(self, count=1):
+        self._points.extend(BezierSplinePoint() for _ in range(count))
+
+    def __len__(self):
+        return len(self._points)
+
+    def __getitem__(self, ind):
+        return self._points[ind]
+
+    def __iter__(self):
+        return iter(self._points)
+
+    def foreach_set(self, attr, seq):
+        seq = np.asarray(seq, dtype=float)
+        if attr in ('co', 'handle_left', 'handle_right'):
+            seq = seq.reshape(-1, 3)
+            for point, val in zip(self._points, seq):
+                getattr(point, '_' + attr)._v[:] = val
+        else:
+            for point, val in zip(self._points, seq.ravel()):
+                setattr(point, attr, float(val))
+
+    def foreach_get(self, attr, seq):
+        if attr in ('co', 'handle_left', 'handle_right'):
+            vals = np.array([getattr(p, '_' + attr)._v for p in self._points]).ravel()
+        else:
+            vals = np.array([getattr(p, attr) for p in self._points], dtype=float)
+        seq[:] = vals
+
+
+class Spline(object):
+    """Bezier spline"""
+
+    def __init__(self, spline_type):
+        self.type = spline_type
+        self.bezier_points = BezierPoints()
+        self.radius_interpolation = 'LINEAR'
+        self.resolution_u = 12
+        self.use_cyclic_u = False
+        self.material_index = 0
+
+
+class Splines(object):
+    """splines collection of a curve"""
+
+    def __init__(self):
+        self._splines = []
+
+    def new(self, spline_type):
+        spline = Spline(spline_type)
+        self._splines.append(spline)
+        return spline
+
+    def remove(self, spline):
+        self._splines.remove(spline)
+
+    def clear(self):
+        del self._splines[:]
+
+    def __len__(self):
+        return len(self._splines)
+
+    def __getitem__(self, ind):
+        return self._splines[ind]
+
+    def __iter__(self):
+        return iter(list(self._splines))
+
+
+class Curve(ID):
+    """Curve datablock"""
+
+    def __init__(self, name, type='CURVE'):
+        ID.__init__(self, name)
+        self.type = type
+        self.splines = Splines()
+        self.dimensions = '2D'
+        self.resolution_u = 12
+        self.fill_mode = 'HALF'
+        self.bevel_depth = 0.0
+        self.bevel_resolution = 0
+        self.use_uv_as_generated = False
+
+
+class _Element(object):
+    """One element of an _ElementArray, reading and writing its attributes in the arrays"""
+    __slots__ = ('_array', '_ind')
+
+    def __init__(self, array, ind):
+        object.__setattr__(self, '_array', array)
+        object.__setattr__(self, '_ind', ind)
+
+    def __getattr__(self, name):
+        try:
+            return self._array._data[name][self._ind]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self._array._data[name][self._ind] = value
+
+
+class _ElementArray(object):
+    """Array of mesh elements with foreach_get/set, as mesh.vertices etc. Like Blender's, each attribute
+    is held for all elements in one array, given as name=(dtype, shape) for each attribute"""
+
+    def __init__(self, **fields):
+        self._len = 0
+        self._data = dict((name, np.zeros((0,) + shape, dtype)) for name, (dtype, shape) in fields.items())
+
+    def add(self, count):
+        capacity = len(next(iter(self._data.values())))
+        if self._len + count > capacity:
+            # grow geometrically so adding elements one at a time stays linear
+            capacity = max(self._len + count, 2 * capacity)
+            for name, arr in self._data.items():
+                grown = np.zeros((capacity,) + arr.shape[1:], arr.dtype)
+                grown[:self._len] = arr[:self._len]
+                self._data[name] = grown
+        self._len += count
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, ind):
+        if isinstance(ind, slice):
+            return [_Element(self, item) for item in range(*ind.indices(self._len))]
+        if ind < 0:
+            ind += self._len
+        if not 0 <= ind < self._len:
+            raise IndexError('element index out of range')
+        return _Element(self, ind)
+
+    def __iter__(self):
+        return (_Element(self, ind) for ind in range(self._len))
+
+    def foreach_set(self, attr, seq):
+        arr = self._data[attr]
+        arr[:self._len] = np.asarray(seq).reshape((self._len,) + arr.shape[1:])
+
+    def foreach_get(self, attr, seq):
+        seq[:] = self._data[attr][:self._len].ravel()
+
+
+class _UVLayer(object):
+    def __init__(self, name, n_loops):
+        self.name = name
+        self.data = _ElementArray(uv=(float, (2,)))
+        self.data.add(n_loops)
+
+
+class _UVLayers(object):
+    def __init__(self, mesh):
+        self._mesh = mesh
+        self._layers = []
+        self.active = None
+
+    def new(self, name='UVMap'):
+        layer = _UVLayer(name, len(self._mesh.loops))
+        self._layers.append(layer)
+        self.active = layer
+        return layer
+
+    def __len__(self):
+        return len(self._layers)
+
+    def __iter__(self):
+        return iter(self._layers)
+
+
+class _UVTextures(object):
+    """Blender 2.7x uv_textures, creating a uv texture also creates its uv layer"""
+
+    def __init__(self, mesh):
+        self._mesh = mesh
+
+    def new(self, name='UVMap'):
+        return self._mesh.uv_layers.new(name)
+
+
+class Mesh(ID):
+    """Mesh datablock"""
+
+    def __init__(self, name):
+        ID.__init__(self, name)
+        self.vertices = _ElementArray(co=(float, (3,)), normal=(float, (3,)))
+        self.edges = _ElementArray(vertices=(int, (2,)))
+        self.loops = _ElementArray(vertex_index=(int, ()))
+        self.polygons = _ElementArray(loop_start=(int, ()), loop_total=(int, ()), vertices=(object, ()))
+        self.uv_layers = _UVLayers(self)
+        self.uv_textures = _UVTextures(self)
+
+    def from_pydata(self, vertices, edges, faces):
+        verts = np.asarray(vertices, dtype=float).reshape(-1, 3)
+        first_vert = len(self.vertices)
+        self.vertices.add(len(verts))
+        self.vertices._data['co'][first_vert:len(self.vertices)] = verts
+        faces = [tuple(int(ind) for ind in face) for face in faces]
+        totals = np.array([len(face) for face in faces], dtype=int)
+        first_loop, first_poly = len(self.loops), len(self.polygons)
+        self.loops.add(int(totals.sum()))
+        self.polygons.add(len(faces))
+        if len(faces) > 0:
+            self.loops._data['vertex_index'][first_loop:len(self.loops)] = np.concatenate(faces)
+        polygons = self.polygons._data
+        polygons['loop_start'][first_poly:len(self.polygons)] = first_loop + np.cumsum(totals) - totals
+        polygons['loop_total'][first_poly:len(self.polygons)] = totals
+        for ind, face in enumerate(faces):
+            polygons['vertices'][first_poly + ind] = face
+        edges = np.asarray(edges, dtype=int).reshape(-1, 2)
+        first_edge = len(self.edges)
+        self.edges.add(len(edges))
+        self.edges._data['vertices'][first_edge:len(self.edges)] = edges
+
+    def update(self, calc_edges=False):
+        pass
+
+    def validate(self, verbose=False):
+        return False
+
+    def clear_geometry(self):
+        self.__init__(self.name)
+
+
+class Object(ID):
+    """Object datablock"""
+
+    def __init__(self, name, data):
+        ID.__init__(self, name)
+        self.data = data
+        self.parent = None
+        self.location = Vector([0.0, 0.0, 0.0])
+        self.rotation_mode = 'XYZ'
+        self.rotation_quaternion = None
+        self.scale = Vector([1.0, 1.0, 1.0])
+        self.matrix_world = Matrix()
+        self.matrix_parent_inverse = Matrix()
+        self.dupli_type = 'NONE'
+        self.dupli_group = None
+        self.use_dupli_faces_scale = False
+        self.dupli_faces_scale = 1.0
+        self.hide = False
+        self.hide_render = False
+        self.children = []
+        if data is None:
+            self.type = 'EMPTY'
+        elif isinstance(data, Curve):
+            self.type = 'CURVE'
+        elif isinstance(data, Mesh):
+            self.type = 'MESH'
+        else:
+            self.type = 'EMPTY'
+
+
+class _SceneObjects(object):
+    def __init__(self):
+        self._objects = []
+        self.active = None
+
+    def link(self, obj):
+        self._objects.append(obj)
+
+    def unlink(self, obj):
+        self._objects.remove(obj)
+
+    def __iter__(self):
+        return iter(list(self._objects))
+
+    def __len__(self):
+        return len(self._objects)
+
+    def __contains__(self, key):
+        return any(o.name == key or o is key for o in self._objects)
+
+
+class Scene(ID):
+    def __init__(self, name):
+        ID.__init__(self, name)
+        self.objects = _SceneObjects()
+        self.render = types.SimpleNamespace(filepath='')
+
+
+class _GroupObjects(object):
+    def __init__(self):
+        self._objects = []
+
+    def link(self, obj):
+        self._objects.append(obj)
+
+    def unlink(self, obj):
+        self._objects.remove(obj)
+
+    def __iter__(self):
+        return iter(list(self._objects))
+
+    def __len__(self):
+        return len(self._objects)
+
+
+class Group(ID):
+    """Group datablock (Blender 2.7x), instanced by objects with dupli_type 'GROUP'"""
+
+    def __init__(self, name):
+        ID.__init__(self, name)
+        self.objects = _GroupObjects()
+        self.dupli_offset = Vector([0.0, 0.0, 0.0])
+
+
+class _BlendData(object):
+    def __init__(self):
+        self.groups = Collection(Group)
+        self.objects = Collection(Object)
+        self.curves = Collection(Curve)
+        self.meshes = Collection(Mesh)
+        self.scenes = Collection(Scene)
+        self.scenes.new('Scene')
+
+
+data = _BlendData()
+context = types.SimpleNamespace(scene=data.scenes['Scene'])
+ops = types.SimpleNamespace(render=types.SimpleNamespace(render=lambda **kwargs: {'FINISHED'}))
+app = types.SimpleNamespace(version=(2, 78, 0), background=True)
@@ -0,0 +1,21 @@
+"""Fall back to NumPy stand-ins for Blender's bpy and mathutils modules when not running inside
+Blender, so generation can be benchmarked, profiled and tested under plain CPython. The stand-ins only
+cover what ch_trees uses, objects made with them are kept in memory and never displayed"""
+
+import sys
+
+# whether the stand-ins are in use
+active = False
+
+
+def install_fallback():
+    """Make the stand-ins importable as bpy and mathutils if Blender's modules can't be imported. Both
+    are replaced together as the stand-in bpy works with stand-in mathutils types"""
+    global active
+    try:
+        import bpy  # noqa: F401
+    except ImportError:
+        from ch_trees.standin import bpy, mathutils
+        sys.modules['mathutils'] = mathutils
+        sys.modules['bpy'] = bpy
+        active = True
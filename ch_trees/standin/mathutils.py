@@ -0,0 +1,363 @@
+"""NumPy backed stand-in for the subset of Blender's mathutils module used by ch_trees"""
+
+import math
+
+import numpy as np
+
+_AXES = {'X': 0, 'Y': 1, 'Z': 2, '-X': 3, '-Y': 4, '-Z': 5}
+
+
+class Vector(object):
+    """3D vector with the mathutils.Vector interface used by the generators"""
+    __slots__ = ('_v',)
+
+    def __init__(self, seq=(0.0, 0.0, 0.0)):
+        self._v = np.array(seq, dtype=float)
+
+    @classmethod
+    def _wrap(cls, arr):
+        vec = cls.__new__(cls)
+        vec._v = arr
+        return vec
+
+    # component access
+    def _get(ind):
+        def getter(self):
+            return float(self._v[ind])
+
+        def setter(self, value):
+            self._v[ind] = value
+        return property(getter, setter)
+
+    x = _get(0)
+    y = _get(1)
+    z = _get(2)
+    del _get
+
+    def __len__(self):
+        return len(self._v)
+
+    def __getitem__(self, ind):
+        return float(self._v[ind])
+
+    def __setitem__(self, ind, value):
+        self._v[ind] = value
+
+    def __iter__(self):
+        return iter(self._v.tolist())
+
+    def __array__(self, dtype=None, copy=None):
+        return np.array(self._v, dtype=dtype)
+
+    def __repr__(self):
+        return '<Vector (%s)>' % ', '.join('%.4f' % c for c in self._v)
+
+    def __eq__(self, other):
+        try:
+            return np.array_equal(self._v, np.asarray(other, dtype=float))
+        except (TypeError, ValueError):
+            return False
+
+    __hash__ = None
+
+    # arithmetic
+    def _coerce(self, other):
+        if isinstance(other, Vector):
+            return other._v
+        return np.asarray(other, dtype=float)
+
+    def __add__(self, other):
+        return type(self)._wrap(self._v + self._coerce(other))
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        return type(self)._wrap(self._v - self._coerce(other))
+
+    def __rsub__(self, other):
+        return type(self)._wrap(self._coerce(other) - self._v)
+
+    def __mul__(self, other):
+        if isinstance(other, Vector):
+            return float(np.dot(self._v, other._v))
+        return type(self)._wrap(self._v * float(other))
+
+    def __rmul__(self, other):
+        return type(self)._wrap(self._v * float(other))
+
+    def __truediv__(self, other):
+        return type(self)._wrap(self._v / float(other))
+
+    def __neg__(self):
+        return type(self)._wrap(-self._v)
+
+    def __iadd__(self, other):
+        self._v += self._coerce(other)
+        return self
+
+    def __isub__(self, other):
+        self._v -= self._coerce(other)
+        return self
+
+    def __imul__(self, other):
+        self._v *= float(other)
+        return self
+
+    def __itruediv__(self, other):
+        self._v /= float(other)
+        return self
+
+    # vector methods
+    @property
+    def magnitude(self):
+        return float(math.sqrt(np.dot(self._v, self._v)))
+
+    length = magnitude
+
+    @property
+    def length_squared(self):
+        return float(np.dot(self._v, self._v))
+
+    def copy(self):
+        return type(self)._wrap(self._v.copy())
+
+    def to_tuple(self, precision=-1):
+        if precision < 0:
+            return tuple(self._v.tolist())
+        return tuple(round(c, precision) for c in self._v.tolist())
+
+    def normalize(self):
+        mag = self.magnitude
+        if mag > 0:
+            self._v /= mag
+
+    def normalized(self):
+        vec = self.copy()
+        vec.normalize()
+        return vec
+
+    def dot(self, other):
+        return float(np.dot(self._v, self._coerce(other)))
+
+    def cross(self, other):
+        return type(self)._wrap(np.cross(self._v, self._coerce(other)))
+
+    def angle(self, other, fallback=None):
+        other = self._coerce(other)
+        mag = self.magnitude * float(np.linalg.norm(other))
+        if mag == 0:
+            if fallback is not None:
+                return fallback
+            raise ValueError('Vector.angle(other): zero length vectors have no valid angle')
+        return math.acos(max(-1.0, min(1.0, float(np.dot(self._v, other)) / mag)))
+
+    def rotate(self, rotation):
+        self._v = rotation.to_matrix()._m.dot(self._v)
+
+    def rotated(self, rotation):
+        vec = self.copy()
+        vec.rotate(rotation)
+        return vec
+
+    def to_track_quat(self, track='Z', up='Y'):
+        """Port of Blender's vec_to_quat, returns quaternion aligning track axis with this vector"""
+        axis = _AXES[track]
+        upflag = _AXES[up]
+        vec = -self._v
+        length = float(np.linalg.norm(vec))
+        if length == 0:
+            return Quaternion()
+        tvec = vec / length
+        if axis > 2:
+            axis -= 3
+        else:
+            tvec = -tvec
+        eps = 1e-4
+        if axis == 0:
+            nor = np.array([0.0, -tvec[2], tvec[1]])
+            if abs(tvec[1]) + abs(tvec[2]) < eps:
+                nor[1] = 1.0
+        elif axis == 1:
+            nor = np.array([tvec[2], 0.0, -tvec[0]])
+            if abs(tvec[0]) + abs(tvec[2]) < eps:
+                nor[2] = 1.0
+        else:
+            nor = np.array([-tvec[1], tvec[0], 0.0])
+            if abs(tvec[0]) + abs(tvec[1]) < eps:
+                nor[0] = 1.0
+        co = tvec[axis]
+        nor /= np.linalg.norm(nor)
+        quat = Quaternion(nor, math.acos(max(-1.0, min(1.0, co))))
+        if axis != upflag:
+            fp = quat.to_matrix()._m[:, 2]
+            if axis == 0:
+                angle = 0.5 * math.atan2(fp[2], fp[1]) if upflag == 1 else -0.5 * math.atan2(fp[1], fp[2])
+            elif axis == 1:
+                angle = -0.5 * math.atan2(fp[2], fp[0]) if upflag == 0 else 0.5 * math.atan2(fp[0], fp[2])
+            else:
+                angle = 0.5 * math.atan2(-fp[1], -fp[0]) if upflag == 0 else -0.5 * math.atan2(-fp[0], -fp[1])
+            q_2 = Quaternion([math.cos(angle)] + list(tvec * math.sin(angle)))
+            quat = q_2 * quat
+        return quat
+
+
+class Quaternion(object):
+    """Rotation quaternion stored as (w, x, y, z)"""
+    __slots__ = ('_q',)
+
+    def __init__(self, seq=(1.0, 0.0, 0.0, 0.0), angle=None):
+        if angle is None:
+            self._q = np.array(seq, dtype=float)
+        else:
+            axis = np.asarray(seq, dtype=float)
+            mag = float(np.linalg.norm(axis))
+            if mag > 0:
+                axis = axis / mag
+            half = float(angle) / 2
+            self._q = np.concatenate(([math.cos(half)], axis * math.sin(half)))
+
+    w = property(lambda self: float(self._q[0]))
+    x = property(lambda self: float(self._q[1]))
+    y = property(lambda self: float(self._q[2]))
+    z = property(lambda self: float(self._q[3]))
+
+    def __iter__(self):
+        return iter(self._q.tolist())
+
+    def __len__(self):
+        return 4
+
+    def __getitem__(self, ind):
+        return float(self._q[ind])
+
+    def __array__(self, dtype=None, copy=None):
+        return np.array(self._q, dtype=dtype)
+
+    def __repr__(self):
+        return '<Quaternion (w=%.4f, x=%.4f, y=%.4f, z=%.4f)>' % tuple(self._q)
+
+    def copy(self):
+        return Quaternion(self._q.copy())
+
+    def normalized(self):
+        return Quaternion(self._q / np.linalg.norm(self._q))
+
+    def inverted(self):
+        return Quaternion(np.concatenate(([self._q[0]], -self._q[1:])) / np.dot(self._q, self._q))
+
+    def __mul__(self, other):
+        if isinstance(other, Quaternion):
+            w_1, x_1, y_1, z_1 = self._q
+            w_2, x_2, y_2, z_2 = other._q
+            return Quaternion([w_1 * w_2 - x_1 * x_2 - y_1 * y_2 - z_1 * z_2,
+                               w_1 * x_2 + x_1 * w_2 + y_1 * z_2 - z_1 * y_2,
+                               w_1 * y_2 - x_1 * z_2 + y_1 * w_2 + z_1 * x_2,
+                               w_1 * z_2 + x_1 * y_2 - y_1 * x_2 + z_1 * w_2])
+        if isinstance(other, Vector):
+            vec = other.copy()
+            vec.rotate(self)
+            return vec
+        return Quaternion(self._q * float(other))
+
+    __matmul__ = __mul__
+
+    def to_matrix(self):
+        w, x, y, z = self._q / np.linalg.norm(self._q)
+        return Matrix([[1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y)],
+                       [2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x)],
+                       [2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y)]])
+
+
+class Matrix(object):
+    """Square matrix, used for rotations and object transforms"""
+    __slots__ = ('_m',)
+
+    def __init__(self, rows=None):
+        if rows is None:
+            self._m = np.identity(4)
+        else:
+            self._m = np.array(rows, dtype=float)
+
+    @classmethod
+    def Identity(cls, size):
+        return cls(np.identity(size))
+
+    @classmethod
+    def Translation(cls, vec):
+        mat = np.identity(4)
+        mat[:3, 3] = np.asarray(vec, dtype=float)[:3]
+        return cls(mat)
+
+    @classmethod
+    def Scale(cls, factor, size, axis=None):
+        mat = np.identity(size)
+        mat[:3, :3] *= factor
+        if size == 4:
+            mat[3, 3] = 1
+        return cls(mat)
+
+    def __len__(self):
+        return len(self._m)
+
+    def __getitem__(self, ind):
+        return Vector._wrap(self._m[ind])
+
+    def __iter__(self):
+        return (Vector._wrap(row) for row in self._m)
+
+    def __array__(self, dtype=None, copy=None):
+        return np.array(self._m, dtype=dtype)
+
+    def __repr__(self):
+        return 'Matrix(%s)' % self._m.tolist()
+
+    def copy(self):
+        return Matrix(self._m.copy())
+
+    def to_3x3(self):
+        return Matrix(self._m[:3, :3].copy())
+
+    def to_4x4(self):
+        mat = np.identity(4)
+        size = len(self._m)
+        mat[:size, :size] = self._m
+        return Matrix(mat)
+
+    def inverted(self):
+        return Matrix(np.linalg.inv(self._m))
+
+    def transposed(self):
+        return Matrix(self._m.T.copy())
+
+    def to_quaternion(self):
+        mat = self._m[:3, :3]
+        trace = mat[0, 0] + mat[1, 1] + mat[2, 2]
+        if trace > 0:
+            s = 0.5 / math.sqrt(trace + 1.0)
+            quat = [0.25 / s, (mat[2, 1] - mat[1, 2]) * s, (mat[0, 2] - mat[2, 0]) * s,
+                    (mat[1, 0] - mat[0, 1]) * s]
+        elif mat[0, 0] > mat[1, 1] and mat[0, 0] > mat[2, 2]:
+            s = 2.0 * math.sqrt(1.0 + mat[0, 0] - mat[1, 1] - mat[2, 2])
+            quat = [(mat[2, 1] - mat[1, 2]) / s, 0.25 * s, (mat[0, 1] + mat[1, 0]) / s,
+                    (mat[0, 2] + mat[2, 0]) / s]
+        elif mat[1, 1] > mat[2, 2]:
+            s = 2.0 * math.sqrt(1.0 + mat[1, 1] - mat[0, 0] - mat[2, 2])
+            quat = [(mat[0, 2] - mat[2, 0]) / s, (mat[0, 1] + mat[1, 0]) / s, 0.25 * s,
+                    (mat[1, 2] + mat[2, 1]) / s]
+        else:
+            s = 2.0 * math.sqrt(1.0 + mat[2, 2] - mat[0, 0] - mat[1, 1])
+            quat = [(mat[1, 0] - mat[0, 1]) / s, (mat[0, 2] + mat[2, 0]) / s,
+                    (mat[1, 2] + mat[2, 1]) / s, 0.25 * s]
+        return Quaternion(quat)
+
+    def __mul__(self, other):
+        if isinstance(other, Matrix):
+            return Matrix(self._m.dot(other._m))
+        if isinstance(other, Vector):
+            vec = other._v
+            if len(self._m) == 4 and len(vec) == 3:
+                return type(other)._wrap(self._m[:3, :3].dot(vec) + self._m[:3, 3])
+            return type(other)._wrap(self._m.dot(vec))
+        return Matrix(self._m * float(other))
+
+    __matmul__ = __mul__
@@ -0,0 +1,10 @@
+"""Tests run under plain Python, with the bpy and mathutils stand-ins in place of Blender's"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ch_trees.standin.fallback import install_fallback  # noqa: E402
+
+install_fallback()
@@ -0,0 +1,41 @@
+"""Preset benchmark bookkeeping, which runs without generating any trees"""
+
+import pytest
+
+from benchmarks.presets import MIN_COMPARE_SECONDS, compare, find_presets, summarise
+
+
+def test_find_presets():
+    cases = find_presets()
+    assert 'parametric/quaking_aspen' in cases and 'lsystem/acer' in cases
+    # modules without params aren't presets
+    assert 'parametric/tree_param' not in cases
+    assert all(case.split('/')[0] in ('parametric', 'lsystem') for case in cases)
+
+
+def run(seconds, stems, peak=100.0, phases=None):
+    return {'seconds': seconds, 'phases': phases or {'skeleton': seconds}, 'stems': stems, 'leaves': 2 * stems,
+            'symbols': 0, 'peak_rss_mb': peak}
+
+
+def test_summarise():
+    summary = summarise([run(1.0, 10), run(3.0, 30, 120.0), run(2.0, 20)])
+    assert summary['seconds'] == 2.0
+    assert summary['phases'] == {'skeleton': 2.0}
+    assert summary['stems_per_s'] == pytest.approx(10)
+    assert summary['leaves_per_s'] == pytest.approx(20)
+    assert summary['peak_rss_mb'] == 120.0
+
+
+def test_compare():
+    base = summarise([run(1.0, 10, phases={'skeleton': 1.0, 'leaves': MIN_COMPARE_SECONDS / 2})])
+    baseline = {'parametric/palm': base, 'parametric/acer': base, 'lsystem/acer': {'error': 'failed'}}
+    results = {'parametric/palm': summarise([run(1.05, 10, phases={'skeleton': 1.05, 'leaves': 0.5})]),
+               'parametric/acer': summarise([run(1.5, 10, 150.0)]),
+               'lsystem/acer': summarise([run(9.0, 10)]),
+               'lsystem/palm': summarise([run(9.0, 10)])}
+    regressions = compare(results, baseline, 0.1)
+    # within threshold, phases too short to time reliably, failed baselines and new cases aren't regressions
+    assert len(regressions) == 3
+    assert all(regression.startswith('parametric/acer ') for regression in regressions)
+    assert any('peak_rss_mb' in regression for regression in regressions)
@@ -0,0 +1,82 @@
+"""Size budgets and graceful thinning"""
+
+import random
+
+from ch_trees.budget import MIN_LEVEL_KEEP, Budget, kept_cost, level_factors
+from ch_trees.lsystems import treegen
+from ch_trees.parametric import gen
+from ch_trees.parametric.tree_params import quaking_aspen
+
+
+def test_level_factors_within_limit():
+    assert level_factors([1, 10, 100], None) == [1, 1, 1]
+    assert level_factors([1, 10, 100], 200) == [1, 1, 1]
+    for limit in [500, 100, 20, 2]:
+        factors = level_factors([1, 10, 100, 1000], limit)
+        assert factors[0] == 1
+        assert abs(kept_cost([1, 10, 100, 1000], factors) - limit) < 1e-3 * limit
+        # no level is ever removed entirely
+        assert min(factors) > 0
+
+
+def test_level_factors_thin_deepest_first():
+    factors = level_factors([1, 10, 100, 1000], 300)
+    assert factors[:2] == [1, 1]
+    assert factors[3] == MIN_LEVEL_KEEP
+    assert MIN_LEVEL_KEEP < factors[2] < 1
+
+
+def test_level_factors_top_level_over_limit():
+    # only the top level is over, everything below is kept at its minimum rather than removed
+    assert level_factors([100, 10], 50) == [1, MIN_LEVEL_KEEP]
+
+
+def test_lsystem_budget_keeps_leaves():
+    random.seed(1)
+    budget = Budget(max_stems=300)
+    tree = treegen.construct('ch_trees.lsystems.sys_defs.acer', budget=budget)
+    assert tree.stem_count <= 300
+    assert tree.leaf_count > 0
+    assert min(tree.branch_factors) > 0
+    tree.remove()
+
+
+def test_parametric_budget_limits():
+    budget = Budget(max_stems=200, max_leaves=1000)
+    tree = gen.construct(quaking_aspen.params, 3, budget=budget)
+    assert tree.stem_count <= 200
+    assert 0 < len(tree.leaves_array) <= 1000
+    assert len(budget.notes) > 0
+    tree.remove()
+
+
+def test_deadline_stops_growth():
+    budget = Budget(deadline=0)
+    tree = gen.construct(quaking_aspen.params, 3, budget=budget)
+    # only the trunk is started before the deadline is checked
+    assert tree.stem_count <= 1
+    assert budget.cuts.get('stems skipped at deadline', 0) > 0
+    tree.remove()
+
+
+def outside_envelope(tree):
+    """Number of branch points of tree outside its pruning envelope"""
+    return sum(not tree.point_inside(point.co) for spline in tree.branches_curve.splines
+               for point in spline.bezier_points)
+
+
+def test_twig_prototypes_keep_budget_and_envelope():
+    for max_stems in [40, 200]:
+        budget = Budget(max_stems=max_stems, max_leaves=1000)
+        tree = gen.construct(quaking_aspen.params, 3, twig_prototypes=3, budget=budget)
+        assert tree.stem_count <= max_stems
+        assert 0 < len(tree.leaves_array) <= 1000
+        tree.remove()
+    # copies leaving the envelope are pruned like any other stem
+    params = dict(quaking_aspen.params, prune_ratio=1, prune_width=0.3, branches=[1, 30, 10, 4], leaf_blos_num=6)
+    tree = gen.construct(params, 4)
+    outside = outside_envelope(tree)
+    tree.remove()
+    tree = gen.construct(params, 4, twig_prototypes=3)
+    assert outside_envelope(tree) <= outside
+    tree.remove()
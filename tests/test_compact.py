@@ -0,0 +1,76 @@
+"""Saving trees to the compact format and reading them back"""
+
+import numpy as np
+import pytest
+
+import bpy
+from ch_trees.compact import QUANT_MAX, CompactTree, oct_decode, oct_encode, save_tree, write_compact
+from ch_trees.export import spline_arrays
+from ch_trees.parametric import gen
+from ch_trees.parametric.tree_params import quaking_aspen
+
+
+def test_oct_encoding_round_trip():
+    rng = np.random.RandomState(1)
+    vectors = rng.normal(size=(1000, 3))
+    vectors /= np.linalg.norm(vectors, axis=1)[:, None]
+    # include the axes and the edges of the octahedron where the lower half is folded over
+    vectors = np.concatenate((vectors, np.eye(3), -np.eye(3), [[0.6, 0.8, 0], [-0.6, 0, -0.8]]))
+    decoded = oct_decode(oct_encode(vectors))
+    assert np.allclose(np.linalg.norm(decoded, axis=1), 1)
+    assert np.degrees(np.arccos(np.clip((decoded * vectors).sum(axis=1), -1, 1))).max() < 0.01
+
+
+def test_tree_round_trip(tmpdir):
+    tree = gen.construct(dict(quaking_aspen.params, branches=[1, 12, 8, 4], leaf_blos_num=6), seed=5)
+    path = str(tmpdir.join('tree.chtree'))
+    save_tree(path, tree, meta={'seed': 5})
+    compact = CompactTree(path)
+    assert compact.meta == {'seed': 5}
+
+    splines = [spline_arrays(spline) for spline in tree.branches_curve.splines]
+    co, handle_left, handle_right, radius = (np.concatenate(arrays) for arrays in zip(*splines))
+    step = (compact.high - compact.low).max() / QUANT_MAX
+    assert np.abs(compact.points() - co).max() <= step
+    left, right = compact.handles()
+    assert np.abs(left - handle_left).max() <= 2 * step
+    assert np.abs(right - handle_right).max() <= 2 * step
+    assert np.allclose(compact.sections['radius'], radius, rtol=1e-3)
+    assert list(compact.sections['spline_lengths']) == [len(spline[0]) for spline in splines]
+
+    positions, directions, rights = compact.leaves()
+    assert len(positions) == len(tree.leaves_array)
+    assert np.abs(positions - [tuple(leaf.position) for leaf in tree.leaves_array]).max() <= step
+    assert np.allclose(directions, [tuple(leaf.direction.normalized()) for leaf in tree.leaves_array], atol=1e-3)
+    assert np.allclose(rights, [tuple(leaf.right.normalized()) for leaf in tree.leaves_array], atol=1e-3)
+
+    curve = compact.create_curve()
+    assert [len(spline.bezier_points) for spline in curve.splines] == [len(spline[0]) for spline in splines]
+    assert [spline.resolution_u for spline in curve.splines] == \
+        [spline.resolution_u for spline in tree.branches_curve.splines]
+    bpy.data.curves.remove(curve)
+    del compact
+    tree.remove()
+
+
+def test_meshes_and_empty_tree(tmpdir):
+    path = str(tmpdir.join('mesh.chtree'))
+    verts = np.array([[0, 0, 0], [1, 0, 0], [0, 2, 0], [0, 0, 3]], dtype=float)
+    tris = np.array([[0, 1, 2], [0, 2, 3]])
+    write_compact(path, [], meshes={'leaves': (verts, tris)})
+    compact = CompactTree(path)
+    read_verts, read_tris = compact.mesh('leaves')
+    assert np.abs(read_verts - verts).max() <= 3 / QUANT_MAX
+    assert np.array_equal(read_tris, tris)
+    assert len(compact.points()) == 0
+    assert all(len(arr) == 0 for arr in compact.leaves())
+    # sections are aligned views of the file rather than copies
+    assert all(arr.base is not None for arr in compact.sections.values())
+    del compact
+
+
+def test_not_a_compact_file(tmpdir):
+    path = tmpdir.join('other.bin')
+    path.write_binary(b'\0' * 64)
+    with pytest.raises(Exception, match='not a compact tree file'):
+        CompactTree(str(path))
@@ -0,0 +1,64 @@
+"""Options of construct that can't be combined raise rather than one of them being ignored"""
+
+import pytest
+
+import bpy
+from ch_trees.lsystems import treegen
+from ch_trees.parametric import gen
+from ch_trees.parametric.tree_params import quaking_aspen
+
+ACER = 'ch_trees.lsystems.sys_defs.acer'
+
+
+def small_params():
+    return dict(quaking_aspen.params, branches=[1, 12, 8, 4], leaf_blos_num=6)
+
+
+@pytest.mark.parametrize('options', [
+    dict(export_path='tree.glb', leaf_instancing=True),
+    dict(export_path='tree.obj', chunks=4),
+    dict(export_path='tree.obj', bevel_tolerance=0.01),
+    dict(export_path='tree.glb', seed=3, incremental=True),
+    dict(incremental=True),
+    dict(seed=3, incremental=True, budget=object()),
+    dict(seed=3, editable=True, chunks=4),
+    dict(chunks=-1),
+    dict(render=True),
+])
+def test_parametric_conflicts_raise(options, tmpdir):
+    if 'export_path' in options:
+        options['export_path'] = str(tmpdir.join(options['export_path']))
+    with pytest.raises(Exception):
+        gen.construct(small_params(), **options)
+    # nothing is made or written before the options are checked
+    assert gen.cached_tree is None
+    assert tmpdir.listdir() == []
+
+
+@pytest.mark.parametrize('options', [
+    dict(export_path='tree.glb', instance_subtrees=True),
+    dict(export_path='tree.obj', leaf_instancing=True),
+    dict(export_path='tree.obj', chunks=2),
+    dict(export_path='tree.glb', bevel_tolerance=0.01),
+])
+def test_lsystem_conflicts_raise(options, tmpdir):
+    options['export_path'] = str(tmpdir.join(options['export_path']))
+    with pytest.raises(Exception, match='Exported trees'):
+        treegen.construct(ACER, **options)
+    assert tmpdir.listdir() == []
+
+
+def test_replace_with_chunks():
+    before = len(bpy.data.objects)
+    first = gen.construct(small_params(), seed=5, chunks=3)
+    objects = len(bpy.data.objects)
+    second = gen.construct(small_params(), seed=6, replace=first, chunks=3)
+    # the new tree takes over the objects of the one it replaces, leaving a single copy in the file
+    assert second.tree_obj is not None
+    assert len(bpy.data.objects) == objects
+    with pytest.raises(Exception, match='already replaced'):
+        gen.construct(small_params(), seed=7, replace=first)
+    with pytest.raises(Exception, match='already replaced'):
+        treegen.construct(ACER, replace=first)
+    second.remove()
+    assert len(bpy.data.objects) == before
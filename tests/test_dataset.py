@@ -0,0 +1,35 @@
+"""Dataset shards and the samples cut to keep within budget"""
+
+import numpy as np
+
+from ch_trees.parametric.dataset import STAT_NAMES, generate_dataset, shard_path
+
+
+def load_shards(out_dir, count):
+    return [np.load(shard_path(out_dir, shard)) for shard in range(count)]
+
+
+def test_cut_samples_dropped(tmpdir):
+    out_dir = str(tmpdir)
+    # palms have more than 5 stems so every sample is cut
+    generate_dataset(out_dir, 4, shard_size=2, processes=1, presets=['palm'], max_stems=5)
+    for shard in load_shards(out_dir, 2):
+        assert len(shard['index']) == 0
+        assert shard['features'].shape[0] == shard['stats'].shape[0] == 0
+        assert shard['stats'].shape[1] == len(STAT_NAMES)
+
+
+def test_cut_samples_kept_and_flagged(tmpdir):
+    out_dir = str(tmpdir)
+    generate_dataset(out_dir, 3, shard_size=2, processes=1, presets=['palm'], max_stems=5, keep_cut=True)
+    shards = load_shards(out_dir, 2)
+    assert [list(shard['index']) for shard in shards] == [[0, 1], [2]]
+    assert all(shard['stats'][:, STAT_NAMES.index('cut')].all() for shard in shards)
+
+
+def test_presets_fit_default_budget(tmpdir):
+    out_dir = str(tmpdir)
+    generate_dataset(out_dir, 2, shard_size=2, processes=1, presets=['palm', 'fan_palm'])
+    shard, = load_shards(out_dir, 1)
+    assert list(shard['index']) == [0, 1]
+    assert not shard['stats'][:, STAT_NAMES.index('cut')].any()
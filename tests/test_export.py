@@ -0,0 +1,109 @@
+"""Exported OBJ and GLB files are complete and consistent"""
+
+import json
+import struct
+
+import numpy as np
+
+from ch_trees.export import tessellate_spline
+from ch_trees.parametric import gen
+from ch_trees.parametric.tree_params import quaking_aspen
+
+PARAMS = dict(quaking_aspen.params, branches=[1, 12, 8, 4], leaf_blos_num=6)
+
+
+def branch_vertex_count(tree):
+    """Vertices the branches of tree should have once tessellated"""
+    curve = tree.branches_curve
+    sides = 4 + 2 * curve.bevel_resolution
+    tubes = [tessellate_spline(spline, curve.bevel_depth, sides) for spline in curve.splines]
+    return sum(len(tube[0]) for tube in tubes if tube is not None)
+
+
+def read_obj(path):
+    """Groups of OBJ file at path, each as (verts, normals, faces) with faces indexing the whole file from 1"""
+    groups = {}
+    group = None
+    with open(path) as obj_file:
+        for line in obj_file:
+            fields = line.split()
+            if not fields or fields[0] == '#':
+                continue
+            if fields[0] == 'g':
+                group = groups.setdefault(fields[1], ([], [], []))
+            elif fields[0] == 'v':
+                group[0].append([float(val) for val in fields[1:]])
+            elif fields[0] == 'vn':
+                group[1].append([float(val) for val in fields[1:]])
+            else:
+                assert fields[0] == 'f'
+                group[2].append([[int(ind) for ind in corner.split('//')] for corner in fields[1:]])
+    return groups
+
+
+def test_obj_export(tmpdir):
+    path = str(tmpdir.join('tree.obj'))
+    tree = gen.construct(PARAMS, seed=3, export_path=path)
+    groups = read_obj(path)
+    assert sorted(groups) == ['branches', 'leaves']
+    assert len(groups['branches'][0]) == branch_vertex_count(tree)
+    total = sum(len(verts) for verts, _, _ in groups.values())
+    for verts, normals, faces in groups.values():
+        assert len(normals) == len(verts)
+        faces = np.array(faces)
+        assert faces.shape[1:] == (3, 2)
+        # each vertex has its own normal and every index is in the file
+        assert np.array_equal(faces[:, :, 0], faces[:, :, 1])
+        assert faces.min() >= 1 and faces.max() <= total
+        assert np.allclose(np.linalg.norm(normals, axis=1), 1, atol=1e-3)
+    tree.remove()
+
+
+def read_glb(path):
+    """JSON and binary chunks of GLB file at path"""
+    with open(path, 'rb') as glb_file:
+        data = glb_file.read()
+    magic, version, length = struct.unpack('<III', data[:12])
+    assert (magic, version, length) == (0x46546C67, 2, len(data))
+    json_length, json_type = struct.unpack('<II', data[12:20])
+    assert json_type == 0x4E4F534A and json_length % 4 == 0
+    gltf = json.loads(data[20:20 + json_length].decode())
+    bin_length, bin_type = struct.unpack('<II', data[20 + json_length:28 + json_length])
+    assert bin_type == 0x004E4942
+    binary = data[28 + json_length:]
+    assert len(binary) == bin_length == gltf['buffers'][0]['byteLength']
+    return gltf, binary
+
+
+def accessor_array(gltf, binary, index):
+    """Values of accessor index as an array with a row per element"""
+    accessor = gltf['accessors'][index]
+    view = gltf['bufferViews'][accessor['bufferView']]
+    dtype = '<u4' if accessor['componentType'] == 5125 else '<f4'
+    arr = np.frombuffer(binary, dtype, view['byteLength'] // 4, view['byteOffset'])
+    return arr if accessor['type'] == 'SCALAR' else arr.reshape(-1, 3)
+
+
+def test_glb_export(tmpdir):
+    path = str(tmpdir.join('tree.glb'))
+    tree = gen.construct(dict(PARAMS, blossom_rate=0.3, blossom_shape=1, blossom_scale=0.1), seed=3,
+                         export_path=path)
+    gltf, binary = read_glb(path)
+    names = [mesh['name'] for mesh in gltf['meshes']]
+    assert sorted(names) == ['blossom', 'branches', 'leaves']
+    assert gltf['nodes'][0]['children'] == list(range(1, len(names) + 1))
+    for mesh in gltf['meshes']:
+        primitive, = mesh['primitives']
+        positions = accessor_array(gltf, binary, primitive['attributes']['POSITION'])
+        normals = accessor_array(gltf, binary, primitive['attributes']['NORMAL'])
+        indices = accessor_array(gltf, binary, primitive['indices'])
+        position_accessor = gltf['accessors'][primitive['attributes']['POSITION']]
+        assert len(positions) == len(normals) == position_accessor['count']
+        assert len(indices) == gltf['accessors'][primitive['indices']]['count']
+        assert len(indices) % 3 == 0 and indices.max() < len(positions)
+        assert np.allclose(positions.min(axis=0), position_accessor['min'])
+        assert np.allclose(positions.max(axis=0), position_accessor['max'])
+        assert gltf['materials'][primitive['material']]['doubleSided'] == (mesh['name'] != 'branches')
+    branches = gltf['meshes'][names.index('branches')]['primitives'][0]['attributes']['POSITION']
+    assert gltf['accessors'][branches]['count'] == branch_vertex_count(tree)
+    tree.remove()
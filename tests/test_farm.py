@@ -0,0 +1,40 @@
+"""Farm workers that can't be restarted"""
+
+from ch_trees import farm
+
+JOB = {'kind': 'parametric', 'preset': 'palm', 'seed': 1, 'params': {'leaf_blos_num': 4}}
+
+
+def test_failed_restart_fails_jobs_and_stops(monkeypatch):
+    monkeypatch.setattr(farm, 'RESTART_DELAYS', [0])
+    pool = farm.Farm(workers=1, max_jobs=1, use_python=True)
+    stopped = []
+    pool.on_failure = lambda: stopped.append(True)
+    # workers started from now on can't be found
+    pool.command = ['/nonexistent/blender']
+    try:
+        result = pool.run(JOB)
+        # the job itself was done, the worker is recycled after it as max_jobs is 1
+        assert result['ok'], result
+        pool.workers[0].thread.join(10)
+        assert not pool.workers[0].thread.is_alive()
+        assert 'FileNotFoundError' in pool.workers[0].error
+        assert stopped == [True]
+        result = pool.run(JOB)
+        assert not result['ok'] and 'No workers left' in result['error']
+        assert pool.status()['error'] == result['error']
+    finally:
+        pool.close()
+
+
+def test_worker_dying_fails_its_job(monkeypatch):
+    monkeypatch.setattr(farm, 'RESTART_DELAYS', [])
+    pool = farm.Farm(workers=1, max_jobs=10, use_python=True)
+    pool.command = ['/nonexistent/blender']
+    try:
+        pool.workers[0].process.kill()
+        result = pool.run(JOB)
+        assert not result['ok']
+        assert 'Worker exited' in result['error'] and 'Restarting the worker failed' in result['error']
+    finally:
+        pool.close()
@@ -0,0 +1,41 @@
+"""Placement of forest trees"""
+
+import random
+from itertools import combinations
+from math import hypot
+
+import pytest
+
+from ch_trees.forest import place_trees
+
+
+def check_spacing(trees, crown_radii, spacing):
+    for (var_a, x_a, y_a, _, scale_a), (var_b, x_b, y_b, _, scale_b) in combinations(trees, 2):
+        assert hypot(x_a - x_b, y_a - y_b) >= (crown_radii[var_a] * scale_a + crown_radii[var_b] * scale_b) * spacing
+
+
+@pytest.mark.parametrize('spacing', [0.5, 1.0, 1.5])
+def test_crowns_kept_apart(spacing):
+    # variants differing a lot in size, so neighbours in the spatial hash may be large or small
+    crown_radii = [0.5, 2.0, 4.0]
+    trees = place_trees(crown_radii, 60, (100, 80), random.Random(3), spacing)
+    assert len(trees) == 60
+    check_spacing(trees, crown_radii, spacing)
+    for variant, x, y, _, scale in trees:
+        assert 0 <= variant < len(crown_radii)
+        assert abs(x) <= 50 and abs(y) <= 40
+        assert 0.8 <= scale <= 1.2
+
+
+def test_small_area_places_fewer():
+    crown_radii = [3.0, 5.0]
+    trees = place_trees(crown_radii, 100, (20, 20), random.Random(1), scale_jitter=0)
+    # no more than a few crowns this size fit without overlapping
+    assert 0 < len(trees) < 10
+    check_spacing(trees, crown_radii, 1.0)
+    assert all(scale == 1 for _, _, _, _, scale in trees)
+
+
+def test_same_seed_same_placement():
+    assert place_trees([1.0, 2.0], 20, (50, 50), random.Random(7)) == \
+        place_trees([1.0, 2.0], 20, (50, 50), random.Random(7))
@@ -0,0 +1,135 @@
+"""Incremental regeneration of Parametric trees and of single stems"""
+
+from time import time
+
+import numpy as np
+
+import bpy
+from ch_trees.parametric import gen
+from ch_trees.parametric.tree_params import quaking_aspen
+from ch_trees.parametric.tree_params.tree_param import TreeParam
+from ch_trees.pipeline import make_leaf_meshes
+
+
+def small_params(**changes):
+    """Quaking aspen with few enough stems and leaves to make quickly"""
+    params = dict(quaking_aspen.params, branches=[1, 12, 8, 4], leaf_blos_num=6)
+    params.update(changes)
+    return params
+
+
+def spline_points(tree):
+    """Sorted positions of every point of the branches of tree"""
+    return sorted(tuple(round(val, 5) for val in point.co) for spline in tree.branches_curve.splines
+                  for point in spline.bezier_points)
+
+
+def test_changed_stage():
+    old = TreeParam(small_params())
+    assert gen.changed_stage(old, TreeParam(small_params())) is None
+    assert gen.changed_stage(old, TreeParam(small_params(branches=[1, 12, 8, 9]))) == 'skeleton 2'
+    assert gen.changed_stage(old, TreeParam(small_params(curve_res=[5, 5, 4, 1]))) == 'skeleton 2'
+    assert gen.changed_stage(old, TreeParam(small_params(curve_res=[5, 5, 5, 1]))) == 'skeleton 3'
+    assert gen.changed_stage(old, TreeParam(small_params(length=[1, 0.4, 0.6, 0]))) == 'skeleton 0'
+    assert gen.changed_stage(old, TreeParam(small_params(leaf_blos_num=8))) == 'leaf placement'
+    assert gen.changed_stage(old, TreeParam(small_params(leaf_scale=0.2))) == 'leaf meshing'
+    # the earliest stage changed wins
+    assert gen.changed_stage(old, TreeParam(small_params(leaf_scale=0.2, g_scale=10))) == 'skeleton 0'
+    assert gen.stage_depth('leaf placement', 3) == 2
+    assert gen.stage_depth('leaf meshing', 3) == 3
+
+
+def test_remake_unchanged_is_identical():
+    tree = gen.Tree(TreeParam(small_params()), editable=True)
+    gen.random.seed(4)
+    tree.make()
+    points = spline_points(tree)
+    leaves = len(tree.leaves_array)
+    tree.remake_from_depth(TreeParam(small_params()), 1)
+    assert spline_points(tree) == points
+    assert len(tree.leaves_array) == leaves
+    tree.remove()
+
+
+def test_incremental_keeps_stems_above_change():
+    try:
+        tree = gen.construct(small_params(), seed=6, incremental=True)
+        trunk = tree.stem_records[0]
+        first_branch = trunk.children[0]
+        twig = first_branch.children[0]
+        trunk_points = [tuple(point.co) for point in trunk.splines[0].bezier_points]
+        new_tree = gen.construct(small_params(curve_res=[5, 5, 3, 0]), seed=6, incremental=True)
+        assert new_tree is tree
+        assert tree.param.curve_res[2] == 3
+        # stems above depth 2 are kept as they were, those at depth 2 are made with the new resolution
+        assert tree.stem_records[0] is trunk
+        assert trunk.children[0] is first_branch
+        assert [tuple(point.co) for point in trunk.splines[0].bezier_points] == trunk_points
+        assert first_branch.children[0] is not twig
+        assert max(len(child.splines[0].bezier_points) for child in first_branch.children) == 4
+        # leaves are only on the remade stems so are all placed again
+        assert sorted(id(leaf) for leaf in trunk.leaves) == sorted(id(leaf) for leaf in tree.leaves_array)
+    finally:
+        gen.cached_tree[1].remove()
+        gen.cached_tree = None
+
+
+def mesh_verts(mesh):
+    """Vertex positions of mesh as an (n, 3) array"""
+    verts = np.zeros(len(mesh.vertices) * 3)
+    mesh.vertices.foreach_get('co', verts)
+    return verts.reshape(-1, 3)
+
+
+def test_regenerate_stem_splices_leaves():
+    params = small_params(blossom_rate=0.3, blossom_shape=1, blossom_scale=0.1)
+    tree = gen.Tree(TreeParam(params), editable=True)
+    gen.random.seed(8)
+    tree.make()
+    first, second = tree.stem_records[0].children[:2]
+    kept = len(first.leaves)
+    before = [mesh_verts(obj.data) for obj in tree.leaf_objs]
+    tree.regenerate_stem([0, 1], 12)
+    assert tree.stem_records[0].children[1] is not second
+    # leaves of the stem take the place of the old ones, those of other stems are as they were
+    assert tree.leaves_array[kept:kept + len(tree.stem_records[0].children[1].leaves)] == \
+        tree.stem_records[0].children[1].leaves
+    assert tree.stem_records[0].leaves == tree.leaves_array
+    assert len(tree.leaf_blossom) == len(tree.leaves_array)
+    for obj, old_verts, blossom in zip(tree.leaf_objs, before, [False, True]):
+        n_verts = len(obj.data.vertices) // np.count_nonzero(tree.leaf_blossom == blossom)
+        kept_verts = np.count_nonzero(tree.leaf_blossom[:kept] == blossom) * n_verts
+        assert np.array_equal(mesh_verts(obj.data)[:kept_verts], old_verts[:kept_verts])
+    # spliced meshes match meshes made from scratch with the same blossom choices
+    meshes = {}
+
+    def new_mesh(name):
+        meshes[name] = bpy.data.meshes.new(name)
+        return meshes[name]
+
+    make_leaf_meshes(tree.leaves_array, tree.leaf_buffers[0].shape, tree.leaf_buffers[1].shape, params['leaf_bend'],
+                     tree.leaf_blossom, new_mesh)
+    for obj in tree.leaf_objs:
+        assert np.allclose(mesh_verts(obj.data), mesh_verts(meshes[obj.name]), atol=1e-5)
+        assert len(obj.data.polygons) == len(meshes[obj.name].polygons)
+        bpy.data.meshes.remove(meshes[obj.name])
+    tree.remove()
+
+
+def test_splicing_leaves_faster_than_remaking_them():
+    tree = gen.Tree(TreeParam(small_params(branches=[1, 30, 20, 6], leaf_blos_num=40)), editable=True)
+    gen.random.seed(2)
+    tree.make()
+    twig = tree.stem_records[0].children[5].children[0]
+    start = sum(len(record.leaves) for record in tree.stem_records[0].children[:5])
+    splice = remake = float('inf')
+    for _ in range(3):
+        start_time = time()
+        tree.splice_leaf_objects(start, len(twig.leaves), len(twig.leaves))
+        splice = min(splice, time() - start_time)
+        start_time = time()
+        tree.remake_leaf_objects()
+        remake = min(remake, time() - start_time)
+    # splicing the leaves of one twig only makes their geometry, rather than that of every leaf
+    assert splice * 4 < remake
+    tree.remove()
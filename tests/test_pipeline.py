@@ -0,0 +1,70 @@
+"""Leaf mesh pipeline"""
+
+import numpy as np
+import pytest
+
+import bpy
+from ch_trees.chturtle import Vector
+from ch_trees.leaf import Leaf
+from ch_trees.pipeline import CHUNK_LEAVES, DEPTH, Pipeline, make_leaf_meshes
+
+
+def test_results_committed_in_order():
+    committed = []
+    Pipeline(lambda chunk: chunk * 2, committed.append).run(range(3 * DEPTH))
+    assert committed == [val * 2 for val in range(3 * DEPTH)]
+
+
+def test_worker_error_raised():
+    committed = []
+
+    def compute(chunk):
+        if chunk == 2:
+            raise ValueError('bad chunk')
+        return chunk
+
+    # more chunks than can wait for the worker, so feeding must not block once it has failed
+    with pytest.raises(ValueError, match='bad chunk'):
+        Pipeline(compute, committed.append).run(range(10 * DEPTH))
+    assert committed == [0, 1]
+
+
+def test_commit_error_raised():
+    def commit(result):
+        raise KeyError(result)
+
+    with pytest.raises(KeyError):
+        Pipeline(lambda chunk: chunk, commit).run(range(10 * DEPTH))
+
+
+def test_leaf_meshes_match_single_leaves():
+    rng = np.random.RandomState(0)
+    leaves = []
+    for _ in range(CHUNK_LEAVES + 10):
+        direction = Vector(rng.normal(size=3)).normalized()
+        right = direction.cross(Vector([0, 0, 1])).normalized()
+        leaves.append(Leaf(Vector(rng.normal(size=3)), direction, right))
+    leaf_shape = Leaf.get_shape(1, 1, 0.2, 1)
+    blossom_shape = Leaf.get_shape(-1, 1, 0.1, 1)
+    blossom = rng.uniform(size=len(leaves)) < 0.3
+    meshes = {}
+
+    def new_mesh(name):
+        meshes[name] = bpy.data.meshes.new(name)
+        return meshes[name]
+
+    buffers = make_leaf_meshes(leaves, leaf_shape, blossom_shape, 0.5, blossom, new_mesh)
+    assert [buffer.count for buffer in buffers] == [np.count_nonzero(~blossom), np.count_nonzero(blossom)]
+    for buffer, name, mask, shape in zip(buffers, ['Leaves', 'Blossom'], [~blossom, blossom],
+                                         [leaf_shape, blossom_shape]):
+        mesh = meshes[name]
+        assert len(mesh.polygons) == buffer.count * len(shape[1])
+        chosen = [leaf for leaf, keep in zip(leaves, mask) if keep]
+        for index in [0, len(chosen) - 1]:
+            verts, faces = chosen[index].get_mesh(0.5, shape, index)
+            first = index * len(verts)
+            assert np.allclose([mesh.vertices[first + ind].co for ind in range(len(verts))], verts, atol=1e-5)
+            polygon = mesh.polygons[index * len(faces)]
+            assert [mesh.loops[polygon.loop_start + ind].vertex_index
+                    for ind in range(polygon.loop_total)] == list(faces[0])
+        bpy.data.meshes.remove(mesh)
@@ -0,0 +1,60 @@
+"""Branches split into curves by the bevel resolution their radius needs"""
+
+from math import pi
+
+import numpy as np
+
+import bpy
+from ch_trees.export import spline_arrays
+from ch_trees.parametric import gen
+from ch_trees.parametric.tree_params import quaking_aspen
+from ch_trees.radius_classes import bevel_resolutions, screen_tolerance
+
+
+def ring_error(radius, resolution):
+    """Furthest a ring of the sides bevel_resolution gives is from a circle of radius"""
+    return radius * (1 - np.cos(pi / (4 + 2 * resolution)))
+
+
+def test_lowest_resolution_within_tolerance():
+    radii = np.geomspace(1e-4, 2, 200)
+    tolerance = 0.002
+    resolutions = bevel_resolutions(radii, tolerance)
+    # thicker branches never need fewer sides
+    assert np.all(np.diff(resolutions) >= 0)
+    assert resolutions[0] == 0 and resolutions[-1] == 10
+    for radius, resolution in zip(radii, resolutions):
+        if resolution < 10:
+            assert ring_error(radius, resolution) <= tolerance
+        if resolution > 0:
+            assert ring_error(radius, resolution - 1) > tolerance
+
+
+def test_full_resolution_when_none_within_tolerance():
+    assert list(bevel_resolutions([0, 1, 100], 0.01, max_resolution=4)) == [0, 4, 4]
+    assert len(bevel_resolutions([], 0.01)) == 0
+
+
+def test_screen_tolerance():
+    # a 90 degree view 1000 pixels across is 20 units wide at distance 10
+    assert np.isclose(screen_tolerance(10, pi / 2, 1000, pixels=1), 0.02)
+
+
+def test_tree_split_by_radius():
+    params = dict(quaking_aspen.params, branches=[1, 12, 8, 4], leaf_blos_num=6)
+    whole = gen.construct(params, seed=4)
+    splines = len(whole.branches_curve.splines)
+    whole.remove()
+    tree = gen.construct(params, seed=4, bevel_tolerance=0.002)
+    curves = [obj.data for obj in bpy.data.objects if obj.parent == tree.tree_obj and obj.type == 'CURVE']
+    assert len(curves) > 1
+    assert sum(len(curve.splines) for curve in curves) == splines
+    assert len(set(curve.bevel_resolution for curve in curves)) == len(curves)
+    full = max(curve.bevel_resolution for curve in curves)
+    for curve in curves:
+        radii = np.array([spline_arrays(spline)[3].max() for spline in curve.splines]) * curve.bevel_depth
+        assert np.all(bevel_resolutions(radii, 0.002, full) == curve.bevel_resolution)
+        if curve.bevel_resolution < full:
+            # thin branches get fewer points along them too
+            assert all(spline.resolution_u <= 1 + curve.bevel_resolution // 2 for spline in curve.splines)
+    tree.remove()
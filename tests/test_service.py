@@ -0,0 +1,27 @@
+"""Checks the service makes of requests before generating anything"""
+
+import asyncio
+import json
+
+import pytest
+
+from ch_trees.service import TreeService
+
+
+def test_service_requests():
+    service = TreeService(processes=2)
+    try:
+        assert service.processes == 2
+
+        def respond(job):
+            return asyncio.run(service.respond(['POST', '/generate'], json.dumps(job).encode()))
+
+        with pytest.raises(ValueError, match='only be given for parametric'):
+            respond({'kind': 'lsystem', 'preset': 'acer', 'seed': 1, 'params': {'levels': 2}})
+        with pytest.raises(ValueError, match='seed'):
+            respond({'preset': 'palm'})
+        with pytest.raises(ValueError, match='format'):
+            respond({'preset': 'palm', 'seed': 1, 'format': 'fbx'})
+        assert service.counts['requests'] == 0
+    finally:
+        service.pool.shutdown()
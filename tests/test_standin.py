@@ -0,0 +1,17 @@
+"""Stand-in bpy collections behave like Blender's"""
+
+import bpy
+
+
+def test_collection_get():
+    obj = bpy.data.objects.new('Tree', None)
+    duplicate = bpy.data.objects.new('Tree', None)
+    try:
+        assert bpy.data.objects.get(obj.name) is obj
+        assert bpy.data.objects.get(duplicate.name) is duplicate
+        assert bpy.data.objects.get('No such tree') is None
+        assert bpy.data.objects.get('No such tree', obj) is obj
+    finally:
+        bpy.data.objects.remove(obj)
+        bpy.data.objects.remove(duplicate)
+    assert bpy.data.objects.get(obj.name) is None
@@ -0,0 +1,63 @@
+"""Structural hashing and instancing of repeated L-System subtrees"""
+
+import random
+
+from ch_trees.lsystems.lsystem import LSymbol, LSystem
+
+
+def branch():
+    """Symbols of a branch with a sub-branch, leaves on both"""
+    return [LSymbol("["), LSymbol("+", {"a": 30}), LSymbol("F", {"l": 1}),
+            LSymbol("L", {"r_ang": 10, "d_ang": 20}),
+            LSymbol("["), LSymbol("+", {"a": 20}), LSymbol("F", {"l": 0.5}),
+            LSymbol("L", {"r_ang": 10, "d_ang": 20}), LSymbol("]"), LSymbol("]")]
+
+
+def make_system(instance_subtrees):
+    """Trunk with three identical branches"""
+    data = [LSymbol("!", {"w": 0.2})]
+    for _ in range(3):
+        data.extend([LSymbol("F", {"l": 1}), LSymbol("/", {"a": 120})] + branch())
+    l_sys = LSystem(data, {}, instance_subtrees=instance_subtrees)
+    l_sys.subtree_min_symbols = 6
+    return l_sys
+
+
+def expand(symbols, subtrees):
+    """Symbols with every reference to a shared subtree replaced by the subtree"""
+    output = []
+    for dat in symbols:
+        if dat.letter == "@":
+            output.extend(expand(subtrees[dat.parameters["id"]], subtrees))
+        else:
+            output.append(dat)
+    return output
+
+
+def test_hash_consing_keeps_symbols():
+    l_sys = make_system(True)
+    original = [str(dat) for dat in l_sys.data]
+    l_sys.hash_cons_subtrees()
+    assert len(l_sys.subtrees) == 1
+    assert len(l_sys.data) < len(original)
+    assert [str(dat) for dat in expand(l_sys.data, l_sys.subtrees)] == original
+
+
+def test_instanced_counts_match_geometry():
+    random.seed(1)
+    flat = make_system(False)
+    flat.parse()
+    assert flat.stem_count == len(flat.branches_curve.splines) == 7
+    assert flat.leaf_count == 6
+
+    random.seed(1)
+    instanced = make_system(True)
+    instanced.parse()
+    splines = len(instanced.branches_curve.splines)
+    for group in instanced.subtree_groups.values():
+        splines += sum(len(obj.data.splines) for obj in group.objects if obj.type == 'CURVE')
+    # trunk and one shared copy of the branch, made once however many times it is placed
+    assert instanced.subtree_instance_count == 3
+    assert instanced.stem_count == splines == 3
+    instanced.remove()
+    flat.remove()